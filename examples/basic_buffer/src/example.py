@@ -14,6 +14,7 @@ from rtctools.optimization.linearized_order_goal_programming_mixin import (
 from rtctools.optimization.modelica_mixin import ModelicaMixin
 
 from rtctools_heat_network.heat_mixin import HeatMixin
+from rtctools_heat_network.modelica_cache_mixin import ModelicaCacheMixin
 from rtctools_heat_network.modelica_component_type_mixin import ModelicaComponentTypeMixin
 from rtctools_heat_network.qth_mixin import QTHMixin
 from rtctools_heat_network.util import run_heat_network_optimization
@@ -126,6 +127,7 @@ class HeatProblem(
     LinearizedOrderGoalProgrammingMixin,
     GoalProgrammingMixin,
     CSVMixin,
+    ModelicaCacheMixin,
     ModelicaMixin,
     CollocatedIntegratedOptimizationProblem,
 ):
@@ -139,6 +141,7 @@ class QTHProblem(
     HomotopyMixin,
     GoalProgrammingMixin,
     CSVMixin,
+    ModelicaCacheMixin,
     ModelicaMixin,
     CollocatedIntegratedOptimizationProblem,
 ):
@@ -68,6 +68,7 @@ class PipeDiameterSizingProblem(
     def heat_network_options(self):
         options = super().heat_network_options()
         options["minimum_velocity"] = 0.0
+        options["screen_pipe_classes"] = True
         return options
 
     def pipe_classes(self, pipe):
@@ -90,6 +91,11 @@ class PipeDiameterSizingProblem(
             PipeClass("DN600", 0.5954, 3.0, (0.431023, 0.009155), 1.0),
         ]
 
+    def pipe_class_screening_demand(self, demand):
+        # The demand targets are met in the optimal solution, so pipes that
+        # are too small to supply them never have to be considered.
+        return self.get_timeseries(f"{demand}.target_heat_demand").values
+
     def path_goals(self):
         goals = super().path_goals().copy()
 
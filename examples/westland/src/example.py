@@ -14,7 +14,9 @@ from rtctools.optimization.linearized_order_goal_programming_mixin import (
 from rtctools.optimization.modelica_mixin import ModelicaMixin
 from rtctools.optimization.timeseries import Timeseries
 
+from rtctools_heat_network.goals import WeightedSumGoal
 from rtctools_heat_network.heat_mixin import HeatMixin
+from rtctools_heat_network.modelica_cache_mixin import ModelicaCacheMixin
 from rtctools_heat_network.modelica_component_type_mixin import ModelicaComponentTypeMixin
 from rtctools_heat_network.qth_mixin import QTHMixin
 from rtctools_heat_network.util import run_heat_network_optimization
@@ -47,7 +49,7 @@ class RangeGoal(Goal):
         return optimization_problem.state(self.state)
 
 
-class MinimizeSource(Goal):
+class MinimizeSource(WeightedSumGoal):
     def __init__(
         self,
         optimization_problem,
@@ -59,12 +61,13 @@ class MinimizeSource(Goal):
         order=2,
         weight=1.0,
     ):
-        self.state = state
+        # The sum of the state over all times
+        super().__init__(
+            optimization_problem, [state], priority=priority, order=order, weight=weight
+        )
+
         self.target_min = target_min
         self.target_max = target_max
-        self.priority = priority
-        self.order = order
-        self.weight = weight
         if state_bounds is None:
             state_bounds = (
                 optimization_problem.bounds()[state][0] * len(optimization_problem.times()),
@@ -73,13 +76,6 @@ class MinimizeSource(Goal):
         self.function_range = state_bounds
         self.function_nominal = max((abs(state_bounds[1]) + abs(state_bounds[0])) / 2.0, 1.0)
 
-    def function(self, optimization_problem, ensemble_member):
-        t = optimization_problem.times()
-        sum_over_t = 0.0
-        for i in range(len(t)):
-            sum_over_t += optimization_problem.state_at(self.state, t[i])
-        return sum_over_t
-
 
 class GoalsAndOptions:
     def heat_network_options(self):
@@ -153,6 +149,7 @@ class HeatProblem(
     LinearizedOrderGoalProgrammingMixin,
     GoalProgrammingMixin,
     CSVMixin,
+    ModelicaCacheMixin,
     ModelicaMixin,
     CollocatedIntegratedOptimizationProblem,
 ):
@@ -179,6 +176,7 @@ class QTHProblem(
     HomotopyMixin,
     GoalProgrammingMixin,
     CSVMixin,
+    ModelicaCacheMixin,
     ModelicaMixin,
     CollocatedIntegratedOptimizationProblem,
 ):
@@ -0,0 +1,45 @@
+import os
+import stat
+from pathlib import Path
+
+
+def default_cache_directory(name: str) -> Path:
+    """
+    Folder of the cache `name` in the cache directory of the user, i.e.
+    ``$XDG_CACHE_HOME`` or ``~/.cache``. Unlike the temporary directory of
+    the system, this directory is not shared with other users.
+    """
+    root = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(root) / "rtctools_heat_network" / name
+
+
+def is_private(path: Path) -> bool:
+    """
+    Whether `path` is owned by the current user and cannot be written by
+    other users, such that its contents can be trusted. Symbolic links are
+    never trusted, as their target can be changed by their owner.
+
+    Ownership cannot be checked on platforms without user ids (Windows),
+    where every existing path is considered private.
+    """
+    st = os.lstat(path)
+
+    if stat.S_ISLNK(st.st_mode):
+        return False
+
+    if not hasattr(os, "getuid"):
+        return True
+
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def private_directory(path: Path) -> bool:
+    """
+    Create the folder `path` (and its parents) if it does not exist, with
+    access for the current user only.
+
+    :returns: Whether the folder is private, see :py:func:`is_private`.
+    """
+    path = Path(path)
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return is_private(path)
@@ -1,10 +1,17 @@
 import math
-from typing import List, Tuple, Union
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple, Union
 
 import numpy as np
 
+# Memo of U-values, keyed on the geometry tuple as returned by `_geometry_key`.
+# The least recently used geometry is evicted when it grows beyond its maximum
+# size, as long running processes may see many different geometries.
+_U_VALUES_CACHE: "OrderedDict[tuple, Tuple[float, float]]" = OrderedDict()
+_U_VALUES_CACHE_SIZE = 4096
 
-def heat_loss_u_values_pipe(
+
+def _geometry_key(
     inner_diameter: float,
     insulation_thicknesses: Union[float, List[float], np.ndarray] = None,
     conductivities_insulation: Union[float, List[float], np.ndarray] = 0.033,
@@ -12,26 +19,11 @@ def heat_loss_u_values_pipe(
     depth: float = 1.0,
     h_surface: float = 15.4,
     pipe_distance: float = None,
-) -> Tuple[float, float]:
+) -> tuple:
     """
-    Calculate the U_1 and U_2 heat loss values for a pipe based for either
-    single- or multi-layer insultion.
-
-    If the `insulation_thicknesses` is provided as a list, the length should be
-    equal to the length of `conductivities_insulation`. If both are floats, a
-    single layer of insulation is assumed.
-
-    :inner_diameter:            Inner diameter of the pipes [m]
-    :insulation_thicknesses:    Thicknesses of the insulation [m]
-                                Default of None means a thickness of 0.5 * inner diameter.
-    :conductivities_insulation: Thermal conductivities of the insulation layers [W/m/K]
-    :conductivity_subsoil:      Subsoil thermal conductivity [W/m/K]
-    :h_surface:                 Heat transfer coefficient at surface [W/m^2/K]
-    :param depth:               Depth of outer top of the pipeline [m]
-    :param pipe_distance:       Distance between pipeline feed and return pipeline centers [m].
-                                Default of None means 2 * outer diameter
-
-    :return: U-values (U_1 / U_2) for heat losses of pipes [W/(m*K)]
+    Validate the arguments of :py:func:`heat_loss_u_values_pipe`, and convert
+    them to a hashable tuple of floats. The insulation layers are represented
+    as tuples, and a `pipe_distance` of None is represented as NaN.
     """
 
     if insulation_thicknesses is None:
@@ -45,16 +37,42 @@ def heat_loss_u_values_pipe(
             raise Exception(
                 "Number of insulation thicknesses should match number of conductivities"
             )
-        insulation_thicknesses = np.array(insulation_thicknesses)
-        conductivities_insulation = np.array(conductivities_insulation)
+        insulation_thicknesses = tuple(float(x) for x in insulation_thicknesses)
+        conductivities_insulation = tuple(float(x) for x in conductivities_insulation)
     else:
-        insulation_thicknesses = np.array([insulation_thicknesses])
-        conductivities_insulation = np.array([conductivities_insulation])
+        insulation_thicknesses = (float(insulation_thicknesses),)
+        conductivities_insulation = (float(conductivities_insulation),)
+
+    return (
+        float(inner_diameter),
+        insulation_thicknesses,
+        conductivities_insulation,
+        float(conductivity_subsoil),
+        float(depth),
+        float(h_surface),
+        np.nan if pipe_distance is None else float(pipe_distance),
+    )
+
+
+def _u_values_vectorized(
+    inner_diameter: np.ndarray,
+    insulation_thicknesses: np.ndarray,
+    conductivities_insulation: np.ndarray,
+    conductivity_subsoil: np.ndarray,
+    depth: np.ndarray,
+    h_surface: np.ndarray,
+    pipe_distance: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the U-values of multiple pipes at once. All arguments are
+    arrays with an element per pipe, except for the insulation thicknesses
+    and conductivities, which are 2-D arrays with a column per insulation
+    layer. A `pipe_distance` of NaN means 2 * outer diameter.
+    """
 
     diam_inner = inner_diameter
-    diam_outer = diam_inner + 2 * sum(insulation_thicknesses)
-    if pipe_distance is None:
-        pipe_distance = 2 * diam_outer
+    diam_outer = diam_inner + 2 * np.sum(insulation_thicknesses, axis=1)
+    pipe_distance = np.where(np.isnan(pipe_distance), 2 * diam_outer, pipe_distance)
     depth_center = depth + 0.5 * diam_outer
     depth_corrected = depth_center + conductivity_subsoil / h_surface
 
@@ -64,24 +82,136 @@ def heat_loss_u_values_pipe(
 
     # Heat resistance of the subsoil
     r_subsoil = (
-        1 / (2 * math.pi * conductivity_subsoil) * math.log(4.0 * depth_corrected / diam_outer)
+        1 / (2 * math.pi * conductivity_subsoil) * np.log(4.0 * depth_corrected / diam_outer)
     )
 
     # Heat resistance due to insulation
-    outer_diameters = diam_inner + 2.0 * np.cumsum(insulation_thicknesses)
-    inner_diameters = np.array([inner_diameter, *outer_diameters[:-1]])
-    r_ins = sum(
-        np.log(outer_diameters / inner_diameters) / (2.0 * math.pi * conductivities_insulation)
+    outer_diameters = diam_inner[:, None] + 2.0 * np.cumsum(insulation_thicknesses, axis=1)
+    inner_diameters = np.hstack((diam_inner[:, None], outer_diameters[:, :-1]))
+    r_ins = np.sum(
+        np.log(outer_diameters / inner_diameters) / (2.0 * math.pi * conductivities_insulation),
+        axis=1,
     )
 
     # Heat resistance due to neighboring pipeline
     r_m = (
         1
         / (4 * math.pi * conductivity_subsoil)
-        * math.log(1 + (2 * depth_corrected / pipe_distance) ** 2)
+        * np.log(1 + (2 * depth_corrected / pipe_distance) ** 2)
     )
 
     u_1 = (r_subsoil + r_ins) / ((r_subsoil + r_ins) ** 2 - r_m**2)
     u_2 = r_m / ((r_subsoil + r_ins) ** 2 - r_m**2)
 
     return u_1, u_2
+
+
+def _cached_u_values(keys: List[tuple]) -> List[Tuple[float, float]]:
+    """
+    U-values of every geometry key. The geometries that are not in the
+    cache are computed at once.
+    """
+    values = {}
+    for k in keys:
+        if k not in values and k in _U_VALUES_CACHE:
+            values[k] = _U_VALUES_CACHE[k]
+            _U_VALUES_CACHE.move_to_end(k)
+
+    missing = {k for k in keys if k not in values}
+
+    # Pipes can only be stacked if they have the same number of insulation layers
+    by_n_layers = {}
+    for k in missing:
+        by_n_layers.setdefault(len(k[1]), []).append(k)
+
+    for group in by_n_layers.values():
+        (
+            inner_diameter,
+            insulation_thicknesses,
+            conductivities_insulation,
+            conductivity_subsoil,
+            depth,
+            h_surface,
+            pipe_distance,
+        ) = (np.array(x, dtype=float) for x in zip(*group))
+
+        u_1, u_2 = _u_values_vectorized(
+            inner_diameter,
+            insulation_thicknesses,
+            conductivities_insulation,
+            conductivity_subsoil,
+            depth,
+            h_surface,
+            pipe_distance,
+        )
+
+        for k, u_1_k, u_2_k in zip(group, u_1, u_2):
+            values[k] = _U_VALUES_CACHE[k] = (float(u_1_k), float(u_2_k))
+
+    while len(_U_VALUES_CACHE) > _U_VALUES_CACHE_SIZE:
+        _U_VALUES_CACHE.popitem(last=False)
+
+    return [values[k] for k in keys]
+
+
+def heat_loss_u_values_pipe(
+    inner_diameter: float,
+    insulation_thicknesses: Union[float, List[float], np.ndarray] = None,
+    conductivities_insulation: Union[float, List[float], np.ndarray] = 0.033,
+    conductivity_subsoil: float = 2.3,
+    depth: float = 1.0,
+    h_surface: float = 15.4,
+    pipe_distance: float = None,
+) -> Tuple[float, float]:
+    """
+    Calculate the U_1 and U_2 heat loss values for a pipe based for either
+    single- or multi-layer insultion.
+
+    If the `insulation_thicknesses` is provided as a list, the length should be
+    equal to the length of `conductivities_insulation`. If both are floats, a
+    single layer of insulation is assumed.
+
+    Results are cached on the geometry, so calling this function repeatedly
+    for the same type of pipe is cheap.
+
+    :inner_diameter:            Inner diameter of the pipes [m]
+    :insulation_thicknesses:    Thicknesses of the insulation [m]
+                                Default of None means a thickness of 0.5 * inner diameter.
+    :conductivities_insulation: Thermal conductivities of the insulation layers [W/m/K]
+    :conductivity_subsoil:      Subsoil thermal conductivity [W/m/K]
+    :h_surface:                 Heat transfer coefficient at surface [W/m^2/K]
+    :param depth:               Depth of outer top of the pipeline [m]
+    :param pipe_distance:       Distance between pipeline feed and return pipeline centers [m].
+                                Default of None means 2 * outer diameter
+
+    :return: U-values (U_1 / U_2) for heat losses of pipes [W/(m*K)]
+    """
+
+    key = _geometry_key(
+        inner_diameter,
+        insulation_thicknesses,
+        conductivities_insulation,
+        conductivity_subsoil,
+        depth,
+        h_surface,
+        pipe_distance,
+    )
+
+    return _cached_u_values([key])[0]
+
+
+def heat_loss_u_values_pipes(pipes: Iterable[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the U-values of multiple pipes at once.
+
+    :param pipes: Iterable of dictionaries with the keyword arguments of
+                  :py:func:`heat_loss_u_values_pipe` for every pipe.
+
+    :return: Arrays of U_1 and U_2 values, with an element per pipe.
+    """
+
+    keys = [_geometry_key(**kwargs) for kwargs in pipes]
+
+    u_values = np.array(_cached_u_values(keys), dtype=float).reshape((-1, 2))
+
+    return u_values[:, 0], u_values[:, 1]
@@ -0,0 +1,147 @@
+from typing import List, Sequence, Set, Tuple
+
+import numpy as np
+
+from .pipe_class import PipeClass
+
+
+def pipe_heat_requirements(
+    n_vertices: int,
+    edges: Sequence[Tuple[int, int]],
+    demand: np.ndarray,
+    supply: np.ndarray,
+    unbounded: np.ndarray,
+) -> np.ndarray:
+    """
+    Lower bound on the maximum absolute heat every edge (pipe) has to carry.
+
+    If a pipe is a bridge, i.e. removing it splits its part of the network in
+    two, all heat demand on one side that cannot be supplied on that side has
+    to go through the pipe. For pipes in a loop, or when a side has a vertex
+    that can supply an unknown amount of heat (e.g. a buffer), the
+    requirement is zero.
+
+    :param n_vertices: Number of vertices in the graph.
+    :param edges: Vertex pairs of every edge.
+    :param demand: Minimum heat demand per vertex (rows) and time (columns).
+    :param supply: Maximum heat supply per vertex.
+    :param unbounded: Whether a vertex can supply an unknown amount of heat.
+
+    :returns: The required heat per edge.
+    """
+
+    n_times = demand.shape[1]
+
+    adjacency = [[] for _ in range(n_vertices)]
+    for e, (u, v) in enumerate(edges):
+        adjacency[u].append((v, e))
+        adjacency[v].append((u, e))
+
+    # Tarjan's bridge finding algorithm, with the subtree sums of demand and
+    # supply accumulated in post-order.
+    discovery = np.full(n_vertices, -1, dtype=int)
+    low = np.zeros(n_vertices, dtype=int)
+    root = np.zeros(n_vertices, dtype=int)
+    sub_demand = demand.astype(float).copy()
+    sub_supply = supply.astype(float).copy()
+    # Booleans cannot be subtracted, so we count the unbounded vertices
+    sub_unbounded = unbounded.astype(int)
+
+    tree_edges = []
+    counter = 0
+
+    for r in range(n_vertices):
+        if discovery[r] >= 0:
+            continue
+
+        discovery[r] = low[r] = counter
+        root[r] = r
+        counter += 1
+
+        # Stack of (vertex, edge to parent, position in adjacency list)
+        stack = [(r, -1, 0)]
+        while stack:
+            u, parent_edge, i = stack.pop()
+
+            if i < len(adjacency[u]):
+                stack.append((u, parent_edge, i + 1))
+
+                v, e = adjacency[u][i]
+                if e == parent_edge:
+                    continue
+                if discovery[v] < 0:
+                    discovery[v] = low[v] = counter
+                    root[v] = r
+                    counter += 1
+                    tree_edges.append((u, v, e))
+                    stack.append((v, e, 0))
+                else:
+                    low[u] = min(low[u], discovery[v])
+            elif parent_edge >= 0:
+                # Done with u, propagate to its parent
+                p = edges[parent_edge][0] if edges[parent_edge][1] == u else edges[parent_edge][1]
+                low[p] = min(low[p], low[u])
+                sub_demand[p] += sub_demand[u]
+                sub_supply[p] += sub_supply[u]
+                sub_unbounded[p] += sub_unbounded[u]
+
+    requirements = np.zeros(len(edges))
+
+    for u, v, e in tree_edges:
+        if low[v] <= discovery[u]:
+            # Not a bridge
+            continue
+
+        r = root[v]
+        sides = [
+            (sub_demand[v], sub_supply[v], sub_unbounded[v]),
+            (
+                sub_demand[r] - sub_demand[v],
+                sub_supply[r] - sub_supply[v],
+                sub_unbounded[r] - sub_unbounded[v],
+            ),
+        ]
+
+        for side_demand, side_supply, side_unbounded in sides:
+            if side_unbounded > 0 or n_times == 0:
+                continue
+            requirements[e] = max(requirements[e], np.max(side_demand) - side_supply)
+
+    return requirements
+
+
+def dominated_pipe_classes(pipe_classes: List[PipeClass]) -> Set[int]:
+    """
+    Indices of the pipe classes that are dominated by another class with the
+    same inner diameter, that is at least as cheap, has at least the same
+    maximum velocity and has no larger U-values. Of identical classes, only
+    the first is kept.
+    """
+
+    dominated = set()
+
+    for i, a in enumerate(pipe_classes):
+        for j, b in enumerate(pipe_classes):
+            if i == j or j in dominated:
+                continue
+
+            if not (
+                b.inner_diameter == a.inner_diameter
+                and b.maximum_velocity >= a.maximum_velocity
+                and b.investment_costs <= a.investment_costs
+                and b.u_values[0] <= a.u_values[0]
+                and b.u_values[1] <= a.u_values[1]
+            ):
+                continue
+
+            identical = (
+                b.maximum_velocity == a.maximum_velocity
+                and b.investment_costs == a.investment_costs
+                and tuple(b.u_values) == tuple(a.u_values)
+            )
+
+            if not identical or j < i:
+                dominated.add(i)
+                break
+
+    return dominated
@@ -1,15 +1,60 @@
 from abc import abstractmethod
-from typing import Dict, List
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import numpy as np
 
 from .topology import Topology
 
 
+@dataclass(frozen=True)
+class ComponentIndex:
+    """
+    Immutable index of the components of a heat network, so that the
+    (possibly overridden) naming convention of hot and cold pipes only has to
+    be evaluated once.
+
+    Pipes are identified by their integer id, which is their position in
+    `pipes`. The arrays `is_hot` and `is_cold` are indexed by this id, and
+    `partner` holds the id of the matching cold pipe for hot pipes and vice
+    versa, or -1 if there is no such pipe.
+    """
+
+    components: Dict[str, Tuple[str, ...]]
+    pipes: Tuple[str, ...]
+    pipe_ids: Dict[str, int]
+    is_hot: np.ndarray
+    is_cold: np.ndarray
+    partner: np.ndarray
+    hot_pipes: Tuple[str, ...]
+    cold_pipes: Tuple[str, ...]
+    hot_to_cold: Dict[str, str]
+    cold_to_hot: Dict[str, str]
+
+    def is_hot_pipe(self, pipe: str) -> bool:
+        return bool(self.is_hot[self.pipe_ids[pipe]])
+
+    def is_cold_pipe(self, pipe: str) -> bool:
+        return bool(self.is_cold[self.pipe_ids[pipe]])
+
+    def hot_pipe(self, pipe: str) -> str:
+        """
+        The hot pipe of the pair `pipe` belongs to, i.e. `pipe` itself if it
+        is not a cold pipe.
+        """
+        return self.cold_to_hot.get(pipe, pipe)
+
+
 class BaseComponentTypeMixin:
     """
     The standard naming convention is that pipes have "_hot" and "_cold" suffixes.
     Such convention can be overridden using the `is_hot_pipe` and `is_cold_pipe` methods.
     Moreover, one has to set the mapping between hot and cold pipes via `hot_to_cold_pipe`
     and `cold_to_hot_pipe`.
+
+    These methods are evaluated only once for every pipe, when building the
+    :py:class:`ComponentIndex` available as `heat_network_component_index`.
+    Code that loops over pipes should use the index instead.
     """
 
     @property
@@ -39,9 +84,81 @@ class BaseComponentTypeMixin:
         return f"{pipe[:-5]}_hot"
 
     @property
-    def hot_pipes(self) -> List[str]:
-        return [p for p in self.heat_network_components["pipe"] if self.is_hot_pipe(p)]
+    def heat_network_component_index(self) -> ComponentIndex:
+        try:
+            return self.__component_index
+        except AttributeError:
+            self.__component_index = self.__build_component_index()
+            return self.__component_index
+
+    def __build_component_index(self) -> ComponentIndex:
+        components = {k: tuple(v) for k, v in self.heat_network_components.items()}
+        pipes = components.get("pipe", ())
+        pipe_ids = {p: i for i, p in enumerate(pipes)}
+
+        is_hot = np.array([self.is_hot_pipe(p) for p in pipes], dtype=bool)
+        is_cold = np.array([self.is_cold_pipe(p) for p in pipes], dtype=bool)
+
+        hot_pipes = tuple(p for p, hot in zip(pipes, is_hot) if hot)
+        cold_pipes = tuple(p for p, cold in zip(pipes, is_cold) if cold)
+
+        hot_to_cold = {p: self.hot_to_cold_pipe(p) for p in hot_pipes}
+        cold_to_hot = {p: self.cold_to_hot_pipe(p) for p in cold_pipes}
+
+        partner = np.full(len(pipes), -1, dtype=int)
+        for a, b in (*hot_to_cold.items(), *cold_to_hot.items()):
+            partner[pipe_ids[a]] = pipe_ids.get(b, -1)
+
+        for arr in (is_hot, is_cold, partner):
+            arr.setflags(write=False)
+
+        return ComponentIndex(
+            components=components,
+            pipes=pipes,
+            pipe_ids=pipe_ids,
+            is_hot=is_hot,
+            is_cold=is_cold,
+            partner=partner,
+            hot_pipes=hot_pipes,
+            cold_pipes=cold_pipes,
+            hot_to_cold=hot_to_cold,
+            cold_to_hot=cold_to_hot,
+        )
+
+    @property
+    def heat_network_discharge_index(self) -> Dict[str, Tuple[str, ...]]:
+        """
+        Maps the canonical name of the discharge variable `.Q` of every
+        component to the components that share that variable through
+        aliases, e.g. a valve and the pipes it is connected to in series.
+
+        The index is built once, on first access after the aliases of the
+        model have been detected, so that looking up the components connected
+        to a discharge does not require scanning all components.
+        """
+        try:
+            return self.__discharge_index
+        except AttributeError:
+            self.__discharge_index = self.__build_discharge_index()
+            return self.__discharge_index
+
+    def __build_discharge_index(self) -> Dict[str, Tuple[str, ...]]:
+        alias_relation = self.alias_relation
+
+        index = {}
+        for component_type, components in self.heat_network_components.items():
+            if component_type == "node":
+                continue
+            for c in components:
+                canonical, _ = alias_relation.canonical_signed(f"{c}.Q")
+                index.setdefault(canonical, []).append(c)
+
+        return {k: tuple(v) for k, v in index.items()}
+
+    @property
+    def hot_pipes(self) -> Tuple[str, ...]:
+        return self.heat_network_component_index.hot_pipes
 
     @property
-    def cold_pipes(self) -> List[str]:
-        return [p for p in self.heat_network_components["pipe"] if self.is_cold_pipe(p)]
+    def cold_pipes(self) -> Tuple[str, ...]:
+        return self.heat_network_component_index.cold_pipes
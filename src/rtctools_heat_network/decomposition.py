@@ -0,0 +1,813 @@
+import logging
+import multiprocessing
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rtctools.data.storage import DataStore
+from rtctools.optimization.timeseries import Timeseries
+from rtctools.util import run_optimization_problem
+
+from .esdl.common import Asset
+from .esdl.esdl_mixin import _RunInfoReader, _overwrite_parameters, _shared_esdl_assets
+from .goals import BufferTargetGoal, DemandTrackingGoal
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+# ESDL asset types with a primary and a secondary side that are hydraulically
+# decoupled, see `_ESDLModelBase._esdl_convert`.
+FOUR_PORT_ASSET_TYPES = {"GenericConversion", "HeatPump"}
+
+
+@dataclass(frozen=True)
+class Coupling:
+    """
+    A four-port component between two hydraulically decoupled subsystems.
+
+    The `ratio` is the ratio between the heat delivered to the secondary side
+    and the heat taken from the primary side, i.e. the efficiency of a heat
+    exchanger or COP / (COP - 1) for a heat pump. The `capacity` is the
+    maximum heat on the secondary side.
+    """
+
+    name: str
+    primary: int
+    secondary: int
+    ratio: float
+    capacity: float
+
+
+@dataclass(frozen=True)
+class Subsystem:
+    """
+    The names of the assets of a hydraulically connected part of the network.
+    Four-port components on its boundary are not part of `assets`, but are
+    referred to by name in `couplings`.
+    """
+
+    index: int
+    assets: Tuple[str, ...]
+    couplings: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class DecompositionResult:
+    """
+    The combined results of all subsystems, in which the heat of coupling
+    components is available as ``<name>.Primary_heat`` and
+    ``<name>.Secondary_heat``.
+    """
+
+    results: Dict[str, np.ndarray]
+    subsystems: Tuple[Subsystem, ...]
+    couplings: Tuple[Coupling, ...]
+    iterations: int
+    converged: bool
+
+
+def _four_port_sides(asset: Asset):
+    """
+    The (in, out) ports of the primary and secondary side of a four-port
+    asset, following the carrier naming convention of `_esdl_convert`.
+    """
+    primary_in = next(p for p in asset.in_ports if "_ret" not in p.carrier_name)
+    secondary_in = next(p for p in asset.in_ports if "_ret" in p.carrier_name)
+    primary_out = next(p for p in asset.out_ports if "_ret" in p.carrier_name)
+    secondary_out = next(p for p in asset.out_ports if "_ret" not in p.carrier_name)
+    return (primary_in, primary_out), (secondary_in, secondary_out)
+
+
+def _coupling_ratio_and_capacity(asset: Asset) -> Tuple[float, float]:
+    power = asset.attributes.get("power")
+    if not power:
+        raise Exception(f"{asset.name} has no power specified, which is required to decompose")
+
+    if asset.asset_type == "HeatPump":
+        cop = asset.attributes["COP"]
+        return cop / (cop - 1.0), cop * power
+    else:
+        return asset.attributes["efficiency"], power
+
+
+def hydraulic_subsystems(assets: Dict[str, Asset]) -> Tuple[List[Subsystem], List[Coupling]]:
+    """
+    Splits the network in its hydraulically connected parts. Four-port
+    components (heat exchangers and heat pumps) are cut in their primary and
+    secondary side. When both sides end up in the same part, the component
+    is kept as is.
+    """
+
+    parent = {}
+
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a, b):
+        parent[find(a)] = find(b)
+
+    four_ports = {}
+
+    for asset in assets.values():
+        for port in asset.ports:
+            for connected_to in port.connected_to:
+                union(port.index, connected_to)
+
+        if asset.asset_type in FOUR_PORT_ASSET_TYPES:
+            four_ports[asset.id] = _four_port_sides(asset)
+            for a, b in four_ports[asset.id]:
+                union(a.index, b.index)
+        else:
+            for port in asset.ports[1:]:
+                union(asset.ports[0].index, port.index)
+
+    roots = {}
+
+    def subsystem_index(port):
+        return roots.setdefault(find(port.index), len(roots))
+
+    members = {}
+    couplings = []
+
+    for asset in assets.values():
+        if asset.id in four_ports:
+            primary, secondary = four_ports[asset.id]
+            p, s = subsystem_index(primary[0]), subsystem_index(secondary[0])
+            if p != s:
+                ratio, capacity = _coupling_ratio_and_capacity(asset)
+                couplings.append(Coupling(asset.name, p, s, ratio, capacity))
+                continue
+            i = p
+        else:
+            i = subsystem_index(asset.ports[0])
+        members.setdefault(i, []).append(asset.name)
+
+    subsystems = []
+    for i in range(len(roots)):
+        names = tuple(c.name for c in couplings if i in (c.primary, c.secondary))
+        subsystems.append(Subsystem(i, tuple(members.get(i, [])), names))
+
+    return subsystems, couplings
+
+
+def _subsystem_assets(assets: Dict[str, Asset], subsystem: Subsystem, couplings: List[Coupling]):
+    """
+    The assets of a subsystem, in which the coupling components are replaced
+    by a demand on their primary side, or a source on their secondary side.
+    """
+    names = set(subsystem.assets)
+    couplings = {c.name: c for c in couplings if c.name in subsystem.couplings}
+
+    result = {}
+
+    for k, asset in assets.items():
+        if asset.name in names:
+            result[k] = asset
+        elif asset.name in couplings:
+            c = couplings[asset.name]
+            primary, secondary = _four_port_sides(asset)
+            if c.primary == subsystem.index:
+                asset_type, ports, power = "GenericConsumer", primary, c.capacity / c.ratio
+            else:
+                asset_type, ports, power = "GenericProducer", secondary, c.capacity
+            result[k] = Asset(
+                asset_type,
+                asset.id,
+                asset.name,
+                (ports[0],),
+                (ports[1],),
+                {"power": power},
+                asset.global_properties,
+            )
+
+    return result
+
+
+def subsystem_problem_class(
+    problem_class,
+    subsystem: Subsystem,
+    couplings: List[Coupling],
+    demand_targets: Dict[str, np.ndarray],
+    source_limits: Dict[str, Optional[np.ndarray]],
+    coupling_priority: int = 1,
+):
+    """
+    A subclass of an ESDL Heat problem class, that only contains the assets
+    of one subsystem. Coupling components on the primary side become
+    demands, that track the given target heat, and on the secondary side
+    sources, of which the heat is limited to the given profile, if any.
+    """
+    cls = None
+
+    def esdl_assets(self):
+        try:
+            return self._subsystem_esdl_assets
+        except AttributeError:
+            assets = super(cls, self).esdl_assets
+            self._subsystem_esdl_assets = _subsystem_assets(assets, subsystem, couplings)
+            return self._subsystem_esdl_assets
+
+    def read(self):
+        super(cls, self).read()
+
+        datetimes = self.io.datetimes
+        for ensemble_member in range(self.ensemble_size):
+            for name, target in demand_targets.items():
+                self.io.set_timeseries(
+                    f"{name}.target_heat_demand", datetimes, target, ensemble_member
+                )
+
+    def bounds(self):
+        bounds = super(cls, self).bounds()
+        times = self.times()
+        for name, limit in source_limits.items():
+            if limit is not None:
+                bounds[f"{name}.Heat_source"] = (0.0, Timeseries(times, limit))
+        return bounds
+
+    def goals(self):
+        goals = super(cls, self).goals().copy()
+        for name in demand_targets:
+            target = self.get_timeseries(f"{name}.target_heat_demand")
+            goals.append(DemandTrackingGoal(self, name, target, priority=coupling_priority))
+        return goals
+
+    def write(self):
+        pass
+
+    namespace = {
+        "esdl_assets": property(esdl_assets),
+        "esdl_share_parsed_assets": True,
+        "read": read,
+        "bounds": bounds,
+        "goals": goals,
+        "write": write,
+    }
+
+    cls = type(problem_class.__name__, (problem_class,), namespace)
+    cls.__qualname__ = f"{problem_class.__qualname__}[subsystem_{subsystem.index}]"
+
+    return cls
+
+
+@dataclass(frozen=True)
+class _Decomposition:
+    problem_class: type
+    subsystems: Tuple[Subsystem, ...]
+    couplings: Tuple[Coupling, ...]
+    coupling_priority: int
+    log_level: int
+    kwargs: Dict
+
+
+# The decomposition that is solved by the worker processes. With the fork
+# start method, it is inherited from the parent process and never pickled.
+_decomposition = None
+
+
+def _init_worker(decomposition):
+    global _decomposition
+    _decomposition = decomposition
+
+
+@contextmanager
+def _worker_pool(decomposition, max_workers: Optional[int], n_jobs: int):
+    """
+    Yields a function like `map` that runs the jobs in a pool of (forked)
+    processes, or in this process when there is only a single worker.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, n_jobs)
+
+    if max_workers <= 1:
+        _init_worker(decomposition)
+        try:
+            yield lambda f, *args: list(map(f, *args))
+        finally:
+            _init_worker(None)
+    else:
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+
+        with ProcessPoolExecutor(
+            max_workers, mp_context=context, initializer=_init_worker, initargs=(decomposition,)
+        ) as executor:
+            yield lambda f, *args: list(executor.map(f, *args))
+
+
+def _resolve_folders(base_folder: str, kwargs: Dict):
+    """
+    Resolves the folders like run_optimization_problem does, so that the
+    worker processes do not depend on the working directory or sys.path.
+    """
+    if not os.path.isabs(base_folder):
+        base_folder = os.path.join(sys.path[0], base_folder)
+    for name, subfolder in [
+        ("model_folder", "model"),
+        ("input_folder", "input"),
+        ("output_folder", "output"),
+    ]:
+        kwargs.setdefault(name, os.path.join(base_folder, subfolder))
+
+
+def _results_with_aliases(problem) -> Dict[str, np.ndarray]:
+    """
+    The results of a solved problem, for all aliases of every variable, as
+    the alias relation is not passed back from the worker processes.
+    """
+    extracted = problem.extract_results()
+    results = {}
+    for canonical in extracted.keys():
+        values = np.asarray(extracted[canonical])
+        for alias in problem.alias_relation.aliases(canonical):
+            if alias.startswith("-"):
+                results[alias[1:]] = -values
+            else:
+                results[alias] = values
+    return results
+
+
+def _solve_subsystem(index: int, demand_targets, source_limits):
+    d = _decomposition
+    cls = subsystem_problem_class(
+        d.problem_class,
+        d.subsystems[index],
+        list(d.couplings),
+        demand_targets,
+        source_limits,
+        d.coupling_priority,
+    )
+
+    try:
+        problem = run_optimization_problem(cls, log_level=d.log_level, **d.kwargs)
+    except Exception:
+        return None, traceback.format_exc()
+
+    return _results_with_aliases(problem), None
+
+
+def run_decomposed_optimization(
+    problem_class,
+    max_iterations: int = 10,
+    tolerance: float = 1e-3,
+    coupling_priority: int = 1,
+    max_workers: Optional[int] = None,
+    base_folder: str = "..",
+    log_level: int = logging.WARNING,
+    **kwargs,
+) -> DecompositionResult:
+    """
+    Solves an ESDL based Heat problem per hydraulically decoupled subsystem,
+    see :py:func:`hydraulic_subsystems`, with the subsystems solved in
+    parallel processes.
+
+    The subsystems are coordinated by exchanging the heat profiles of the
+    coupling components, as in a fixed-point iteration:
+
+    - On the secondary side, the coupling component is a source, of which the
+      heat is limited to what the primary side was able to deliver, where
+      that fell short of the request.
+    - On the primary side, it is a demand that tracks the heat requested by
+      the secondary side at `coupling_priority`. The demand also gets a
+      ``target_heat_demand`` time series, like other demands.
+
+    Subsystems are first solved once the heat requested from them is known,
+    starting with those that are not the primary side of any coupling. All
+    subsystems of which the inputs changed are then solved in parallel,
+    until none of the profiles changes by more than `tolerance` times the
+    capacity of its coupling component.
+
+    :param problem_class: The ESDL Heat optimization problem class to solve.
+    :param max_iterations: The maximum number of iterations.
+    :param tolerance: The tolerance on the heat profiles, relative to capacity.
+    :param coupling_priority: The priority of tracking requested heat.
+    :param max_workers: The number of processes, defaults to the number of CPUs.
+    :param base_folder: Base folder, see :py:func:`run_optimization_problem`.
+    :param log_level: The log level of the subsystem solves.
+
+    :returns: The combined results of the subsystems.
+    """
+
+    _resolve_folders(base_folder, kwargs)
+
+    run_info = _RunInfoReader(
+        problem_class.esdl_run_info_path or Path(kwargs["input_folder"]) / "RunInfo.xml"
+    )
+    assets = _shared_esdl_assets(run_info.esdl_file)
+    if run_info.parameters_file is not None:
+        assets = _overwrite_parameters(run_info.parameters_file, assets)
+
+    subsystems, couplings = hydraulic_subsystems(assets)
+
+    logger.info(
+        f"Decomposed the network in {len(subsystems)} subsystems "
+        f"with {len(couplings)} coupling components"
+    )
+
+    decomposition = _Decomposition(
+        problem_class, tuple(subsystems), tuple(couplings), coupling_priority, log_level, kwargs
+    )
+
+    def changed(a, b, tol):
+        if a is None or b is None:
+            return a is not b
+        return np.max(np.abs(a - b)) > tol
+
+    # The heat requested by, and the limit on, the secondary side
+    requested = {c.name: None for c in couplings}
+    limits = {c.name: None for c in couplings}
+
+    # The inputs and results of the last solve of every subsystem
+    inputs = [None] * len(subsystems)
+    results = [None] * len(subsystems)
+
+    converged = False
+    iteration = 0
+
+    with _worker_pool(decomposition, max_workers, len(subsystems)) as pool_map:
+        while iteration < max_iterations:
+            # A subsystem is (re)solved once the heat requested from it is
+            # known, and only when its inputs changed since its last solve.
+            jobs = []
+            for s in subsystems:
+                primary = [c for c in couplings if c.primary == s.index]
+                secondary = [c for c in couplings if c.secondary == s.index]
+
+                if any(requested[c.name] is None for c in primary):
+                    continue
+
+                demand_targets = {c.name: requested[c.name] / c.ratio for c in primary}
+                source_limits = {c.name: limits[c.name] for c in secondary}
+
+                if inputs[s.index] is not None:
+                    previous_targets, previous_limits = inputs[s.index]
+                    if not any(
+                        changed(demand_targets[c.name], previous_targets[c.name], tol)
+                        for c in primary
+                        for tol in [tolerance * c.capacity / c.ratio]
+                    ) and not any(
+                        changed(source_limits[c.name], previous_limits[c.name], tol)
+                        for c in secondary
+                        for tol in [tolerance * c.capacity]
+                    ):
+                        continue
+
+                jobs.append((s.index, demand_targets, source_limits))
+
+            if not jobs:
+                if any(r is None for r in results):
+                    raise Exception("Subsystems with cyclic couplings cannot be decomposed")
+                converged = True
+                break
+
+            iteration += 1
+
+            outcomes = pool_map(_solve_subsystem, *zip(*jobs))
+
+            for (index, demand_targets, source_limits), (r, error) in zip(jobs, outcomes):
+                if error is not None:
+                    raise Exception(f"Solving subsystem {index} failed:\n{error}")
+                inputs[index] = (demand_targets, source_limits)
+                results[index] = r
+
+            for c in couplings:
+                if results[c.secondary] is not None:
+                    requested[c.name] = results[c.secondary][f"{c.name}.Heat_source"]
+
+                if results[c.primary] is not None:
+                    # Limit the secondary side where the primary side could
+                    # not deliver the heat it was asked for.
+                    target = inputs[c.primary][0][c.name] * c.ratio
+                    delivered = results[c.primary][f"{c.name}.Heat_demand"] * c.ratio
+                    shortfall = delivered < target - tolerance * c.capacity
+                    if np.any(shortfall):
+                        limit = limits[c.name]
+                        if limit is None:
+                            limit = np.full(len(delivered), c.capacity)
+                        limits[c.name] = np.where(shortfall, np.clip(delivered, 0.0, limit), limit)
+
+            logger.info(f"Decomposition iteration {iteration}: solved {len(jobs)} subsystems")
+        else:
+            logger.warning(f"Decomposition did not converge within {max_iterations} iterations")
+
+    combined = {}
+    coupling_names = {c.name for c in couplings}
+    for subsystem_results in results:
+        combined.update(
+            (k, v) for k, v in subsystem_results.items() if k.split(".")[0] not in coupling_names
+        )
+    for c in couplings:
+        combined[f"{c.name}.Primary_heat"] = results[c.primary][f"{c.name}.Heat_demand"]
+        combined[f"{c.name}.Secondary_heat"] = results[c.secondary][f"{c.name}.Heat_source"]
+
+    return DecompositionResult(combined, tuple(subsystems), tuple(couplings), iteration, converged)
+
+
+@dataclass(frozen=True)
+class Window:
+    """
+    A window of time indices ``[start, stop)`` of a horizon. The results of
+    the window are used for its core ``[core_start, core_stop)``, the rest
+    overlaps with the cores of its neighbours.
+    """
+
+    index: int
+    start: int
+    stop: int
+    core_start: int
+    core_stop: int
+
+
+@dataclass(frozen=True)
+class HorizonDecompositionResult:
+    """
+    The results of all windows, of which time series are stitched together
+    from the cores of the windows.
+    """
+
+    results: Dict[str, np.ndarray]
+    windows: Tuple[Window, ...]
+    iterations: int
+    converged: bool
+
+
+def horizon_windows(n_times: int, n_windows: int, overlap: int) -> List[Window]:
+    """
+    Splits a horizon of `n_times` times in `n_windows` windows of about
+    equal length, that overlap their neighbours by `overlap` times.
+
+    The first time of a window is only used for its initial state, so
+    windows overlap by at least one time.
+    """
+    if overlap < 1:
+        raise Exception("Windows have to overlap by at least one time")
+
+    bounds = np.linspace(0, n_times, n_windows + 1).round().astype(int)
+
+    windows = []
+    for i, (core_start, core_stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        start = max(core_start - overlap, 0)
+        stop = min(core_stop + overlap, n_times)
+        if stop - start <= 2:
+            raise Exception(f"Window {i} has fewer than three times, use fewer windows")
+        windows.append(Window(i, int(start), int(stop), int(core_start), int(core_stop)))
+
+    return windows
+
+
+def window_problem_class(
+    problem_class,
+    window: Window,
+    initial_stored_heat: Optional[Dict[str, float]] = None,
+    final_stored_heat: Optional[Dict[str, float]] = None,
+    boundary_priority: int = 1,
+):
+    """
+    A subclass of a Heat problem class that only optimizes the times of a
+    window. The initial stored heat of buffers is passed as the ``init_Heat``
+    parameter, such that it is checked and fixed like the initial state of
+    the full horizon. The final stored heat is a target at
+    `boundary_priority`.
+    """
+    cls = None
+
+    def read(self):
+        super(cls, self).read()
+
+        # Only keep the times of the window
+        io = self.io
+        datetimes = io.datetimes
+        series = [
+            (m, v, io.get_timeseries(v, m)[1])
+            for m in range(io.ensemble_size)
+            for v in io.get_timeseries_names(m)
+        ]
+        parameters = [
+            (m, p, v) for m in range(io.ensemble_size) for p, v in io.parameters(m).items()
+        ]
+
+        offset = datetimes.index(io.reference_datetime)
+        self.io = DataStore(self)
+        start, stop = offset + window.start, offset + window.stop
+        self.io.reference_datetime = datetimes[start]
+        for m, v, values in series:
+            self.io.set_timeseries(v, datetimes[start:stop], values[start:stop], m)
+        for m, p, v in parameters:
+            self.io.set_parameter(p, v, m)
+
+    def parameters(self, ensemble_member):
+        parameters = super(cls, self).parameters(ensemble_member)
+        if initial_stored_heat is not None:
+            for b, heat in initial_stored_heat.items():
+                parameters[f"{b}.init_Heat"] = heat
+                parameters[f"{b}.init_V_hot_tank"] = np.nan
+        return parameters
+
+    def goals(self):
+        goals = super(cls, self).goals().copy()
+        if final_stored_heat is not None:
+            n_times = len(self.times())
+            for b, heat in final_stored_heat.items():
+                target = np.full(n_times, np.nan)
+                target[-1] = heat
+                # Order 1, so that MILP windows stay linear
+                goals.append(BufferTargetGoal(self, b, target, priority=boundary_priority, order=1))
+        return goals
+
+    def write(self):
+        pass
+
+    namespace = {
+        "read": read,
+        "parameters": parameters,
+        "goals": goals,
+        "write": write,
+    }
+
+    cls = type(problem_class.__name__, (problem_class,), namespace)
+    cls.__qualname__ = f"{problem_class.__qualname__}[window_{window.index}]"
+
+    return cls
+
+
+@dataclass(frozen=True)
+class _HorizonDecomposition:
+    problem_class: type
+    windows: Tuple[Window, ...]
+    boundary_priority: int
+    log_level: int
+    kwargs: Dict
+
+
+def _solve_window(index: int, initial_stored_heat, final_stored_heat):
+    d = _decomposition
+    cls = window_problem_class(
+        d.problem_class,
+        d.windows[index],
+        initial_stored_heat,
+        final_stored_heat,
+        d.boundary_priority,
+    )
+
+    try:
+        problem = run_optimization_problem(cls, log_level=d.log_level, **d.kwargs)
+    except Exception:
+        return None, traceback.format_exc()
+
+    return _results_with_aliases(problem), None
+
+
+def run_horizon_decomposed_optimization(
+    problem_class,
+    n_windows: int,
+    overlap: int = 1,
+    max_iterations: int = 10,
+    tolerance: float = 1e-3,
+    relaxation: float = 0.5,
+    boundary_priority: int = 1,
+    max_workers: Optional[int] = None,
+    base_folder: str = "..",
+    log_level: int = logging.WARNING,
+    **kwargs,
+) -> HorizonDecompositionResult:
+    """
+    Solves a long horizon Heat problem in overlapping windows, see
+    :py:func:`horizon_windows`, with the windows solved in parallel
+    processes. This is meant for operational problems; results that are not
+    time series, e.g. optimized sizes, are those of the first window.
+
+    The windows are coupled through the stored heat of the buffers. Every
+    iteration, all windows are solved with the stitched results of the
+    previous iteration:
+
+    - The stored heat at the first time of a window is fixed to that of the
+      previous window, like the initial stored heat of the horizon (see the
+      ``init_Heat`` parameter of buffers). The first iteration starts every
+      window with the initial state of the horizon.
+    - The stored heat at the last time of a window is a target, at
+      `boundary_priority`, taken from the next window. These targets are
+      under-relaxed with the factor `relaxation`.
+
+    The iteration stops when the initial stored heat of all windows changes
+    by less than `tolerance` times the largest stored heat of the buffer.
+    Without buffers, the windows are independent and solved once.
+
+    :param problem_class: The Heat optimization problem class to solve.
+    :param n_windows: The number of windows.
+    :param overlap: The number of times by which windows overlap.
+    :param max_iterations: The maximum number of iterations.
+    :param tolerance: The tolerance on the stored heat, relative to its maximum.
+    :param relaxation: The relaxation factor of the final stored heat targets.
+    :param boundary_priority: The priority of the target on the final stored heat.
+    :param max_workers: The number of processes, defaults to the number of CPUs.
+    :param base_folder: Base folder, see :py:func:`run_optimization_problem`.
+    :param log_level: The log level of the window solves.
+
+    :returns: The stitched results of the windows.
+    """
+
+    _resolve_folders(base_folder, kwargs)
+
+    # The number of times is only known after reading the input, so we set
+    # up (but do not solve) the full problem once.
+    problem = problem_class(**kwargs)
+    problem.read()
+    n_times = len(problem.times())
+    buffers = problem.heat_network_components.get("buffer", [])
+    del problem
+
+    windows = horizon_windows(n_times, n_windows, overlap)
+
+    decomposition = _HorizonDecomposition(
+        problem_class, tuple(windows), boundary_priority, log_level, kwargs
+    )
+
+    def boundary_values(results):
+        # The stored heat at the first and last time of every window
+        return {
+            b: np.array([results[f"{b}.Stored_heat"][[w.start, w.stop - 1]] for w in windows])
+            for b in buffers
+        }
+
+    boundaries = None
+    stitched = None
+    converged = False
+    iteration = 0
+
+    with _worker_pool(decomposition, max_workers, len(windows)) as pool_map:
+        while iteration < max_iterations:
+            jobs = []
+            for w in windows:
+                initial, final = None, None
+                if boundaries is not None:
+                    if w.start > 0:
+                        initial = {b: v[w.index, 0] for b, v in boundaries.items()}
+                    if w.stop < n_times:
+                        final = {b: v[w.index, 1] for b, v in boundaries.items()}
+                jobs.append((w.index, initial, final))
+
+            iteration += 1
+
+            outcomes = pool_map(_solve_window, *zip(*jobs))
+
+            for w, (_, error) in zip(windows, outcomes):
+                if error is not None:
+                    raise Exception(f"Solving window {w.index} failed:\n{error}")
+
+            stitched = {}
+            for k, v in outcomes[0][0].items():
+                if v.ndim == 1 and len(v) == windows[0].stop - windows[0].start:
+                    stitched[k] = np.concatenate(
+                        [
+                            r[k][w.core_start - w.start : w.core_stop - w.start]
+                            for w, (r, _) in zip(windows, outcomes)
+                        ]
+                    )
+                else:
+                    stitched[k] = v
+
+            logger.info(f"Horizon decomposition iteration {iteration}")
+
+            if not buffers:
+                converged = True
+                break
+
+            # The windows are consistent when the stitched stored heat at
+            # their boundaries is what they were given to start and end with.
+            proposed = boundary_values(stitched)
+            if boundaries is None:
+                boundaries = proposed
+                continue
+
+            converged = True
+            for b, v in proposed.items():
+                scale = max(np.max(np.abs(stitched[f"{b}.Stored_heat"])), 1.0)
+                if np.any(np.abs(v[1:, 0] - boundaries[b][1:, 0]) > tolerance * scale):
+                    converged = False
+                # The initial states are passed on as is, such that the
+                # stitched stored heat is continuous. Under-relaxation of the
+                # final targets damps their oscillation between iterations.
+                boundaries[b][:, 0] = v[:, 0]
+                boundaries[b][:, 1] += relaxation * (v[:, 1] - boundaries[b][:, 1])
+
+            if converged:
+                break
+        else:
+            logger.warning(
+                f"Horizon decomposition did not converge within {max_iterations} iterations"
+            )
+
+    return HorizonDecompositionResult(stitched, tuple(windows), iteration, converged)
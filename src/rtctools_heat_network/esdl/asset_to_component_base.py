@@ -5,8 +5,6 @@ import os
 from pathlib import Path
 from typing import Dict, Tuple, Type, Union
 
-import esdl
-
 from rtctools_heat_network.pycml import Model as _Model
 
 from .common import Asset
@@ -81,8 +79,8 @@ class _AssetToComponentBase:
             Tuple[pycml_heat_component_type, Dict[component_attribute, new_attribute_value]]
         """
 
-        for port in [*asset.in_ports, *asset.out_ports]:
-            self._port_to_esdl_component_type[port] = asset.asset_type
+        for port in asset.ports:
+            self._port_to_esdl_component_type[port.index] = asset.asset_type
 
         dispatch_method_name = f"convert_{self.component_map[asset.asset_type]}"
         return getattr(self, dispatch_method_name)(asset)
@@ -93,24 +91,26 @@ class _AssetToComponentBase:
         # over `innerDiameter` and `material` (while logging warnings if both
         # are specified)
         full_name = f"{asset.asset_type} '{asset.name}'"
-        if asset.attributes["innerDiameter"] and asset.attributes["diameter"].value > 0:
+        dn_size = asset.attributes["diameter"]
+        if dn_size == "VALUE_SPECIFIED":
+            dn_size = None
+
+        if asset.attributes["innerDiameter"] and dn_size:
             logger.warning(
                 f"{full_name}' has both 'innerDiameter' and 'diameter' specified. "
-                f"Diameter of {asset.attributes['diameter'].name} will be used."
+                f"Diameter of {dn_size} will be used."
             )
-        if asset.attributes["material"] and asset.attributes["diameter"].value > 0:
+        if asset.attributes["material"] and dn_size:
             logger.warning(
                 f"{full_name}' has both 'material' and 'diameter' specified. "
-                f"Insulation properties of {asset.attributes['diameter'].name} will be used."
+                f"Insulation properties of {dn_size} will be used."
             )
-        if asset.attributes["material"] and (
-            asset.attributes["diameter"].value == 0 and not asset.attributes["innerDiameter"]
-        ):
+        if asset.attributes["material"] and (not dn_size and not asset.attributes["innerDiameter"]):
             logger.warning(
                 f"{full_name}' has only 'material' specified, but no information on diameter. "
                 f"Diameter and insulation properties of DN200 will be used."
             )
-        if asset.attributes["diameter"].value == 0 and not asset.attributes["innerDiameter"]:
+        if not dn_size and not asset.attributes["innerDiameter"]:
             if asset.attributes["material"]:
                 logger.warning(
                     f"{full_name}' has only 'material' specified, but no information on diameter. "
@@ -123,8 +123,8 @@ class _AssetToComponentBase:
                 )
 
         edr_dn_size = None
-        if asset.attributes["diameter"].value > 0:
-            edr_dn_size = str(asset.attributes["diameter"].name)
+        if dn_size:
+            edr_dn_size = dn_size
         elif not asset.attributes["innerDiameter"]:
             edr_dn_size = "DN200"
 
@@ -143,17 +143,10 @@ class _AssetToComponentBase:
             diameter = asset.attributes["innerDiameter"]
 
             # Insulation properties
-            material = asset.attributes["material"]
-
-            if material is not None:
-                if isinstance(material, esdl.esdl.MatterReference):
-                    material = material.reference
-
-                assert isinstance(material, esdl.esdl.CompoundMatter)
-                components = material.component.items
-                if components:
-                    insulation_thicknesses = [x.layerWidth for x in components]
-                    conductivies_insulation = [x.matter.thermalConductivity for x in components]
+            layers = asset.attributes["material"]
+            if layers:
+                insulation_thicknesses = [x.width for x in layers]
+                conductivies_insulation = [x.thermal_conductivity for x in layers]
 
         return diameter, insulation_thicknesses, conductivies_insulation
 
@@ -162,10 +155,10 @@ class _AssetToComponentBase:
         assert asset.asset_type == "Pipe"
         if len(asset.in_ports) == 1 and len(asset.out_ports) == 1:
             connected_type_in = self._port_to_esdl_component_type.get(
-                asset.in_ports[0].connectedTo[0], None
+                asset.in_ports[0].connected_to[0], None
             )
             connected_type_out = self._port_to_esdl_component_type.get(
-                asset.out_ports[0].connectedTo[0], None
+                asset.out_ports[0].connected_to[0], None
             )
         else:
             raise RuntimeError("Pipe does not have 1 in port and 1 out port")
@@ -183,16 +176,16 @@ class _AssetToComponentBase:
             return False
 
     def _set_q_nominal(self, asset, q_nominal):
-        self._port_to_q_nominal[asset.in_ports[0]] = q_nominal
-        self._port_to_q_nominal[asset.out_ports[0]] = q_nominal
+        self._port_to_q_nominal[asset.in_ports[0].index] = q_nominal
+        self._port_to_q_nominal[asset.out_ports[0].index] = q_nominal
 
     def _get_connected_q_nominal(self, asset):
         if len(asset.in_ports) == 1 and len(asset.out_ports) == 1:
             try:
-                connected_port = asset.in_ports[0].connectedTo[0]
+                connected_port = asset.in_ports[0].connected_to[0]
                 q_nominal = self._port_to_q_nominal[connected_port]
             except KeyError:
-                connected_port = asset.out_ports[0].connectedTo[0]
+                connected_port = asset.out_ports[0].connected_to[0]
                 q_nominal = self._port_to_q_nominal.get(connected_port, None)
 
             if q_nominal is not None:
@@ -207,18 +200,19 @@ class _AssetToComponentBase:
             for p in asset.in_ports:
                 out_port = None
                 for p2 in asset.out_ports:
-                    if p2.carrier.name == p.carrier.name:
+                    if p2.carrier_name == p.carrier_name:
                         out_port = p2
                 try:
-                    connected_port = p.connectedTo[0]
+                    connected_port = p.connected_to[0]
                     q_nominal = self._port_to_q_nominal[connected_port]
                 except KeyError:
-                    connected_port = out_port.connectedTo[0]
+                    connected_port = out_port.connected_to[0]
                     q_nominal = self._port_to_q_nominal.get(connected_port, None)
                 if q_nominal is not None:
-                    self._port_to_q_nominal[p] = q_nominal
-                    self._port_to_q_nominal[out_port] = q_nominal
-                    if "_ret" in p.carrier.name:
+                    self._port_to_q_nominal[p.index] = q_nominal
+                    if out_port is not None:
+                        self._port_to_q_nominal[out_port.index] = q_nominal
+                    if "_ret" in p.carrier_name:
                         q_nominals["Secondary"] = {"Q_nominal": q_nominal}
                     else:
                         q_nominals["Primary"] = {"Q_nominal": q_nominal}
@@ -231,7 +225,7 @@ class _AssetToComponentBase:
     @staticmethod
     def _get_supply_return_temperatures(asset: Asset) -> Tuple[float, float]:
         assert len(asset.in_ports) == 1 and len(asset.out_ports) == 1
-        carrier = asset.global_properties["carriers"][asset.in_ports[0].carrier.id]
+        carrier = asset.global_properties["carriers"][asset.in_ports[0].carrier_id]
         supply_temperature = carrier["supplyTemperature"]
         return_temperature = carrier["returnTemperature"]
 
@@ -249,8 +243,8 @@ class _AssetToComponentBase:
             return {"T_supply": supply_temperature, "T_return": return_temperature}
         elif len(asset.in_ports) == 2 and len(asset.out_ports) == 2:
             for p in asset.in_ports:
-                carrier = asset.global_properties["carriers"][p.carrier.id]
-                if "_ret" in p.carrier.name:
+                carrier = asset.global_properties["carriers"][p.carrier_id]
+                if "_ret" in p.carrier_name:
                     # This in the Secondary side carrier
                     sec_supply_temperature = carrier["supplyTemperature"]
                     sec_return_temperature = carrier["returnTemperature"]
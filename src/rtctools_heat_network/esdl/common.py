@@ -1,12 +1,74 @@
 from dataclasses import dataclass
+from typing import Optional, Tuple
 
 
-@dataclass
+@dataclass(frozen=True)
+class Port:
+    """
+    Compact representation of an ESDL in- or outport.
+
+    Ports are identified by their integer `index`, which is unique over all
+    ports of all parsed assets. The connections of a port are stored as a
+    tuple of the indices of the ports it is connected to, so that no
+    references to the pyecore objects have to be kept around.
+    """
+
+    __slots__ = ("index", "id", "carrier_id", "carrier_name", "is_in_port", "connected_to")
+
+    index: int
+    id: str
+    carrier_id: Optional[str]
+    carrier_name: Optional[str]
+    is_in_port: bool
+    connected_to: Tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class InsulationLayer:
+    """
+    A layer of the (compound) material of a pipe, from the inside out.
+    """
+
+    __slots__ = ("width", "thermal_conductivity")
+
+    width: float
+    thermal_conductivity: float
+
+
+@dataclass(frozen=True)
 class Asset:
+    """
+    Compact representation of an ESDL asset.
+
+    The `attributes` only contain plain Python values: numbers, strings and
+    booleans for the attributes of the ESDL class, with enumeration literals
+    stored by name (e.g. ``"DN300"`` for the diameter of a pipe). Of the
+    references to other ESDL objects only what the converters use is kept:
+
+    - ``material``: the insulation layers of a pipe, as a tuple of
+      :py:class:`InsulationLayer`, or None if not specified.
+    - ``variableOperationalCosts``: the value of the variable operational
+      costs in the cost information of the asset, or None if not specified.
+    """
+
+    __slots__ = (
+        "asset_type",
+        "id",
+        "name",
+        "in_ports",
+        "out_ports",
+        "attributes",
+        "global_properties",
+    )
+
     asset_type: str
     id: str
     name: str
-    in_ports: None
-    out_ports: None
+    in_ports: Tuple[Port, ...]
+    out_ports: Tuple[Port, ...]
     attributes: dict
     global_properties: dict
+
+    @property
+    def ports(self) -> Tuple[Port, ...]:
+        return (*self.in_ports, *self.out_ports)
@@ -2,8 +2,6 @@ import logging
 import math
 from typing import Dict, Tuple, Type
 
-import esdl
-
 from rtctools_heat_network.pycml.component_library.heat import (
     ATES,
     Buffer,
@@ -138,20 +136,20 @@ class AssetToHeatComponent(_AssetToComponentBase):
         sum_out = 0
 
         node_carrier = None
-        for x in asset.attributes["port"].items:
+        for x in asset.ports:
             if node_carrier is None:
-                node_carrier = x.carrier.name
+                node_carrier = x.carrier_name
             else:
-                if node_carrier != x.carrier.name:
+                if node_carrier != x.carrier_name:
                     raise _ESDLInputException(
                         f"{asset.name} has multiple carriers mixing which is not allowed. "
                         f"Only one carrier (carrier couple) allowed in hydraulicly "
                         f"coupled system"
                     )
-            if type(x) == esdl.esdl.InPort:
-                sum_in += len(x.connectedTo)
-            if type(x) == esdl.esdl.OutPort:
-                sum_out += len(x.connectedTo)
+            if x.is_in_port:
+                sum_in += len(x.connected_to)
+            else:
+                sum_out += len(x.connected_to)
 
         modifiers = dict(
             n=sum_in + sum_out,
@@ -290,11 +288,9 @@ class AssetToHeatComponent(_AssetToComponentBase):
 
         # get price per unit of energy,
         # assume cost of 1. if nothing is given (effectively heat loss minimization)
-        price = 1.0
-        if "costInformation" in asset.attributes.keys():
-            if hasattr(asset.attributes["costInformation"], "variableOperationalCosts"):
-                if hasattr(asset.attributes["costInformation"].variableOperationalCosts, "value"):
-                    price = asset.attributes["costInformation"].variableOperationalCosts.value
+        price = asset.attributes.get("variableOperationalCosts")
+        if price is None:
+            price = 1.0
 
         modifiers = dict(
             Q_nominal=self._get_connected_q_nominal(asset),
@@ -347,11 +343,9 @@ class AssetToHeatComponent(_AssetToComponentBase):
 
         # get price per unit of energy,
         # assume cost of 1. if nothing is given (effectively heat loss minimization)
-        price = 1.0
-        if "costInformation" in asset.attributes.keys():
-            if hasattr(asset.attributes["costInformation"], "variableOperationalCosts"):
-                if hasattr(asset.attributes["costInformation"].variableOperationalCosts, "value"):
-                    price = asset.attributes["costInformation"].variableOperationalCosts.value
+        price = asset.attributes.get("variableOperationalCosts")
+        if price is None:
+            price = 1.0
 
         modifiers = dict(
             Q_nominal=self._get_connected_q_nominal(asset),
@@ -391,9 +385,15 @@ class AssetToHeatComponent(_AssetToComponentBase):
 
 
 class ESDLHeatModel(_ESDLModelBase):
-    def __init__(self, assets: Dict[str, Asset], converter_class=AssetToHeatComponent, **kwargs):
+    def __init__(
+        self,
+        assets: Dict[str, Asset],
+        converter_class=AssetToHeatComponent,
+        use_templates=False,
+        **kwargs,
+    ):
         super().__init__(None)
 
         converter = converter_class(**kwargs)
 
-        self._esdl_convert(converter, assets, "Heat")
+        self._esdl_convert(converter, assets, "Heat", use_templates)
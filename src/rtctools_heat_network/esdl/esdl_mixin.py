@@ -1,9 +1,13 @@
+import dataclasses
 import datetime
 import logging
+import sys
 import xml.etree.ElementTree as ET  # noqa: N817
+import xml.parsers.expat
 from datetime import timedelta
 from pathlib import Path
-from typing import Dict, Union
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from xml.sax.saxutils import escape, quoteattr
 
 import esdl
 
@@ -11,6 +15,7 @@ import numpy as np
 
 import pandas as pd
 
+from pyecore.ecore import EEnumLiteral
 from pyecore.resources import ResourceSet
 
 import rtctools.data.pi as pi
@@ -24,7 +29,7 @@ from rtctools_heat_network.modelica_component_type_mixin import ModelicaComponen
 from rtctools_heat_network.pycml.pycml_mixin import PyCMLMixin
 from rtctools_heat_network.qth_mixin import QTHMixin
 
-from .common import Asset
+from .common import Asset, InsulationLayer, Port
 from .esdl_heat_model import ESDLHeatModel
 from .esdl_qth_model import ESDLQTHModel
 
@@ -38,6 +43,10 @@ class _ESDLInputException(Exception):
     pass
 
 
+class _PIBulkImportUnsupportedError(Exception):
+    pass
+
+
 class ESDLMixin(
     ModelicaComponentTypeMixin, IOMixin, PyCMLMixin, CollocatedIntegratedOptimizationProblem
 ):
@@ -45,6 +54,19 @@ class ESDLMixin(
 
     esdl_pi_validate_timeseries = False
 
+    # Whether to read PI-XML input with the bulk importer, see `_PITimeseriesImport`.
+    # Files it does not support are read with `pi.Timeseries` instead.
+    esdl_pi_bulk_import = True
+
+    # Format of the files to write the output of every ensemble member to
+    # separately, "xml" or "csv", see `ESDLMixin.write`. By default, the
+    # output of all members is written to a single PI-XML file.
+    esdl_pi_export_chunks = None
+
+    # Whether to reuse the assets of an ESDL file that was parsed before,
+    # e.g. by another scenario in a parameter sweep.
+    esdl_share_parsed_assets = False
+
     esdl_pi_input_data_config = None
     esdl_pi_output_data_config = None
 
@@ -62,7 +84,10 @@ class ESDLMixin(
 
         self.__run_info = _RunInfoReader(self.esdl_run_info_path)
 
-        self.__esdl_assets = _esdl_to_assets(self.__run_info.esdl_file)
+        if self.esdl_share_parsed_assets:
+            self.__esdl_assets = _shared_esdl_assets(self.__run_info.esdl_file)
+        else:
+            self.__esdl_assets = _esdl_to_assets(self.__run_info.esdl_file)
         if self.__run_info.parameters_file is not None:
             self.__esdl_assets = _overwrite_parameters(
                 self.__run_info.parameters_file, self.__esdl_assets
@@ -223,16 +248,30 @@ class ESDLMixin(
         timeseries_import_basename = input_timeseries_file.stem
         input_folder = input_timeseries_file.parent
 
+        data_config = self.esdl_pi_input_data_config(
+            self.__timeseries_id_map, self.heat_network_components.copy()
+        )
+
         try:
-            self.__timeseries_import = pi.Timeseries(
-                self.esdl_pi_input_data_config(
-                    self.__timeseries_id_map, self.heat_network_components.copy()
-                ),
-                input_folder,
-                timeseries_import_basename,
-                binary=False,
-                pi_validate_times=self.esdl_pi_validate_timeseries,
-            )
+            self.__timeseries_import = None
+            if self.esdl_pi_bulk_import:
+                try:
+                    self.__timeseries_import = _PITimeseriesImport(
+                        data_config,
+                        input_timeseries_file,
+                        pi_validate_times=self.esdl_pi_validate_timeseries,
+                    )
+                except _PIBulkImportUnsupportedError as e:
+                    logger.debug(f"ESDLMixin: Falling back to the PI reader, because {e}")
+
+            if self.__timeseries_import is None:
+                self.__timeseries_import = pi.Timeseries(
+                    data_config,
+                    input_folder,
+                    timeseries_import_basename,
+                    binary=False,
+                    pi_validate_times=self.esdl_pi_validate_timeseries,
+                )
         except IOError:
             raise Exception(
                 "ESDLMixin: {}.xml not found in {}.".format(
@@ -251,6 +290,18 @@ class ESDLMixin(
                 self.io.set_timeseries(variable, timeseries_import_times, values, ensemble_member)
 
     def write(self):
+        """
+        Writes the output time series listed in the PI-XML output file, which
+        serves as a template.
+
+        If ``esdl_pi_export_chunks`` is set, the output of every ensemble
+        member is instead written to a file of its own as soon as it is
+        extracted, named after the output file with the index of the member
+        appended, e.g. ``timeseries_export_0.xml``. Only the results of a
+        single member are then in memory at any time, which matters for
+        large ensembles. An index file, e.g. ``timeseries_export_index.csv``,
+        lists the files of all members.
+        """
         super().write()
 
         if self.__output_timeseries_file is None:
@@ -260,6 +311,10 @@ class ESDLMixin(
         assert output_timeseries_file.is_absolute()
         assert output_timeseries_file.suffix == ".xml"
 
+        if self.esdl_pi_export_chunks is not None:
+            self.__write_chunks(output_timeseries_file)
+            return
+
         timeseries_export_basename = output_timeseries_file.stem
         output_folder = output_timeseries_file.parent
 
@@ -289,11 +344,7 @@ class ESDLMixin(
 
         # Start of write output
         # Write the time range for the export file.
-        self.__timeseries_export.times = [
-            self.__timeseries_import.times[self.__timeseries_import.forecast_index]
-            + timedelta(seconds=s)
-            for s in times
-        ]
+        self.__timeseries_export.times = self.__output_datetimes()
 
         # Write other time settings
         self.__timeseries_export.forecast_datetime = self.__timeseries_import.forecast_datetime
@@ -308,35 +359,119 @@ class ESDLMixin(
 
         # Start looping over the ensembles for extraction of the output values.
         for ensemble_member in range(self.ensemble_size):
-            results = self.extract_results(ensemble_member)
+            for variable, values in self.__output_values(output_keys, ensemble_member):
+                self.__timeseries_export.set(variable, values, ensemble_member=ensemble_member)
+
+        # Write output file to disk
+        self.__timeseries_export.write()
+
+    def __output_datetimes(self) -> List[datetime.datetime]:
+        return [
+            self.__timeseries_import.times[self.__timeseries_import.forecast_index]
+            + timedelta(seconds=s)
+            for s in self.times()
+        ]
 
-            # For all variables that are output variables the values are
-            # extracted from the results.
-            for variable in output_keys:
+    def __output_values(self, output_keys, ensemble_member):
+        """
+        The values of the output variables at the times of the optimization
+        problem, from the results or else from the input time series.
+        """
+        times = self.times()
+        results = self.extract_results(ensemble_member)
+
+        # For all variables that are output variables the values are
+        # extracted from the results.
+        for variable in output_keys:
+            try:
+                values = results[variable]
+                if len(values) != len(times):
+                    values = self.interpolate(
+                        times, self.times(variable), values, self.interpolation_method(variable)
+                    )
+            except KeyError:
                 try:
-                    values = results[variable]
-                    if len(values) != len(times):
-                        values = self.interpolate(
-                            times, self.times(variable), values, self.interpolation_method(variable)
-                        )
+                    ts = self.get_timeseries(variable, ensemble_member)
+                    if len(ts.times) != len(times):
+                        values = self.interpolate(times, ts.times, ts.values)
+                    else:
+                        values = ts.values
                 except KeyError:
-                    try:
-                        ts = self.get_timeseries(variable, ensemble_member)
-                        if len(ts.times) != len(times):
-                            values = self.interpolate(times, ts.times, ts.values)
-                        else:
-                            values = ts.values
-                    except KeyError:
-                        logger.warning(
-                            "ESDLMixin: Output requested for non-existent variable {}. "
-                            "Will not be in output file.".format(variable)
-                        )
-                        continue
+                    logger.warning(
+                        "ESDLMixin: Output requested for non-existent variable {}. "
+                        "Will not be in output file.".format(variable)
+                    )
+                    continue
 
-                self.__timeseries_export.set(variable, values, ensemble_member=ensemble_member)
+            yield variable, values
+
+    def __write_chunks(self, output_timeseries_file: Path):
+        chunk_format = self.esdl_pi_export_chunks
+        if chunk_format not in {"xml", "csv"}:
+            raise Exception(f"ESDLMixin: Unsupported export chunk format '{chunk_format}'")
+
+        # Only the headers of the template are needed, the values are
+        # written straight to the files of the ensemble members.
+        try:
+            template = ET.parse(output_timeseries_file).getroot()
+        except IOError:
+            raise Exception(
+                "ESDLMixin: {}.xml not found in {}.".format(
+                    output_timeseries_file.stem, output_timeseries_file.parent
+                )
+            )
+
+        data_config = self.esdl_pi_output_data_config(self.__timeseries_id_map)
+        headers = {}
+        for series in template.findall("pi:series", ns):
+            header = series.find("pi:header", ns)
+            headers.setdefault(data_config.variable(header), header)
+
+        times = self.times()
+        datetimes = self.__output_datetimes()
+        dt = times[1] - times[0] if len(set(times[1:] - times[:-1])) == 1 else None
+
+        index = []
+
+        for ensemble_member in range(self.ensemble_size):
+            path = output_timeseries_file.with_name(
+                f"{output_timeseries_file.stem}_{ensemble_member}.{chunk_format}"
+            )
+
+            values = self.__output_values(headers.keys(), ensemble_member)
+
+            if chunk_format == "xml":
+                _write_pi_xml_chunk(
+                    path,
+                    ((headers[v], x) for v, x in values),
+                    datetimes,
+                    dt,
+                    ensemble_member if self.ensemble_size > 1 else None,
+                    self.__timeseries_import.forecast_datetime,
+                    self.__timeseries_import.timezone,
+                )
+            else:
+                data = {"time": [t.strftime("%Y-%m-%dT%H:%M:%SZ") for t in datetimes]}
+                data.update(values)
+                pd.DataFrame(data).to_csv(path, index=False)
+                del data
+
+            index.append({"ensemble_member": ensemble_member, "file": path.name})
+
+        pd.DataFrame(index).to_csv(
+            output_timeseries_file.with_name(f"{output_timeseries_file.stem}_index.csv"),
+            index=False,
+        )
 
-        # Write output file to disk
-        self.__timeseries_export.write()
+
+def _pi_header_key(pi_header) -> Tuple[str, str, str]:
+    """
+    The location id, parameter id and (joined) qualifier ids of a PI series header.
+    """
+    location_id = pi_header.findtext("pi:locationId", namespaces=ns)
+    parameter_id = pi_header.findtext("pi:parameterId", namespaces=ns)
+    qualifier_ids = ":".join(q.text for q in pi_header.findall("pi:qualifierId", ns))
+    return location_id, parameter_id, qualifier_ids
 
 
 class _ESDLInputDataConfig:
@@ -345,15 +480,27 @@ class _ESDLInputDataConfig:
         self._sources = set(heat_network_components["source"])
         self._demands = set(heat_network_components["demand"])
 
-    def variable(self, pi_header):
-        location_id = pi_header.find("pi:locationId", ns).text
+        # Variable names per header key. Ensembles and files with many
+        # series repeat the same keys, which we only have to resolve once.
+        self.__variables = {}
 
+    def variable(self, pi_header):
+        return self.variables([_pi_header_key(pi_header)])[0]
+
+    def variables(self, keys: Sequence[Tuple[str, str, str]]) -> List[str]:
+        """
+        The variable names of a sequence of (location id, parameter id,
+        qualifier ids) keys, see :py:func:`_pi_header_key`.
+        """
+        variables = self.__variables
+        for key in set(keys).difference(variables):
+            variables[key] = self.__variable(*key)
+        return [variables[k] for k in keys]
+
+    def __variable(self, location_id, parameter_id, qualifier_ids):
         try:
             component_name = self.__id_map[location_id]
         except KeyError:
-            parameter_id = pi_header.find("pi:parameterId", ns).text
-            qualifiers = pi_header.findall("pi:qualifierId", ns)
-            qualifier_ids = ":".join(q.text for q in qualifiers)
             return f"{location_id}:{parameter_id}:{qualifier_ids}"
 
         if component_name in self._demands:
@@ -404,6 +551,281 @@ class _ESDLOutputDataConfig:
         raise NotImplementedError
 
 
+def _parse_pi_date_time(attributes: Dict[str, str]) -> datetime.datetime:
+    return datetime.datetime.strptime(
+        f"{attributes['date']} {attributes['time']}", "%Y-%m-%d %H:%M:%S"
+    )
+
+
+def _parse_pi_xml(path: Path) -> Tuple[Optional[str], List[Dict], List[List[str]]]:
+    """
+    Streams through a PI-XML time series file with expat, without building an
+    element tree. Header elements are collected in a dictionary per series,
+    with the attributes of elements like ``timeStep`` and the text of the
+    others, and the values of the events as strings.
+
+    :returns: The time zone, and the headers and values of all series.
+    """
+    pi_ns = f"{ns['pi']} "
+    header_name = f"{pi_ns}header"
+    event_name = f"{pi_ns}event"
+    series_name = f"{pi_ns}series"
+    timezone_name = f"{pi_ns}timeZone"
+
+    headers = []
+    values = []
+    timezone = []
+
+    parser = xml.parsers.expat.ParserCreate(namespace_separator=" ")
+    parser.buffer_text = True
+
+    # Only text in headers and the time zone is of interest, so the
+    # character data and end handlers are only set inside those. The start
+    # handler for events is kept as light as possible, as most elements are
+    # events.
+    append_value = None
+    text = []
+
+    def data(content):
+        text.append(content)
+
+    def end_header_element(name):
+        if name == header_name:
+            parser.CharacterDataHandler = None
+            parser.EndElementHandler = None
+            return
+        key = name[len(pi_ns) :]
+        value = "".join(text).strip()
+        if key == "qualifierId":
+            headers[-1].setdefault(key, []).append(value)
+        elif key not in headers[-1]:
+            headers[-1][key] = value
+
+    def end_timezone(name):
+        timezone.append("".join(text).strip())
+        parser.CharacterDataHandler = None
+        parser.EndElementHandler = None
+
+    def start(name, attributes):
+        nonlocal append_value
+        if name == event_name:
+            append_value(attributes["value"])
+        elif name == series_name:
+            values.append([])
+            append_value = values[-1].append
+        elif name == header_name:
+            headers.append({})
+            parser.EndElementHandler = end_header_element
+        elif parser.EndElementHandler is end_header_element:
+            text.clear()
+            if attributes:
+                headers[-1][name[len(pi_ns) :]] = attributes
+            parser.CharacterDataHandler = data
+        elif name == timezone_name:
+            text.clear()
+            parser.CharacterDataHandler = data
+            parser.EndElementHandler = end_timezone
+
+    parser.StartElementHandler = start
+
+    with open(path, "rb") as f:
+        parser.ParseFile(f)
+
+    return (timezone[0] if timezone else None), headers, values
+
+
+class _PITimeseriesImport:
+    """
+    Reads a non-binary PI-XML time series file like :py:class:`pi.Timeseries`
+    does, but in bulk, for files with many series and ensemble members.
+
+    The file is parsed in a single pass, without building an element tree.
+    The variable names of all series are then looked up at once with
+    ``data_config.variables``, and the values of all series are stored in a
+    single array with a row per series, which :py:meth:`items` hands out as
+    views.
+
+    Only equidistant series and data configs with a ``variables`` method are
+    supported. For other files :py:class:`_PIBulkImportUnsupportedError` is
+    raised.
+    """
+
+    def __init__(self, data_config, path: Path, pi_validate_times: bool = False):
+        if not hasattr(data_config, "variables"):
+            raise _PIBulkImportUnsupportedError("the data config has no bulk variable lookup")
+
+        timezone, headers, events = _parse_pi_xml(path)
+
+        self.timezone = float(timezone) if timezone is not None else None
+
+        if not headers:
+            raise _PIBulkImportUnsupportedError("the file contains no series")
+
+        time_steps = set()
+        for h in headers:
+            if h["timeStep"].get("unit") != "second":
+                raise _PIBulkImportUnsupportedError(
+                    f"of time step unit '{h['timeStep'].get('unit')}'"
+                )
+            time_steps.add(int(h["timeStep"]["multiplier"]))
+        if len(time_steps) > 1:
+            raise Exception("PI: Not all timeseries have the same time step size.")
+        (dt,) = time_steps
+        if dt <= 0:
+            raise Exception(
+                "PI: Multiplier of time step must be a positive integer per the PI schema."
+            )
+
+        start_datetimes = [_parse_pi_date_time(h["startDate"]) for h in headers]
+        end_datetimes = [_parse_pi_date_time(h["endDate"]) for h in headers]
+        start_datetime = min(start_datetimes)
+
+        # Offsets and lengths of the series in time steps from the global start
+        starts = np.array([(t - start_datetime).total_seconds() for t in start_datetimes]) / dt
+        ends = np.array([(t - start_datetime).total_seconds() for t in end_datetimes]) / dt
+        if pi_validate_times and not np.all(np.mod(starts, 1.0) == 0.0):
+            raise ValueError(
+                "PI: Not all timeseries share the same time step spacing. Make sure "
+                "the time steps of all series are a subset of the global time steps."
+            )
+        starts = np.round(starts).astype(int)
+        lengths = np.round(ends).astype(int) - starts + 1
+
+        n_times = int(np.max(starts + lengths))
+        self.times = [start_datetime + i * datetime.timedelta(seconds=dt) for i in range(n_times)]
+
+        # The forecast date defaults to the start date of the first series,
+        # and is rounded to the time steps like pi.Timeseries does.
+        forecast_datetimes = {
+            _parse_pi_date_time(h["forecastDate"]) for h in headers if "forecastDate" in h
+        }
+        if len(forecast_datetimes) > 1:
+            raise Exception("PI: Not all timeseries share the same forecastDate.")
+        forecast_datetime = forecast_datetimes.pop() if forecast_datetimes else start_datetimes[0]
+        seconds = (forecast_datetime - start_datetime).seconds
+        rounding = (seconds + dt / 2) // dt * dt
+        self.forecast_datetime = forecast_datetime + datetime.timedelta(
+            0, rounding - seconds, -forecast_datetime.microsecond
+        )
+        try:
+            self.forecast_index = self.times.index(self.forecast_datetime)
+        except ValueError:
+            self.forecast_index = -1
+
+        # Series without an ensemble member index belong to all members
+        members = np.array([int(h.get("ensembleMemberIndex", -1)) for h in headers])
+        indexes = np.unique(members[members >= 0])
+        if len(indexes) > 1:
+            if not np.array_equal(indexes, np.arange(len(indexes))):
+                raise ValueError(
+                    "PI: Ensemble ids must be zero-based and increasing by 1 when more than one"
+                    " ensemble member is present."
+                )
+            self.ensemble_size = len(indexes)
+        else:
+            self.ensemble_size = 1
+            members[:] = 0
+
+        variables = data_config.variables(
+            [
+                (h["locationId"], h["parameterId"], ":".join(h.get("qualifierId", [])))
+                for h in headers
+            ]
+        )
+
+        values = np.full((len(headers), n_times), np.nan)
+        for i, v in enumerate(events):
+            n = min(len(v), lengths[i])
+            values[i, starts[i] : starts[i] + n] = np.array(v[:n], dtype=np.float64)
+
+        miss_values = np.array([float(h["missVal"]) for h in headers])
+        values[values == miss_values[:, None]] = np.nan
+
+        self.__variables = []
+        self.__values = []
+        for ensemble_member in range(self.ensemble_size):
+            rows = np.flatnonzero((members == ensemble_member) | (members < 0))
+            self.__variables.append([variables[i] for i in rows])
+            self.__values.append(values if len(rows) == len(headers) else values[rows])
+
+    def items(self, ensemble_member=0):
+        """
+        Returns an iterator over all variable names and value arrays of the
+        given ensemble member.
+        """
+        # Like a dictionary, later series of the same variable take precedence
+        rows = {v: i for i, v in enumerate(self.__variables[ensemble_member])}
+        values = self.__values[ensemble_member]
+        for variable, i in rows.items():
+            yield variable, values[i]
+
+
+def _write_pi_xml_chunk(
+    path: Path,
+    series,
+    datetimes: List[datetime.datetime],
+    dt: Optional[float],
+    ensemble_member: Optional[int],
+    forecast_datetime: Optional[datetime.datetime],
+    timezone: Optional[float],
+):
+    """
+    Writes series to a PI-XML file one at a time, without building an
+    element tree. The headers of the series are copies of the given template
+    headers, with the time range, time step and ensemble member updated.
+
+    :param series: Iterable of the template header and the values of every series.
+    """
+    pi_ns = f"{{{ns['pi']}}}"
+
+    def date_time(t):
+        return {"date": t.strftime("%Y-%m-%d"), "time": t.strftime("%H:%M:%S")}
+
+    time_step = {"unit": "second", "multiplier": str(int(dt))} if dt else {"unit": "nonequidistant"}
+    updated_attributes = {
+        "timeStep": time_step,
+        "startDate": date_time(datetimes[0]),
+        "endDate": date_time(datetimes[-1]),
+    }
+    if forecast_datetime is not None:
+        updated_attributes["forecastDate"] = date_time(forecast_datetime)
+
+    def element(tag, attributes, text=None):
+        attributes = "".join(f" {k}={quoteattr(v)}" for k, v in attributes.items())
+        if text is None:
+            return f"<{tag}{attributes}/>"
+        return f"<{tag}{attributes}>{escape(text)}</{tag}>"
+
+    events = [f'<event date="{t:%Y-%m-%d}" time="{t:%H:%M:%S}" value="{{}}"/>\n' for t in datetimes]
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(f'<TimeSeries xmlns="{ns["pi"]}" version="1.2">\n')
+        if timezone is not None:
+            f.write(f"{element('timeZone', {}, str(timezone))}\n")
+
+        for header, values in series:
+            f.write("<series>\n<header>\n")
+            miss_val = header.findtext("pi:missVal", default="-999", namespaces=ns)
+            for child in header:
+                tag = child.tag[len(pi_ns) :]
+                if tag == "ensembleMemberIndex":
+                    continue
+                if tag == "timeStep" and ensemble_member is not None:
+                    f.write(f"{element('ensembleMemberIndex', {}, str(ensemble_member))}\n")
+                attributes = updated_attributes.get(tag, child.attrib)
+                text = child.text.strip() if child.text and child.text.strip() else None
+                f.write(f"{element(tag, attributes, text)}\n")
+            f.write("</header>\n")
+
+            values = np.asarray(values, dtype=np.float64)
+            strings = np.where(np.isnan(values), miss_val, values.astype(str))
+            f.writelines(e.format(v) for e, v in zip(events, strings))
+            f.write("</series>\n")
+
+        f.write("</TimeSeries>\n")
+
+
 class _RunInfoReader:
     def __init__(self, filepath: Union[str, Path]):
         filepath = Path(filepath).resolve()
@@ -464,6 +886,92 @@ def _overwrite_parameters(parameters_file, assets):
     return assets
 
 
+# Parsed assets per ESDL file, see `ESDLMixin.esdl_share_parsed_assets`
+_parsed_esdl_assets = {}
+
+
+def _shared_esdl_assets(esdl_path: Union[Path, str]):
+    """
+    The assets of an ESDL file, parsed only once per file and modification
+    time. A forked process inherits the parsed assets of its parent.
+
+    Every caller gets its own copy of the attributes, as these can be
+    overwritten, e.g. by a parameters file.
+    """
+    esdl_path = Path(esdl_path).resolve()
+    stat = esdl_path.stat()
+    key = (esdl_path, stat.st_mtime_ns, stat.st_size)
+
+    try:
+        assets = _parsed_esdl_assets[key]
+    except KeyError:
+        assets = _parsed_esdl_assets[key] = _esdl_to_assets(esdl_path)
+
+    return {k: dataclasses.replace(a, attributes=dict(a.attributes)) for k, a in assets.items()}
+
+
+def _plain_value(value):
+    """
+    ESDL attribute values as plain Python values, with enumeration literals
+    replaced by their name.
+    """
+    if isinstance(value, EEnumLiteral):
+        return sys.intern(value.name)
+    return value
+
+
+def _insulation_layers(material, el_name: str) -> Optional[Tuple[InsulationLayer, ...]]:
+    if material is None:
+        return None
+
+    if isinstance(material, esdl.esdl.MatterReference):
+        material = material.reference
+
+    if not isinstance(material, esdl.esdl.CompoundMatter):
+        logger.warning(
+            f"Material of '{el_name}' is not a compound matter, so it is ignored and the "
+            f"default insulation properties will be used."
+        )
+        return None
+
+    return tuple(
+        InsulationLayer(float(x.layerWidth), float(x.matter.thermalConductivity))
+        for x in material.component.items
+    )
+
+
+def _variable_operational_costs(cost_information) -> Optional[float]:
+    try:
+        return float(cost_information.variableOperationalCosts.value)
+    except AttributeError:
+        return None
+
+
+def _asset_attributes(el, el_name: str) -> dict:
+    """
+    The attributes of an ESDL asset as plain Python values, see
+    :py:class:`Asset`. No references to the pyecore objects are kept, so the
+    parsed model can be garbage collected.
+    """
+    # Note that e.g. el.__dict__['length'] does not work to get the length of a pipe.
+    # We therefore built this dict ourselves from the structural features of the class.
+    attributes = {}
+    for f in el.eClass.eAllAttributes():
+        value = el.eGet(f)
+        if f.many:
+            attributes[f.name] = tuple(_plain_value(v) for v in value)
+        else:
+            attributes[f.name] = _plain_value(value)
+
+    for f in el.eClass.eAllReferences():
+        if f.name == "material":
+            attributes["material"] = _insulation_layers(el.eGet(f), el_name)
+        elif f.name == "costInformation":
+            attributes["variableOperationalCosts"] = _variable_operational_costs(el.eGet(f))
+
+    return attributes
+
+
 def _esdl_to_assets(esdl_path: Union[Path, str]):
     # correct profile attribute
     esdl.ProfileElement.from_.name = "from"
@@ -522,7 +1030,7 @@ def _esdl_to_assets(esdl_path: Union[Path, str]):
         c["supplyTemperature"] = supply_temperature
         c["returnTemperature"] = return_temperature
 
-    assets = {}
+    esdl_assets = []
 
     # Component ids are unique, but we require component names to be unique as well.
     component_names = set()
@@ -544,33 +1052,54 @@ def _esdl_to_assets(esdl_path: Union[Path, str]):
             else:
                 component_names.add(el_name)
 
-            # For some reason `esdl_element.assetType` is `None`, so use the class name
-            asset_type = el.__class__.__name__
-
             # Every asset should at least have a port to be connected to another asset
             assert len(el.port) >= 1
 
-            in_ports = None
-            out_ports = None
-            for port in el.port:
-                if isinstance(port, esdl.InPort):
-                    if in_ports is None:
-                        in_ports = [port]
-                    else:
-                        in_ports.append(port)
-                elif isinstance(port, esdl.OutPort):
-                    if out_ports is None:
-                        out_ports = [port]
-                    else:
-                        out_ports.append(port)
-                else:
-                    _ESDLInputException(f"The port for {el_name} is neither an IN or OUT port")
-
-            # Note that e.g. el.__dict__['length'] does not work to get the length of a pipe.
-            # We therefore built this dict ourselves using 'dir' and 'getattr'
-            attributes = {k: getattr(el, k) for k in dir(el)}
-            assets[el.id] = Asset(
-                asset_type, el.id, el_name, in_ports, out_ports, attributes, global_properties
+            esdl_assets.append((el, sys.intern(el_name)))
+
+    # Ports are referred to by an integer index, which we need to know for
+    # all ports before we can store the connections of any of them.
+    port_index = {}
+    for el, _ in esdl_assets:
+        for port in el.port:
+            port_index[port.id] = len(port_index)
+
+    assets = {}
+
+    for el, el_name in esdl_assets:
+        # For some reason `esdl_element.assetType` is `None`, so use the class name
+        asset_type = sys.intern(el.__class__.__name__)
+
+        in_ports = []
+        out_ports = []
+        for port in el.port:
+            if isinstance(port, esdl.InPort):
+                ports = in_ports
+            elif isinstance(port, esdl.OutPort):
+                ports = out_ports
+            else:
+                raise _ESDLInputException(f"The port for {el_name} is neither an IN or OUT port")
+
+            carrier = port.carrier
+            ports.append(
+                Port(
+                    port_index[port.id],
+                    sys.intern(port.id),
+                    sys.intern(carrier.id) if carrier is not None else None,
+                    sys.intern(carrier.name) if carrier is not None else None,
+                    ports is in_ports,
+                    tuple(port_index[p.id] for p in port.connectedTo if p.id in port_index),
+                )
             )
 
+        assets[el.id] = Asset(
+            asset_type,
+            el.id,
+            el_name,
+            tuple(in_ports),
+            tuple(out_ports),
+            _asset_attributes(el, el_name),
+            global_properties,
+        )
+
     return assets
@@ -1,8 +1,5 @@
 import logging
 
-from esdl import InPort
-
-
 from rtctools_heat_network.pycml import Model as _Model
 
 logger = logging.getLogger("rtctools_heat_network")
@@ -20,7 +17,7 @@ class _SkipAssetException(Exception):
 
 
 class _ESDLModelBase(_Model):
-    def _esdl_convert(self, converter, assets, prefix):
+    def _esdl_convert(self, converter, assets, prefix, use_templates=False):
         # Sometimes we need information of one component in order to convert
         # another. For example, the nominal discharg of a pipe is used to set
         # the nominal discharge of its connected components.
@@ -30,6 +27,7 @@ class _ESDLModelBase(_Model):
         for _ in range(RETRY_LOOP_LIMIT):
             current_assets = retry_assets
             retry_assets = []
+            components = []
 
             for asset in current_assets:
                 try:
@@ -41,7 +39,9 @@ class _ESDLModelBase(_Model):
                     retry_assets.append(asset)
                     continue
 
-                self.add_variable(pycml_type, asset.name, **modifiers)
+                components.append((pycml_type, asset.name, modifiers))
+
+            self.add_variables(components, use_templates)
 
             if not retry_assets:
                 break
@@ -65,23 +65,22 @@ class _ESDLModelBase(_Model):
 
         # Here we check that every pipe and node has the correct coupled carrier for their _ret
         # asset.
+        carrier_names = {}
         for asset in [*pipe_assets, *node_assets]:
-            asset_carrier = asset.global_properties["carriers"][asset.in_ports[0].carrier.id]
-            couple_asset_carrier = next(
-                x.global_properties["carriers"][x.in_ports[0].carrier.id]
-                for x in [*pipe_assets, *node_assets]
-                if (
-                    x.name.replace("_ret", "") == asset.name.replace("_ret", "")
-                    and x.name != asset.name
-                )
+            carrier = asset.global_properties["carriers"][asset.in_ports[0].carrier_id]
+            carrier_names.setdefault(asset.name.replace("_ret", ""), []).append(
+                (asset.name, carrier["name"])
             )
-            if asset_carrier["name"] != couple_asset_carrier["name"]:
-                raise Exception(
-                    f"{asset.name} and {asset.name}_ret do not have the matching "
-                    f"carriers specified"
-                )
 
-        # First we map all port ids to their respective PyCML ports. We only
+        for coupled_assets in carrier_names.values():
+            for name, carrier_name in coupled_assets:
+                couple_carrier_name = next(c for n, c in coupled_assets if n != name)
+                if carrier_name != couple_carrier_name:
+                    raise Exception(
+                        f"{name} and {name}_ret do not have the matching carriers specified"
+                    )
+
+        # First we map all port indices to their respective PyCML ports. We only
         # do this for non-nodes, as for nodes we don't quite know what port
         # index a connection has to use yet.
         port_map = {}
@@ -99,29 +98,30 @@ class _ESDLModelBase(_Model):
                     )
                 # check for expected number of ports
                 if len(asset.in_ports) == 2 and len(asset.out_ports) == 2:
-                    for p in [*asset.in_ports, *asset.out_ports]:
-                        if isinstance(p, InPort):
-                            if "_ret" in p.carrier.name:
-                                port_map[p.id] = getattr(component.Secondary, in_suf)
+                    for p in asset.ports:
+                        if p.is_in_port:
+                            if "_ret" in p.carrier_name:
+                                port_map[p.index] = getattr(component.Secondary, in_suf)
                             else:
-                                port_map[p.id] = getattr(component.Primary, in_suf)
+                                port_map[p.index] = getattr(component.Primary, in_suf)
                         else:  # OutPort
-                            if "_ret" in p.carrier.name:
-                                port_map[p.id] = getattr(component.Primary, out_suf)
+                            if "_ret" in p.carrier_name:
+                                port_map[p.index] = getattr(component.Primary, out_suf)
                             else:
-                                port_map[p.id] = getattr(component.Secondary, out_suf)
+                                port_map[p.index] = getattr(component.Secondary, out_suf)
                 else:
                     raise Exception(f"{asset.name} has does not have 2 in_ports and 2 out_ports")
             elif len(asset.in_ports) == 1 and len(asset.out_ports) == 1:
-                port_map[asset.in_ports[0].id] = getattr(component, in_suf)
-                port_map[asset.out_ports[0].id] = getattr(component, out_suf)
+                port_map[asset.in_ports[0].index] = getattr(component, in_suf)
+                port_map[asset.out_ports[0].index] = getattr(component, out_suf)
             else:
                 raise Exception(f"Unsupported ports for asset type {asset.name}.")
 
         # Nodes are special in that their in/out ports can have multiple
         # connections. This means we have some bookkeeping to do per node. We
         # therefore do the nodes first, and do all remaining connections
-        # after.
+        # after. Connections are stored with the lowest port index first, such
+        # that we only have to do a single lookup to see if we already made it.
         connections = set()
 
         for asset in node_assets:
@@ -134,28 +134,21 @@ class _ESDLModelBase(_Model):
                     f"multiple connections to a single joint port are allowed"
                 )
             for port in (asset.in_ports[0], asset.out_ports[0]):
-                for connected_to in port.connectedTo.items:
-                    conn = (port.id, connected_to.id)
-                    if conn in connections or tuple(reversed(conn)) in connections:
+                for connected_to in port.connected_to:
+                    conn = (min(port.index, connected_to), max(port.index, connected_to))
+                    if conn in connections:
                         continue
 
-                    self.connect(getattr(component, node_suf)[i], port_map[connected_to.id])
+                    self.connect(getattr(component, node_suf)[i], port_map[connected_to])
                     connections.add(conn)
                     i += 1
 
-        skip_port_ids = set()
-        for a in skip_assets:
-            if a.in_ports is not None:
-                for port in a.in_ports:
-                    skip_port_ids.add(port.id)
-            if a.out_ports is not None:
-                for port in a.out_ports:
-                    skip_port_ids.add(port.id)
+        skip_port_indices = {p.index for a in skip_assets for p in a.ports}
 
         # All non-Joints/nodes
         for asset in non_node_assets:
-            for port in [*asset.in_ports, *asset.out_ports]:
-                connected_ports = [p for p in port.connectedTo.items if p.id not in skip_port_ids]
+            for port in asset.ports:
+                connected_ports = [p for p in port.connected_to if p not in skip_port_indices]
                 if len(connected_ports) != 1:
                     logger.warning(
                         f"{asset.asset_type} '{asset.name}' has multiple connections"
@@ -165,9 +158,9 @@ class _ESDLModelBase(_Model):
                 assert len(connected_ports) == 1
 
                 for connected_to in connected_ports:
-                    conn = (port.id, connected_to.id)
-                    if conn in connections or tuple(reversed(conn)) in connections:
+                    conn = (min(port.index, connected_to), max(port.index, connected_to))
+                    if conn in connections:
                         continue
 
-                    self.connect(port_map[port.id], port_map[connected_to.id])
+                    self.connect(port_map[port.index], port_map[connected_to])
                     connections.add(conn)
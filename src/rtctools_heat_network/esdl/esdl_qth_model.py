@@ -2,8 +2,6 @@ import logging
 import math
 from typing import Dict, Tuple, Type
 
-import esdl
-
 from rtctools_heat_network.pycml import SymbolicParameter
 from rtctools_heat_network.pycml.component_library.qth import (
     Buffer,
@@ -161,14 +159,14 @@ class AssetToQTHComponent(_AssetToComponentBase):
         sum_in = 0
         sum_out = 0
 
-        for x in asset.attributes["port"].items:
-            if type(x) == esdl.esdl.InPort:
-                sum_in += len(x.connectedTo)
-            if type(x) == esdl.esdl.OutPort:
-                sum_out += len(x.connectedTo)
+        for x in asset.ports:
+            if x.is_in_port:
+                sum_in += len(x.connected_to)
+            else:
+                sum_out += len(x.connected_to)
 
         # TODO: what do we want if no carrier is specified.
-        carrier = asset.global_properties["carriers"][asset.in_ports[0].carrier.id]
+        carrier = asset.global_properties["carriers"][asset.in_ports[0].carrier_id]
         if carrier["__rtc_type"] == "supply":
             temp = carrier["supplyTemperature"]
         elif carrier["__rtc_type"] == "return":
@@ -281,11 +279,9 @@ class AssetToQTHComponent(_AssetToComponentBase):
 
         # get price per unit of energy,
         # assume cost of 1. if nothing is given (effectively heat loss minimization)
-        price = 1.0
-        if "costInformation" in asset.attributes.keys():
-            if hasattr(asset.attributes["costInformation"], "variableOperationalCosts"):
-                if hasattr(asset.attributes["costInformation"].variableOperationalCosts, "value"):
-                    price = asset.attributes["costInformation"].variableOperationalCosts.value
+        price = asset.attributes.get("variableOperationalCosts")
+        if price is None:
+            price = 1.0
 
         max_supply = asset.attributes["power"]
         if not max_supply:
@@ -329,11 +325,17 @@ class AssetToQTHComponent(_AssetToComponentBase):
 class ESDLQTHModel(_ESDLModelBase):
     _converter_class: _AssetToComponentBase = None
 
-    def __init__(self, assets: Dict[str, Asset], converter_class=AssetToQTHComponent, **kwargs):
+    def __init__(
+        self,
+        assets: Dict[str, Asset],
+        converter_class=AssetToQTHComponent,
+        use_templates=False,
+        **kwargs,
+    ):
         super().__init__(None)
 
         self.add_variable(SymbolicParameter, "theta")
 
         converter = converter_class(theta=self.theta, **kwargs)
 
-        self._esdl_convert(converter, assets, "QTH")
+        self._esdl_convert(converter, assets, "QTH", use_templates)
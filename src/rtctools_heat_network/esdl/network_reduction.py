@@ -0,0 +1,778 @@
+import dataclasses
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+import pandas as pd
+
+from rtctools_heat_network.head_loss_mixin import HeadLossOption
+
+from .common import Asset
+from .esdl_heat_model import AssetToHeatComponent
+from .esdl_mixin import ESDLMixin, _ESDLInputDataConfig, _ESDLOutputDataConfig
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+DEMAND_ASSET_TYPES = {"GenericConsumer", "HeatingDemand"}
+
+# Results of a component that are proportional to the flow through it
+_FLOW_SUFFIXES = (
+    ".Heat_demand",
+    ".Heat_in",
+    ".Heat_out",
+    ".HeatIn.Heat",
+    ".HeatOut.Heat",
+    ".Q",
+    ".HeatIn.Q",
+    ".HeatOut.Q",
+)
+
+# Results of a pipe at its in- and outflow, that change linearly along the pipe
+_IN_OUT_SUFFIXES = (
+    (".HeatIn.Heat", ".HeatOut.Heat"),
+    (".Heat_in", ".Heat_out"),
+    (".HeatIn.H", ".HeatOut.H"),
+    (".H_in", ".H_out"),
+)
+
+
+@dataclass(frozen=True)
+class MergedSeries:
+    """
+    Pipes in series that are replaced by the single equivalent pipe `pipe`,
+    with the summed length. The `pipes` are in the order of their
+    orientation, and the `joints` are those in between them, if any.
+    """
+
+    pipe: str
+    pipes: Tuple[str, ...]
+    lengths: Tuple[float, ...]
+    joints: Tuple[Optional[str], ...]
+
+
+@dataclass(frozen=True)
+class LumpedBranch:
+    """
+    A joint that only feeds demands, each through its own pipe, replaced by
+    the equivalent demand `demand` behind a single equivalent (supply and
+    return) pipe `pipe` with the summed length of the pipes.
+    """
+
+    demand: str
+    demands: Tuple[str, ...]
+    pipe: str
+    pipes: Tuple[str, ...]
+    lengths: Tuple[float, ...]
+    joints: Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class NetworkReduction:
+    """
+    The reduced assets, and the reduction steps in the order in which they
+    were applied.
+    """
+
+    assets: Dict[str, Asset]
+    steps: Tuple[Union[MergedSeries, LumpedBranch], ...]
+
+
+def _cold(name: str) -> str:
+    return f"{name}_ret"
+
+
+def _pipe_properties(asset: Asset):
+    """
+    The properties that determine the head loss and heat loss per meter of a
+    pipe, see `_AssetToComponentBase._pipe_get_diameter_and_insulation`.
+    """
+    attributes = asset.attributes
+    if attributes["diameter"] != "VALUE_SPECIFIED":
+        return attributes["diameter"]
+    elif not attributes["innerDiameter"]:
+        return "DN200"
+
+    return attributes["innerDiameter"], attributes["material"]
+
+
+class _Network:
+    """
+    Lookup of assets by name and of the owners of ports, which is kept up
+    to date while the network is reduced.
+    """
+
+    def __init__(self, assets: Dict[str, Asset]):
+        self.assets = dict(assets)
+        self.by_name = {}
+        self.owner = {}
+        for a in self.assets.values():
+            self.add(a)
+
+    def add(self, asset: Asset):
+        self.assets[asset.id] = asset
+        self.by_name[asset.name] = asset
+        for p in asset.ports:
+            self.owner[p.index] = asset
+
+    def remove(self, name: str):
+        asset = self.by_name.pop(name)
+        del self.assets[asset.id]
+
+    def pipe(self, name: str) -> Optional[Asset]:
+        asset = self.by_name.get(name)
+        if asset is not None and asset.asset_type == "Pipe":
+            return asset
+        return None
+
+    def single_connection(self, port) -> Optional[Tuple[Asset, int]]:
+        """
+        The asset and port index that a port is connected to, if it is
+        connected to exactly one port that is only connected back to it.
+        """
+        if len(port.connected_to) != 1:
+            return None
+        other = self.owner[port.connected_to[0]]
+        other_port = next(p for p in other.ports if p.index == port.connected_to[0])
+        if other_port.connected_to != (port.index,):
+            return None
+        return other, other_port.index
+
+    def next_in_series(self, pipe: Asset) -> Optional[Tuple[Optional[Asset], Asset]]:
+        """
+        The (optional) joint and pipe that directly follow a pipe in the
+        direction of its orientation, without any branches in between.
+        """
+        connection = self.single_connection(pipe.out_ports[0])
+        if connection is None:
+            return None
+        other, index = connection
+
+        joint = None
+        if other.asset_type == "Joint":
+            if len(other.in_ports) != 1 or len(other.out_ports) != 1:
+                return None
+            joint = other
+            connection = self.single_connection(joint.out_ports[0])
+            if connection is None:
+                return None
+            other, index = connection
+
+        if other.asset_type != "Pipe" or other.in_ports[0].index != index:
+            return None
+
+        return joint, other
+
+
+def _paired(joint: Optional[Asset], cold_joint: Optional[Asset]) -> bool:
+    # Supply and return joints are paired by name, see `_ESDLModelBase._esdl_convert`
+    if joint is None or cold_joint is None:
+        return joint is None and cold_joint is None
+    return joint.name.replace("_ret", "") == cold_joint.name.replace("_ret", "")
+
+
+def _merge_series(network: _Network) -> List[MergedSeries]:
+    """
+    Merges chains of supply pipes of which the return pipes form a chain as
+    well, and that all have the same properties.
+    """
+    links = {}
+
+    for pipe in list(network.by_name.values()):
+        if pipe.asset_type != "Pipe" or pipe.name.endswith("_ret"):
+            continue
+        cold_pipe = network.pipe(_cold(pipe.name))
+        following = network.next_in_series(pipe)
+        if cold_pipe is None or following is None:
+            continue
+
+        joint, next_pipe = following
+        next_cold_pipe = network.pipe(_cold(next_pipe.name))
+        if next_cold_pipe is None:
+            continue
+
+        # The return pipes flow the other way around
+        cold_following = network.next_in_series(next_cold_pipe)
+        if cold_following is None or cold_following[1] is not cold_pipe:
+            continue
+        cold_joint = cold_following[0]
+
+        if (
+            _paired(joint, cold_joint)
+            and _pipe_properties(pipe) == _pipe_properties(next_pipe)
+            and _pipe_properties(cold_pipe) == _pipe_properties(next_cold_pipe)
+        ):
+            links[pipe.name] = (joint, next_pipe, cold_joint)
+
+    successors = {next_pipe.name for _, next_pipe, _ in links.values()}
+
+    steps = []
+
+    for first in [p for p in links if p not in successors]:
+        pipes = [network.by_name[first]]
+        joints = []
+        cold_joints = []
+        while pipes[-1].name in links:
+            joint, next_pipe, cold_joint = links[pipes[-1].name]
+            pipes.append(next_pipe)
+            joints.append(joint)
+            cold_joints.append(cold_joint)
+
+        cold_pipes = [network.by_name[_cold(p.name)] for p in pipes]
+        lengths = tuple(p.attributes["length"] for p in pipes)
+        cold_lengths = tuple(p.attributes["length"] for p in cold_pipes)
+
+        # The equivalent pipes keep the names of the first supply pipe and
+        # its return pipe, with the ports at the ends of the chains.
+        for p in [*pipes[1:], *cold_pipes[1:], *(j for j in [*joints, *cold_joints] if j)]:
+            network.remove(p.name)
+
+        network.add(
+            dataclasses.replace(
+                pipes[0],
+                out_ports=pipes[-1].out_ports,
+                attributes={**pipes[0].attributes, "length": sum(lengths)},
+            )
+        )
+        network.add(
+            dataclasses.replace(
+                cold_pipes[0],
+                in_ports=cold_pipes[-1].in_ports,
+                attributes={**cold_pipes[0].attributes, "length": sum(cold_lengths)},
+            )
+        )
+
+        steps.append(
+            MergedSeries(
+                pipes[0].name,
+                tuple(p.name for p in pipes),
+                lengths,
+                tuple(j.name if j else None for j in joints),
+            )
+        )
+        steps.append(
+            MergedSeries(
+                cold_pipes[0].name,
+                tuple(p.name for p in reversed(cold_pipes)),
+                tuple(reversed(cold_lengths)),
+                tuple(j.name if j else None for j in reversed(cold_joints)),
+            )
+        )
+
+    return steps
+
+
+def _fits_single_pipe(
+    converter: Optional[AssetToHeatComponent], pipe: Asset, demands: List[Asset]
+) -> bool:
+    """
+    Whether the heat of all demands can be carried by a single pipe at the
+    maximum velocity of the converter. The equivalent pipe of a lumped branch
+    keeps the diameter, and thus the maximum discharge, of one of the pipes
+    it replaces, but carries the flow of all of them.
+    """
+    if converter is None:
+        return True
+
+    # A power of zero means the demand is not limited
+    powers = [d.attributes.get("power") or 0.0 for d in demands]
+    if not all(p > 0.0 for p in powers):
+        return False
+
+    diameter = converter._pipe_get_diameter_and_insulation(pipe)[0]
+    supply_temperature, return_temperature = converter._get_supply_return_temperatures(pipe)
+    maximum_heat = (
+        converter.rho
+        * converter.cp
+        * (supply_temperature - return_temperature)
+        * converter.v_max
+        * math.pi
+        * diameter**2
+        / 4.0
+    )
+
+    return sum(powers) <= maximum_heat
+
+
+def _lump_branches(
+    network: _Network, converter: Optional[AssetToHeatComponent]
+) -> List[LumpedBranch]:
+    """
+    Lumps joints that only feed demands, each through a single pipe, into
+    a single demand, if a single pipe can carry the heat of all demands.
+    """
+    steps = []
+
+    for joint in list(network.by_name.values()):
+        if joint.asset_type != "Joint" or joint.name not in network.by_name:
+            continue
+        if len(joint.in_ports) != 1 or len(joint.out_ports) != 1:
+            continue
+
+        feed = network.single_connection(joint.in_ports[0])
+        legs = joint.out_ports[0].connected_to
+        if feed is None or feed[0].asset_type != "Pipe" or len(legs) < 2:
+            continue
+        feed_pipe = feed[0]
+        cold_feed_pipe = network.pipe(_cold(feed_pipe.name))
+        if cold_feed_pipe is None:
+            continue
+
+        pipes, cold_pipes, demands = [], [], []
+        for index in legs:
+            pipe = network.owner[index]
+            if pipe.asset_type != "Pipe" or pipe.in_ports[0].connected_to != (
+                joint.out_ports[0].index,
+            ):
+                break
+            demand = network.single_connection(pipe.out_ports[0])
+            if demand is None or demand[0].asset_type not in DEMAND_ASSET_TYPES:
+                break
+            demand = demand[0]
+            cold_pipe = network.single_connection(demand.out_ports[0])
+            if cold_pipe is None or cold_pipe[0].name != _cold(pipe.name):
+                break
+            pipes.append(pipe)
+            demands.append(demand)
+            cold_pipes.append(cold_pipe[0])
+        else:
+            cold_joint = network.owner[cold_pipes[0].out_ports[0].connected_to[0]]
+            cold_feed = network.single_connection(cold_joint.out_ports[0])
+            if (
+                cold_joint.asset_type != "Joint"
+                or not _paired(joint, cold_joint)
+                or len(cold_joint.in_ports) != 1
+                or set(cold_joint.in_ports[0].connected_to)
+                != {p.out_ports[0].index for p in cold_pipes}
+                or cold_feed is None
+                or cold_feed[0] is not cold_feed_pipe
+                or len({d.asset_type for d in demands}) != 1
+                or len({_pipe_properties(p) for p in pipes}) != 1
+                or len({_pipe_properties(p) for p in cold_pipes}) != 1
+                or not _fits_single_pipe(converter, pipes[0], demands)
+            ):
+                continue
+
+            steps.append(_lump_branch(network, joint, cold_joint, pipes, cold_pipes, demands))
+
+    return steps
+
+
+def _lump_branch(network, joint, cold_joint, pipes, cold_pipes, demands) -> LumpedBranch:
+    feed_pipe = network.owner[joint.in_ports[0].connected_to[0]]
+    cold_feed_pipe = network.owner[cold_joint.out_ports[0].connected_to[0]]
+
+    lengths = tuple(p.attributes["length"] for p in pipes)
+    cold_lengths = tuple(p.attributes["length"] for p in cold_pipes)
+
+    for a in [joint, cold_joint, *pipes[1:], *cold_pipes[1:], *demands[1:]]:
+        network.remove(a.name)
+
+    # The first demand and its pipes become the equivalent ones, connected
+    # directly to the pipes that fed the joints.
+    pipe, cold_pipe, demand = pipes[0], cold_pipes[0], demands[0]
+    pipe_in = dataclasses.replace(pipe.in_ports[0], connected_to=(feed_pipe.out_ports[0].index,))
+    cold_pipe_out = dataclasses.replace(
+        cold_pipe.out_ports[0], connected_to=(cold_feed_pipe.in_ports[0].index,)
+    )
+
+    network.add(
+        dataclasses.replace(
+            feed_pipe,
+            out_ports=(dataclasses.replace(feed_pipe.out_ports[0], connected_to=(pipe_in.index,)),),
+        )
+    )
+    network.add(
+        dataclasses.replace(
+            cold_feed_pipe,
+            in_ports=(
+                dataclasses.replace(
+                    cold_feed_pipe.in_ports[0], connected_to=(cold_pipe_out.index,)
+                ),
+            ),
+        )
+    )
+    network.add(
+        dataclasses.replace(
+            pipe,
+            in_ports=(pipe_in,),
+            attributes={**pipe.attributes, "length": sum(lengths)},
+        )
+    )
+    network.add(
+        dataclasses.replace(
+            cold_pipe,
+            out_ports=(cold_pipe_out,),
+            attributes={**cold_pipe.attributes, "length": sum(cold_lengths)},
+        )
+    )
+
+    # A power of zero means the demand is not limited
+    powers = [d.attributes.get("power") or 0.0 for d in demands]
+    power = sum(powers) if all(p > 0.0 for p in powers) else 0.0
+    network.add(dataclasses.replace(demand, attributes={**demand.attributes, "power": power}))
+
+    return LumpedBranch(
+        demand.name,
+        tuple(d.name for d in demands),
+        pipe.name,
+        tuple(p.name for p in pipes),
+        lengths,
+        (joint.name, cold_joint.name),
+    )
+
+
+def reduce_network(
+    assets: Dict[str, Asset],
+    merge_pipe_series: bool = True,
+    lump_dead_ends: bool = True,
+    maximum_velocity: Optional[float] = None,
+    head_loss_option: Optional[HeadLossOption] = None,
+) -> NetworkReduction:
+    """
+    Reduces the number of assets of a heat network, without changing its
+    heat balance:
+
+    - Chains of pipes with the same diameter and insulation, connected
+      directly or through joints without branches, are merged into a single
+      pipe with the summed length. As both the heat loss and (linear) head
+      loss of a pipe are proportional to its length, the equivalent pipe
+      has the same total heat and head loss.
+    - Joints that only feed demands, each through a single pipe of the same
+      diameter and insulation, are lumped into a single demand with the
+      summed power, behind a pipe with the summed length. The heat loss of
+      the equivalent pipe is that of all the pipes it replaces. As it has the
+      diameter of a single pipe, but carries the flow of all demands, a
+      branch is only lumped when the summed power of its demands fits
+      through a single pipe at `maximum_velocity`. The equivalent pipe
+      would however overestimate the head loss of the individual pipes, by
+      up to the square of their number, so branches are only lumped when
+      head loss is not modelled.
+
+    Both are repeated until the network does not change anymore, so that
+    e.g. dead-end trees of demands collapse into a single demand.
+
+    :param assets: The assets of an ESDL file.
+    :param merge_pipe_series: Whether to merge pipes in series.
+    :param lump_dead_ends: Whether to lump dead-end branches of demands.
+    :param maximum_velocity: The maximum velocity in pipes, see
+        :py:meth:`HeatMixin.heat_network_options`. If None, the flow through
+        the equivalent pipes of lumped branches is not limited.
+    :param head_loss_option: The head loss option, see
+        :py:meth:`HeatMixin.heat_network_options`. Dead-end branches are only
+        lumped if None or ``HeadLossOption.NO_HEADLOSS``.
+
+    :returns: The reduced assets and the applied reduction steps.
+    """
+    network = _Network(assets)
+    steps = []
+
+    if lump_dead_ends and head_loss_option not in {None, HeadLossOption.NO_HEADLOSS}:
+        logger.info(
+            "Not lumping dead-end branches, as the head loss of the equivalent pipes "
+            "would overestimate that of the pipes they replace"
+        )
+        lump_dead_ends = False
+
+    converter = None
+    if maximum_velocity is not None:
+        converter = AssetToHeatComponent(v_max=maximum_velocity)
+
+    while True:
+        new_steps = []
+        if merge_pipe_series:
+            new_steps.extend(_merge_series(network))
+        if lump_dead_ends:
+            new_steps.extend(_lump_branches(network, converter))
+        if not new_steps:
+            break
+        steps.extend(new_steps)
+
+    # Keep the order of the original assets
+    reduced = {k: network.assets[k] for k in assets if k in network.assets}
+
+    logger.info(f"Reduced the network from {len(assets)} to {len(reduced)} assets")
+
+    return NetworkReduction(reduced, tuple(steps))
+
+
+def _component_results(results: Dict[str, np.ndarray], name: str) -> Dict[str, np.ndarray]:
+    """
+    The results of a component, keyed on the part of the variable name after
+    the name of the component, e.g. ``.Q`` or ``__flow_direct_var``.
+    """
+    return {
+        k[len(name) :]: v
+        for k, v in results.items()
+        if k.startswith(f"{name}.") or k.startswith(f"{name}__")
+    }
+
+
+def _expand_series(results: Dict[str, np.ndarray], step: MergedSeries):
+    equivalent = _component_results(results, step.pipe)
+    fractions = np.array(step.lengths) / sum(step.lengths)
+    positions = np.concatenate(([0.0], np.cumsum(fractions)))
+
+    for i, pipe in enumerate(step.pipes):
+        pipe_results = dict(equivalent)
+        for a, b in _IN_OUT_SUFFIXES:
+            if a in equivalent and b in equivalent:
+                difference = equivalent[b] - equivalent[a]
+                pipe_results[a] = equivalent[a] + positions[i] * difference
+                pipe_results[b] = equivalent[a] + positions[i + 1] * difference
+        for suffix, values in equivalent.items():
+            if suffix == ".dH" or "_loss" in suffix:
+                pipe_results[suffix] = fractions[i] * values
+        results.update((f"{pipe}{k}", v) for k, v in pipe_results.items())
+
+    for i, joint in enumerate(step.joints):
+        if joint is not None:
+            results[f"{joint}.H"] = results[f"{step.pipes[i]}.HeatOut.H"]
+
+
+def _expand_branch(results: Dict[str, np.ndarray], step: LumpedBranch, shares: List[np.ndarray]):
+    demand = _component_results(results, step.demand)
+    pipes = {
+        step.pipe: _component_results(results, step.pipe),
+        _cold(step.pipe): _component_results(results, _cold(step.pipe)),
+    }
+    fractions = np.array(step.lengths) / sum(step.lengths)
+
+    for d, share in zip(step.demands, shares):
+        results.update(
+            (f"{d}{k}", share * v if k in _FLOW_SUFFIXES else v) for k, v in demand.items()
+        )
+
+    for i, share in enumerate(shares):
+        for equivalent_name, pipe in [
+            (step.pipe, step.pipes[i]),
+            (_cold(step.pipe), _cold(step.pipes[i])),
+        ]:
+            equivalent = pipes[equivalent_name]
+            pipe_results = {}
+            for k, v in equivalent.items():
+                if k in _FLOW_SUFFIXES:
+                    v = share * v
+                elif "_loss" in k:
+                    v = fractions[i] * v
+                pipe_results[k] = v
+
+            # The heat loss is divided over the pipes by their length
+            heat_in, heat_out = equivalent[".HeatIn.Heat"], equivalent[".HeatOut.Heat"]
+            out = share * heat_out
+            loss = fractions[i] * (heat_in - heat_out)
+            for a, b in [(".HeatIn.Heat", ".HeatOut.Heat"), (".Heat_in", ".Heat_out")]:
+                pipe_results[a] = out + loss
+                pipe_results[b] = out
+
+            results.update((f"{pipe}{k}", v) for k, v in pipe_results.items())
+
+    joint, cold_joint = step.joints
+    results[f"{joint}.H"] = pipes[step.pipe][".HeatIn.H"]
+    results[f"{cold_joint}.H"] = pipes[_cold(step.pipe)][".HeatOut.H"]
+
+
+class NetworkReductionMixin(ESDLMixin):
+    """
+    Solves a Heat problem of an ESDL file on a reduced network, see
+    :py:func:`reduce_network`, for networks with long chains of short pipe
+    segments or many small dead-end branches.
+
+    The target heat demand of a lumped demand is the sum of those of the
+    demands it replaces, which are read like those of the other demands.
+    After optimization, :py:meth:`extract_expanded_results` gives the results
+    of all original assets. The results of the pipes and demands replaced by
+    equivalent ones are derived from those of the equivalent assets: the
+    heat of a lumped demand is divided in proportion to the target heat
+    demands, and heat loss and head loss in proportion to pipe length.
+
+    Note that the pipes, demands and joints that are replaced are not
+    components of the optimization problem, so goals and options for them
+    (e.g. pipe classes) have to refer to the equivalent assets instead.
+
+    This mixin has to come before :py:class:`ESDLMixin` in the list of base
+    classes of the optimization problem.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__input_data_config = self.esdl_pi_input_data_config or _ESDLInputDataConfig
+        self.esdl_pi_input_data_config = self.__reduced_input_data_config
+
+        self.__output_data_config = self.esdl_pi_output_data_config or _ESDLOutputDataConfig
+        self.esdl_pi_output_data_config = self.__reduced_output_data_config
+
+        self.__demand_targets = {}
+
+        super().__init__(*args, **kwargs)
+
+    def network_reduction_options(self):
+        r"""
+        Returns a dictionary of options controlling the reduction of the
+        network.
+
+        +------------------------+----------+---------------+
+        | Option                 | Type     | Default value |
+        +========================+==========+===============+
+        | ``merge_pipe_series``  | ``bool`` | ``True``      |
+        +------------------------+----------+---------------+
+        | ``lump_dead_ends``     | ``bool`` | ``True``      |
+        +------------------------+----------+---------------+
+
+        The ``merge_pipe_series`` option merges pipes in series with the same
+        properties into a single pipe.
+
+        The ``lump_dead_ends`` option lumps joints that only feed demands
+        into a single demand, when a single pipe can carry the summed power
+        of the demands at the ``maximum_velocity`` of
+        :py:meth:`HeatMixin.heat_network_options`. Branches are only lumped
+        when its ``head_loss_option`` is ``HeadLossOption.NO_HEADLOSS``.
+
+        :returns: A dictionary of network reduction options.
+        """
+
+        options = {}
+
+        options["merge_pipe_series"] = True
+        options["lump_dead_ends"] = True
+
+        return options
+
+    @property
+    def network_reduction(self) -> NetworkReduction:
+        try:
+            return self.__network_reduction
+        except AttributeError:
+            self.__original_assets = super().esdl_assets
+            heat_network_options = self.heat_network_options()
+            self.__network_reduction = reduce_network(
+                self.__original_assets,
+                **self.network_reduction_options(),
+                maximum_velocity=heat_network_options["maximum_velocity"],
+                head_loss_option=heat_network_options["head_loss_option"],
+            )
+            return self.__network_reduction
+
+    @property
+    def esdl_assets(self):
+        return self.network_reduction.assets
+
+    @property
+    def __lumped_demands(self) -> Dict[str, Asset]:
+        """
+        The original demands that are not part of the reduced network.
+        """
+        reduced = self.network_reduction.assets
+        return {
+            k: a
+            for k, a in self.__original_assets.items()
+            if a.asset_type in DEMAND_ASSET_TYPES and k not in reduced
+        }
+
+    def __reduced_input_data_config(self, id_map, heat_network_components):
+        # The time series of lumped demands are read as well
+        lumped = self.__lumped_demands
+        id_map = {**id_map, **{k: a.name for k, a in lumped.items()}}
+        components = dict(heat_network_components)
+        components["demand"] = [*components["demand"], *(a.name for a in lumped.values())]
+        return self.__input_data_config(id_map, components)
+
+    def __reduced_output_data_config(self, id_map):
+        # Output requested for assets that were reduced away is skipped with
+        # a warning, like that of any other variable without results.
+        removed = {
+            k: a.name
+            for k, a in self.__original_assets.items()
+            if k not in self.network_reduction.assets
+        }
+        return self.__output_data_config({**id_map, **removed})
+
+    def read_csv(self, input_timeseries_file):
+        super().read_csv(input_timeseries_file)
+
+        csv_data = pd.read_csv(input_timeseries_file)
+        datetimes = self.io.datetimes
+        for ensemble_member in range(self.ensemble_size):
+            for asset in self.__lumped_demands.values():
+                values = csv_data[f"{asset.name.replace(' ', '')}.target_heat_demand"].to_numpy()
+                self.io.set_timeseries(
+                    f"{asset.name}.target_heat_demand", datetimes, values, ensemble_member
+                )
+
+    def read(self):
+        super().read()
+
+        datetimes = self.io.datetimes
+
+        for ensemble_member in range(self.ensemble_size):
+            targets = {}
+            for variable in self.io.get_timeseries_names(ensemble_member):
+                if variable.endswith(".target_heat_demand"):
+                    name = variable[: -len(".target_heat_demand")]
+                    targets[name] = self.io.get_timeseries(variable, ensemble_member)[1]
+
+            # The targets of the demands of every lumped branch, in the order
+            # in which the branches were lumped.
+            self.__demand_targets[ensemble_member] = step_targets = {}
+
+            for step in self.network_reduction.steps:
+                if not isinstance(step, LumpedBranch):
+                    continue
+                step_targets[step] = [targets.get(d) for d in step.demands]
+                if any(t is None for t in step_targets[step]):
+                    logger.warning(
+                        f"Not all demands lumped into {step.demand} have a target heat demand"
+                    )
+                    targets.pop(step.demand, None)
+                else:
+                    targets[step.demand] = np.sum(step_targets[step], axis=0)
+                    self.io.set_timeseries(
+                        f"{step.demand}.target_heat_demand",
+                        datetimes,
+                        targets[step.demand],
+                        ensemble_member,
+                    )
+
+    def extract_expanded_results(self, ensemble_member: int = 0) -> Dict[str, np.ndarray]:
+        """
+        The results of the optimization problem for all assets of the
+        original network, including those that were merged or lumped.
+
+        :param ensemble_member: The ensemble member.
+
+        :returns: A dictionary of results, keyed on variable name.
+        """
+        extracted = self.extract_results(ensemble_member)
+
+        results = {}
+        for canonical in extracted.keys():
+            values = np.asarray(extracted[canonical])
+            for alias in self.alias_relation.aliases(canonical):
+                if alias.startswith("-"):
+                    results[alias[1:]] = -values
+                else:
+                    results[alias] = values
+
+        io_times = self.io.times_sec
+        times = self.times()
+
+        for step in reversed(self.network_reduction.steps):
+            if isinstance(step, MergedSeries):
+                _expand_series(results, step)
+                continue
+
+            targets = self.__demand_targets.get(ensemble_member, {}).get(step)
+            if targets is None or any(t is None for t in targets):
+                shares = [np.full(len(times), 1.0 / len(step.demands))] * len(step.demands)
+            else:
+                targets = [np.interp(times, io_times, t) for t in targets]
+                total = np.sum(targets, axis=0)
+                safe_total = np.where(total > 0.0, total, 1.0)
+                shares = [
+                    np.where(total > 0.0, t / safe_total, 1.0 / len(step.demands)) for t in targets
+                ]
+            _expand_branch(results, step, shares)
+
+        return results
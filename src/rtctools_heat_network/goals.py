@@ -0,0 +1,330 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import casadi as ca
+
+import numpy as np
+
+from rtctools.optimization.goal_programming_mixin import Goal
+from rtctools.optimization.optimization_problem import OptimizationProblem
+from rtctools.optimization.timeseries import Timeseries
+
+Values = Union[float, np.ndarray, Timeseries]
+
+
+def _values_at_times(values: Values, times: np.ndarray) -> np.ndarray:
+    """
+    Scalars, arrays and time series as an array with a value for every time
+    of the optimization problem.
+    """
+    if isinstance(values, Timeseries):
+        return np.interp(times, values.times, values.values)
+    else:
+        return np.broadcast_to(np.asarray(values, dtype=float), times.shape).copy()
+
+
+def _state_factors(
+    optimization_problem: OptimizationProblem, canonical: str, sign: int
+) -> np.ndarray:
+    """
+    The factors with which the entries of a canonical state in the state
+    vector have to be multiplied to get the (signed) unscaled values of the
+    state at every time. As nominals can still change after the goals are
+    constructed, e.g. by scaling analysis, these are determined every time
+    the goal function is built.
+    """
+    times = optimization_problem.times()
+    nominal = optimization_problem.variable_nominal(canonical)
+    return sign * np.broadcast_to(nominal, times.shape).astype(float)
+
+
+def _bounds_range(
+    optimization_problem: OptimizationProblem, states: Iterable[str]
+) -> Tuple[float, float]:
+    """
+    The range of the sum of the states, based on their bounds.
+    """
+    bounds = optimization_problem.bounds()
+
+    lower, upper = 0.0, 0.0
+    for s in states:
+        lb, ub = bounds.get(s, (-np.inf, np.inf))
+        lower += np.min(lb.values if isinstance(lb, Timeseries) else lb)
+        upper += np.max(ub.values if isinstance(ub, Timeseries) else ub)
+
+    return lower, upper
+
+
+def _targets(target: np.ndarray, function_range: Tuple[float, float]):
+    """
+    Minimum and maximum targets for a target value. Targets on (or beyond)
+    the bounds of the function range are always met, and have to be NaN.
+    """
+    target_min = np.where(target <= function_range[0], np.nan, target)
+    target_max = np.where(target >= function_range[1], np.nan, target)
+    if len(target) == 1:
+        # Goals of size one have scalar targets
+        return target_min[0], target_max[0]
+    return target_min, target_max
+
+
+class WeightedSumGoal(Goal):
+    """
+    Minimizes the weighted sum of one or more states over all times. The
+    weights can be a scalar, an array or time series over the times of the
+    optimization problem, or a dictionary with such weights per state, e.g.
+    to minimize costs with time varying prices.
+
+    The goal function is a single inner product of the weights, multiplied
+    with the nominals of the states, with the slices of the state vector,
+    instead of a sum over :py:meth:`OptimizationProblem.state_at` of every
+    state at every time. The default function nominal is based on the
+    nominals of the states when constructing the goal.
+    """
+
+    def __init__(
+        self,
+        optimization_problem: OptimizationProblem,
+        states: List[str],
+        weights: Union[Values, Dict[str, Values]] = 1.0,
+        priority: int = 1,
+        order: int = 1,
+        weight: float = 1.0,
+        function_nominal: Optional[float] = None,
+    ):
+        times = optimization_problem.times()
+
+        self.priority = priority
+        self.order = order
+        self.weight = weight
+
+        self.__states = []
+        self.__weights = []
+
+        for s in states:
+            w = _values_at_times(weights[s] if isinstance(weights, dict) else weights, times)
+            self.__states.append(optimization_problem.alias_relation.canonical_signed(s))
+            self.__weights.append(w)
+
+        if function_nominal is None:
+            function_nominal = np.sum(np.abs(self.__coefficients(optimization_problem)))
+        self.function_nominal = function_nominal if function_nominal > 0.0 else 1.0
+
+    def __coefficients(self, optimization_problem) -> np.ndarray:
+        coefficients = [
+            w * _state_factors(optimization_problem, canonical, sign)
+            for (canonical, sign), w in zip(self.__states, self.__weights)
+        ]
+        return np.concatenate(coefficients) if coefficients else np.zeros(0)
+
+    def function(self, optimization_problem, ensemble_member):
+        x = ca.vertcat(
+            *(
+                optimization_problem.state_vector(canonical, ensemble_member)
+                for canonical, _ in self.__states
+            )
+        )
+        return ca.dot(ca.DM(self.__coefficients(optimization_problem)), x)
+
+
+class MinimizeSourceHeatGoal(WeightedSumGoal):
+    """
+    Minimizes the total heat production of the given sources, or of all
+    sources if none are given, over all times.
+    """
+
+    def __init__(
+        self,
+        optimization_problem: OptimizationProblem,
+        sources: Optional[List[str]] = None,
+        weights: Union[Values, Dict[str, Values]] = 1.0,
+        priority: int = 1,
+        order: int = 1,
+        weight: float = 1.0,
+    ):
+        if sources is None:
+            sources = optimization_problem.heat_network_components.get("source", [])
+
+        if isinstance(weights, dict):
+            weights = {f"{s}.Heat_source": w for s, w in weights.items()}
+
+        super().__init__(
+            optimization_problem,
+            [f"{s}.Heat_source" for s in sources],
+            weights,
+            priority=priority,
+            order=order,
+            weight=weight,
+        )
+
+
+class _TimeVectorGoal(Goal):
+    """
+    Base class of vector goals with an entry for every (selected) time of
+    the optimization problem, of which the function is the (sum of the)
+    slices of the state vector of one or more states.
+    """
+
+    def __init__(
+        self,
+        optimization_problem: OptimizationProblem,
+        states: List[str],
+        priority: int,
+        order: int,
+        weight: float,
+        indices: Optional[np.ndarray] = None,
+    ):
+        n_times = len(optimization_problem.times())
+        if indices is None:
+            indices = np.arange(n_times)
+
+        self.priority = priority
+        self.order = order
+        self.weight = weight
+        self.size = len(indices)
+
+        # Slicing is only needed when not all times are selected
+        self.__indices = None if len(indices) == n_times else [int(i) for i in indices]
+        self.__states = [optimization_problem.alias_relation.canonical_signed(s) for s in states]
+
+    def function(self, optimization_problem, ensemble_member):
+        result = 0.0
+        for canonical, sign in self.__states:
+            factors = _state_factors(optimization_problem, canonical, sign)
+            x = optimization_problem.state_vector(canonical, ensemble_member)
+            if self.__indices is not None:
+                factors = factors[self.__indices]
+                x = x[self.__indices]
+            result += ca.DM(factors) * x
+        return result
+
+
+class PeakShavingGoal(_TimeVectorGoal):
+    """
+    Keeps the sum of the given states below a peak value at every time, for
+    example the total heat production of all sources. Exceedances of the
+    peak are penalized with the given order.
+
+    If no ``function_range`` is given, it is based on the bounds of the
+    states, which then have to be finite.
+    """
+
+    def __init__(
+        self,
+        optimization_problem: OptimizationProblem,
+        states: List[str],
+        peak: Values,
+        priority: int = 1,
+        order: int = 2,
+        weight: float = 1.0,
+        function_range: Optional[Tuple[float, float]] = None,
+    ):
+        super().__init__(optimization_problem, states, priority, order, weight)
+
+        times = optimization_problem.times()
+        peak = _values_at_times(peak, times)
+
+        if function_range is None:
+            function_range = _bounds_range(optimization_problem, states)
+            if not np.all(np.isfinite(function_range)):
+                raise Exception(
+                    f"The bounds of {', '.join(states)} are not finite, "
+                    f"so a function range has to be specified"
+                )
+
+        _, self.target_max = _targets(peak, function_range)
+        self.function_range = function_range
+        self.function_nominal = max(np.median(np.abs(peak)), 1.0)
+
+
+class DemandTrackingGoal(_TimeVectorGoal):
+    """
+    Makes the heat demand of a demand match a target at every time.
+
+    If no ``function_range`` is given, it is based on the bounds of the heat
+    demand, or on the target if those are not finite.
+    """
+
+    def __init__(
+        self,
+        optimization_problem: OptimizationProblem,
+        demand: str,
+        target: Values,
+        priority: int = 1,
+        order: int = 2,
+        weight: float = 1.0,
+        function_range: Optional[Tuple[float, float]] = None,
+    ):
+        state = f"{demand}.Heat_demand"
+
+        super().__init__(optimization_problem, [state], priority, order, weight)
+
+        times = optimization_problem.times()
+        target = _values_at_times(target, times)
+
+        if function_range is None:
+            function_range = _bounds_range(optimization_problem, [state])
+            if not np.all(np.isfinite(function_range)):
+                function_range = (0.0, 2.0 * max(np.max(np.abs(target)), 1.0))
+
+        self.target_min, self.target_max = _targets(target, function_range)
+        self.function_range = function_range
+        self.function_nominal = max(np.median(np.abs(target)), 1.0)
+
+
+class BufferTargetGoal(_TimeVectorGoal):
+    """
+    Makes the stored heat of a buffer match a target. For QTH problems, the
+    volume of the hot tank is used instead. Only the times at which the
+    target is not NaN are taken into account, so a time series with a single
+    value at the end of the horizon targets the final state of the buffer.
+
+    If no ``function_range`` is given, it is based on the bounds of the
+    buffer state.
+    """
+
+    def __init__(
+        self,
+        optimization_problem: OptimizationProblem,
+        buffer: str,
+        target: Values,
+        priority: int = 1,
+        order: int = 2,
+        weight: float = 1.0,
+        function_range: Optional[Tuple[float, float]] = None,
+    ):
+        # Only the buffers of heat problems have a stored heat state
+        stored_heat = f"{buffer}.Stored_heat"
+        canonical, _ = optimization_problem.alias_relation.canonical_signed(stored_heat)
+        if canonical in optimization_problem.differentiated_states:
+            state = stored_heat
+        else:
+            state = f"{buffer}.V_hot_tank"
+
+        times = optimization_problem.times()
+
+        if isinstance(target, Timeseries):
+            # Interpolation would spread a target to neighbouring times, so
+            # we only use the values at the times of the problem.
+            values = np.full(len(times), np.nan)
+            match = np.isin(target.times, times)
+            values[np.searchsorted(times, target.times[match])] = target.values[match]
+            target = values
+        target = _values_at_times(target, times)
+
+        indices = np.flatnonzero(np.isfinite(target))
+
+        super().__init__(optimization_problem, [state], priority, order, weight, indices)
+
+        if function_range is None:
+            function_range = _bounds_range(optimization_problem, [state])
+            if not np.all(np.isfinite(function_range)):
+                raise Exception(
+                    f"The bounds of {state} are not finite, so a function range has to be "
+                    f"specified"
+                )
+
+        target = target[indices]
+
+        self.target_min, self.target_max = _targets(target, function_range)
+        self.function_range = function_range
+        self.function_nominal = max(np.median(np.abs(target)), 1.0) if len(target) else 1.0
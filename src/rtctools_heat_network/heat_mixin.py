@@ -12,10 +12,15 @@ from rtctools.optimization.collocated_integrated_optimization_problem import (
 from rtctools.optimization.timeseries import Timeseries
 
 from rtctools_heat_network._heat_loss_u_values_pipe import heat_loss_u_values_pipe
+from rtctools_heat_network._pipe_class_screening import (
+    dominated_pipe_classes,
+    pipe_heat_requirements,
+)
 from rtctools_heat_network.control_variables import map_comp_type_to_control_variable
 
 from .base_component_type_mixin import BaseComponentTypeMixin
 from .head_loss_mixin import HeadLossOption, _HeadLossMixin
+from .heat_network_common import NodeConnectionDirection
 from .pipe_class import PipeClass
 
 
@@ -69,6 +74,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         self.__pipe_topo_pipe_class_var_bounds = {}
         self.__pipe_topo_pipe_class_map = {}
         self.__pipe_topo_pipe_class_result = {}
+        self.__pipe_topo_screened_pipe_classes = {}
 
         self.__pipe_topo_heat_discharge_bounds = {}
 
@@ -182,10 +188,20 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
             self.__pipe_topo_diameter_area_parameters.append({})
             self.__pipe_topo_heat_loss_parameters.append({})
 
+        hot_to_cold = self.heat_network_component_index.hot_to_cold
+
+        if options["screen_pipe_classes"]:
+            self.__pipe_topo_screened_pipe_classes = self.__screen_pipe_classes(
+                options, parameters, bounds
+            )
+        else:
+            self.__pipe_topo_screened_pipe_classes = {
+                pipe: self.pipe_classes(pipe) for pipe in self.hot_pipes
+            }
+
         for pipe in self.hot_pipes:
-            cold_pipe = self.hot_to_cold_pipe(pipe)
-            pipe_classes = self.pipe_classes(pipe)
-            cold_pipe = self.hot_to_cold_pipe(pipe)
+            pipe_classes = self.__pipe_topo_screened_pipe_classes[pipe]
+            cold_pipe = hot_to_cold[pipe]
 
             if len([c for c in pipe_classes if c.inner_diameter == 0]) > 1:
                 raise Exception(
@@ -330,7 +346,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
             max_discharge = max(c.maximum_discharge for c in pipe_classes)
 
             self.__pipe_topo_heat_discharge_bounds[f"{pipe}.Q"] = (-max_discharge, max_discharge)
-            self.__pipe_topo_heat_discharge_bounds[f"{self.hot_to_cold_pipe(pipe)}.Q"] = (
+            self.__pipe_topo_heat_discharge_bounds[f"{hot_to_cold[pipe]}.Q"] = (
                 -max_discharge,
                 max_discharge,
             )
@@ -394,6 +410,8 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         +--------------------------------------+-----------+-----------------------------+
         | ``minimum_velocity``                 | ``float`` | ``0.005`` m/s               |
         +--------------------------------------+-----------+-----------------------------+
+        | ``screen_pipe_classes``              | ``bool``  | ``False``                   |
+        +--------------------------------------+-----------+-----------------------------+
         | ``head_loss_option`` (inherited)     | ``enum``  | ``HeadLossOption.LINEAR``   |
         +--------------------------------------+-----------+-----------------------------+
         | ``minimize_head_losses`` (inherited) | ``bool``  | ``False``                   |
@@ -425,6 +443,21 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         `0.005` m/s helps the solver by avoiding the difficult case where
         discharges get close to zero.
 
+        The ``screen_pipe_classes`` option removes pipe classes that can never
+        be part of a feasible or optimal solution before the problem is
+        built, reducing the number of integer variables. A pipe class is
+        removed when it cannot transport the heat that has to go through the
+        pipe to satisfy the demands returned by
+        :py:meth:`pipe_class_screening_demand`, which is the case for pipes
+        that are the only connection between (groups of) demands and
+        sources. As the heat in a pipe may exceed what its discharge carries
+        by twice the total heat loss of the hot pipes, that margin is taken
+        into account as well. Pipe classes that are dominated by another
+        class with the same diameter, i.e. that are not cheaper, do not allow
+        a higher velocity and do not have lower heat losses, are removed as
+        well. The remaining classes are available through
+        :py:meth:`get_screened_pipe_classes`. This option is off by default.
+
         Note that the inherited options ``head_loss_option`` and
         ``minimize_head_losses`` are changed from their default values to
         ``HeadLossOption.LINEAR`` and ``False`` respectively.
@@ -438,6 +471,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         options["neglect_pipe_heat_losses"] = False
         options["heat_loss_disconnected_pipe"] = True
         options["minimum_velocity"] = 0.005
+        options["screen_pipe_classes"] = False
         options["head_loss_option"] = HeadLossOption.LINEAR
         options["minimize_head_losses"] = False
 
@@ -464,6 +498,30 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         """
         return self.__pipe_topo_pipe_class_result[pipe]
 
+    def get_screened_pipe_classes(self, pipe: str) -> List[PipeClass]:
+        """
+        Return the pipe classes of a hot pipe that remain after screening, see
+        the ``screen_pipe_classes`` option. These are the classes that the
+        optimization decides between.
+        """
+        return self.__pipe_topo_screened_pipe_classes[pipe]
+
+    def pipe_class_screening_demand(self, demand: str) -> np.ndarray:
+        """
+        The heat demand per time step that a demand is guaranteed to have,
+        used to remove pipe classes that are too small to supply it. By
+        default, this is the lower bound of the heat demand. Override this
+        method to screen with e.g. the demand targets, if these have to be
+        met.
+        """
+        times = self.times()
+        lb = self.bounds()[f"{demand}.Heat_demand"][0]
+
+        if isinstance(lb, Timeseries):
+            return np.interp(times, lb.times, lb.values)
+        else:
+            return np.broadcast_to(np.asarray(lb, dtype=float), times.shape)
+
     def pipe_diameter_symbol_name(self, pipe: str) -> str:
         return self.__pipe_topo_diameter_map[pipe]
 
@@ -527,6 +585,178 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         bounds.update(self._change_setpoint_bounds)
         return bounds
 
+    def __screen_pipe_classes(self, options, parameters, bounds):
+        """
+        Removes the pipe classes of hot pipes that are too small to carry the
+        heat that has to go through them, and those that are dominated by
+        another class. The hot side of the network is turned into a graph with
+        the pipes as edges. Components that pass heat through (e.g. pumps)
+        are merged into a single vertex, and demands and sources are
+        attached to the vertex of their hot port.
+        """
+        hot_pipes = self.hot_pipes
+        pipe_classes = {p: self.pipe_classes(p) for p in hot_pipes}
+
+        if not any(len(c) > 1 for c in pipe_classes.values()):
+            return pipe_classes
+
+        components = self.heat_network_components
+        component_type = {n: t for t, names in components.items() for n in names}
+        pass_through = {"pump", "check_valve", "control_valve"}
+
+        vertex_ids = {}
+        parent = []
+
+        def _vertex(name):
+            try:
+                return vertex_ids[name]
+            except KeyError:
+                vertex_ids[name] = len(parent)
+                parent.append(len(parent))
+                return vertex_ids[name]
+
+        def _find(v):
+            while parent[v] != v:
+                parent[v] = parent[parent[v]]
+                v = parent[v]
+            return v
+
+        def _union(a, b):
+            parent[_find(a)] = _find(b)
+
+        def _port_vertex(port):
+            return _vertex(self.alias_relation.canonical_signed(port)[0])
+
+        edges = [
+            (_port_vertex(f"{p}.HeatIn.Heat"), _port_vertex(f"{p}.HeatOut.Heat")) for p in hot_pipes
+        ]
+        hot_pipe_index = {p: i for i, p in enumerate(hot_pipes)}
+
+        for node, connections in self.heat_network_topology.nodes.items():
+            node_vertex = _vertex(node)
+            for pipe, orientation in connections.values():
+                try:
+                    u, v = edges[hot_pipe_index[pipe]]
+                except KeyError:
+                    # Cold pipe
+                    continue
+                _union(node_vertex, v if orientation == NodeConnectionDirection.IN else u)
+
+        # Demands, sources and other components connected to the pipes. Ports
+        # of pass-through components are scanned as well, e.g. to find the
+        # source behind a pump.
+        demand_vertices = []
+        source_vertices = []
+        unbounded_vertices = []
+
+        to_scan = list(vertex_ids.items())
+        scanned = set(vertex_ids)
+
+        while to_scan:
+            canonical, v = to_scan.pop()
+
+            for alias in self.alias_relation.aliases(canonical):
+                name, *port = alias.lstrip("-").split(".")
+                t = component_type.get(name)
+
+                # Only the heat ports tell us how a component is connected,
+                # other aliases are e.g. the heat flow of a demand.
+                if t is None or t in {"pipe", "node"} or port[-1:] != ["Heat"]:
+                    continue
+                elif t in pass_through:
+                    _union(v, _vertex(name))
+                    for other_port in [f"{name}.HeatIn.Heat", f"{name}.HeatOut.Heat"]:
+                        other = self.alias_relation.canonical_signed(other_port)[0]
+                        if other not in scanned:
+                            scanned.add(other)
+                            to_scan.append((other, v))
+                elif t == "demand" and port == ["HeatIn", "Heat"]:
+                    demand_vertices.append((v, name))
+                elif t == "source" and port == ["HeatOut", "Heat"]:
+                    source_vertices.append((v, name))
+                else:
+                    unbounded_vertices.append(v)
+
+        roots = sorted({_find(v) for v in range(len(parent))})
+        root_index = {r: i for i, r in enumerate(roots)}
+
+        def _index(v):
+            return root_index[_find(v)]
+
+        times = self.times()
+        demand = np.zeros((len(roots), len(times)))
+        supply = np.zeros(len(roots))
+        unbounded = np.zeros(len(roots), dtype=bool)
+
+        for v, d in demand_vertices:
+            demand[_index(v)] += np.nan_to_num(self.pipe_class_screening_demand(d))
+
+        for v, s in source_vertices:
+            ub = bounds.get(f"{s}.Heat_source", (0.0, np.inf))[1]
+            supply[_index(v)] += np.max(ub.values if isinstance(ub, Timeseries) else ub)
+
+        for v in unbounded_vertices:
+            unbounded[_index(v)] = True
+
+        requirements = pipe_heat_requirements(
+            len(roots),
+            [(_index(u), _index(v)) for u, v in edges],
+            demand,
+            supply,
+            unbounded,
+        )
+
+        # The heat to discharge constraints let the heat in a pipe exceed
+        # what its discharge carries by twice the total heat loss of the hot
+        # pipes, so a pipe class can only be ruled out when the required heat
+        # exceeds that as well. The largest heat loss over all classes of a
+        # pipe bounds the one of the classes that remain after screening.
+        sum_heat_losses = 0.0
+        for pipe in hot_pipes:
+            if pipe_classes[pipe]:
+                sum_heat_losses += max(
+                    self.__pipe_heat_loss(options, parameters, pipe, c.u_values)
+                    for c in pipe_classes[pipe]
+                )
+            else:
+                sum_heat_losses += self.__pipe_heat_loss(options, parameters, pipe)
+
+        screened = {}
+
+        for pipe, required in zip(hot_pipes, requirements):
+            classes = pipe_classes[pipe]
+            if len(classes) <= 1:
+                screened[pipe] = classes
+                continue
+
+            max_heat_per_discharge = (
+                parameters[f"{pipe}.cp"] * parameters[f"{pipe}.rho"] * parameters[f"{pipe}.dT"]
+            )
+            dominated = dominated_pipe_classes(classes)
+
+            remaining = [
+                c
+                for i, c in enumerate(classes)
+                if i not in dominated
+                and (c.maximum_discharge * max_heat_per_discharge + 2 * sum_heat_losses)
+                * (1.0 + 1e-6)
+                >= required
+            ]
+
+            if not remaining:
+                logger.warning(
+                    f"None of the pipe classes of pipe {pipe} can carry the required heat "
+                    f"of {required} W, not screening its pipe classes"
+                )
+                remaining = classes
+            elif len(remaining) < len(classes):
+                removed = ", ".join(c.name for c in classes if c not in remaining)
+                logger.info(f"Removed pipe classes {removed} of pipe {pipe}")
+
+            screened[pipe] = remaining
+
+        return screened
+
     def __pipe_heat_loss(
         self, options, parameters, p: str, u_values: Optional[Tuple[float, float]] = None
     ):
@@ -565,7 +795,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         length = parameters[f"{p}.length"]
         temperature = parameters[f"{p}.temperature"]
         temperature_ground = parameters[f"{p}.T_ground"]
-        sign_dtemp = 1 if self.is_hot_pipe(p) else -1
+        sign_dtemp = 1 if self.heat_network_component_index.is_hot_pipe(p) else -1
         dtemp = sign_dtemp * parameters[f"{p}.dT"]
 
         heat_loss = (
@@ -605,6 +835,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
 
         options = self.heat_network_options()
         components = self.heat_network_components
+        component_index = self.heat_network_component_index
 
         if options["head_loss_option"] == HeadLossOption.NO_HEADLOSS:
             # Undefined, and all constraints using this methods value should
@@ -620,10 +851,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
             head_loss = 0.0
 
             for pipe in components["pipe"]:
-                if self.is_cold_pipe(pipe):
-                    hot_pipe = self.cold_to_hot_pipe(pipe)
-                else:
-                    hot_pipe = pipe
+                hot_pipe = component_index.hot_pipe(pipe)
 
                 try:
                     pipe_classes = self.__pipe_topo_pipe_class_map[hot_pipe].keys()
@@ -985,12 +1213,10 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
             ), "non-zero minimum velocity not allowed with topology optimization"
 
         # Also ensure that the discharge has the same sign as the heat.
-        for p in self.heat_network_components["pipe"]:
+        component_index = self.heat_network_component_index
+        for p in component_index.pipes:
             # FIXME: Enable heat in cold pipes as well.
-            if self.is_cold_pipe(p):
-                hot_pipe = self.cold_to_hot_pipe(p)
-            else:
-                hot_pipe = p
+            hot_pipe = component_index.hot_pipe(p)
 
             flow_dir_var = self.__pipe_to_flow_direct_map[hot_pipe]
             flow_dir = self.state(flow_dir_var)
@@ -1052,7 +1278,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
                 continue
 
             assert (
-                len({p for p in pipes if self.is_cold_pipe(p)}) == 0
+                len({p for p in pipes if component_index.is_cold_pipe(p)}) == 0
             ), "Pipe series for Heat models should only contain hot pipes"
 
             base_flow_dir_var = self.state(self.__pipe_to_flow_direct_map[pipes[0]])
@@ -1391,10 +1617,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         )
 
     def _hn_pipe_nominal_discharge(self, heat_network_options, parameters, pipe: str) -> float:
-        if self.is_cold_pipe(pipe):
-            hot_pipe = self.cold_to_hot_pipe(pipe)
-        else:
-            hot_pipe = pipe
+        hot_pipe = self.heat_network_component_index.hot_pipe(pipe)
 
         try:
             pipe_classes = self.__pipe_topo_pipe_class_map[hot_pipe].keys()
@@ -1421,6 +1644,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         options = self.heat_network_options()
         parameters = self.parameters(ensemble_member)
         components = self.heat_network_components
+        component_index = self.heat_network_component_index
 
         # Set the head loss according to the direction in the pipes. Note that
         # the `.__head_loss` symbol is always positive by definition, but that
@@ -1437,10 +1661,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
                 # discharge and the head loss/dH.
                 continue
 
-            if self.is_cold_pipe(pipe):
-                hot_pipe = self.cold_to_hot_pipe(pipe)
-            else:
-                hot_pipe = pipe
+            hot_pipe = component_index.hot_pipe(pipe)
 
             head_loss_sym = self._hn_pipe_to_head_loss_map[pipe]
 
@@ -1559,36 +1780,60 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
 
         return constraints
 
+    def __valve_maximum_discharges(self, valves, options, parameters):
+        """
+        The maximum discharge that can go through every valve, based on the
+        largest maximum discharge of the pipes it is connected to.
+        """
+        discharge_index = self.heat_network_discharge_index
+        pipe_ids = self.heat_network_component_index.pipe_ids
+        maximum_velocity = options["maximum_velocity"]
+
+        pipe_maximum_discharges = {}
+
+        def _pipe_maximum_discharge(p):
+            try:
+                return pipe_maximum_discharges[p]
+            except KeyError:
+                pass
+
+            try:
+                pipe_classes = self.__pipe_topo_pipe_class_map[p].keys()
+                max_discharge = max(c.maximum_discharge for c in pipe_classes)
+            except KeyError:
+                max_discharge = maximum_velocity * parameters[f"{p}.area"]
+
+            pipe_maximum_discharges[p] = max_discharge
+            return max_discharge
+
+        maximum_discharges = {}
+
+        for v in valves:
+            canonical, _ = self.alias_relation.canonical_signed(f"{v}.Q")
+            connected_pipes = [c for c in discharge_index.get(canonical, ()) if c in pipe_ids]
+
+            maximum_discharges[v] = max(
+                (_pipe_maximum_discharge(p) for p in connected_pipes), default=0.0
+            )
+
+        return maximum_discharges
+
     def __check_valve_head_discharge_path_constraints(self, ensemble_member):
         constraints = []
         parameters = self.parameters(ensemble_member)
         options = self.heat_network_options()
 
-        all_pipes = set(self.heat_network_components["pipe"])
-        maximum_velocity = options["maximum_velocity"]
+        valves = self.heat_network_components.get("check_valve", [])
+        maximum_discharges = self.__valve_maximum_discharges(valves, options, parameters)
 
-        for v in self.heat_network_components.get("check_valve", []):
+        for v in valves:
             status_var = self.__check_valve_status_map[v]
             status = self.state(status_var)
 
             q = self.state(f"{v}.Q")
             dh = self.state(f"{v}.dH")
 
-            # Determine the maximum discharge that can go through the Valve
-            # by looking at connected pipes.
-            q_aliases = self.alias_relation.aliases(q.name())
-            connected_pipes = {p for p in all_pipes if f"{p}.Q" in q_aliases}
-
-            maximum_discharge = 0.0
-
-            for p in connected_pipes:
-                try:
-                    pipe_classes = self.__pipe_topo_pipe_class_map[p].keys()
-                    max_discharge_pipe = max(c.maximum_discharge for c in pipe_classes)
-                except KeyError:
-                    max_discharge_pipe = maximum_velocity * parameters[f"{p}.area"]
-
-                maximum_discharge = max(maximum_discharge, max_discharge_pipe)
+            maximum_discharge = maximum_discharges[v]
 
             maximum_head_loss = self.__maximum_total_head_loss
 
@@ -1608,31 +1853,17 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         parameters = self.parameters(ensemble_member)
         options = self.heat_network_options()
 
-        all_pipes = set(self.heat_network_components["pipe"])
-        maximum_velocity = options["maximum_velocity"]
+        valves = self.heat_network_components.get("control_valve", [])
+        maximum_discharges = self.__valve_maximum_discharges(valves, options, parameters)
 
-        for v in self.heat_network_components.get("control_valve", []):
+        for v in valves:
             flow_dir_var = self.__control_valve_direction_map[v]
             flow_dir = self.state(flow_dir_var)
 
             q = self.state(f"{v}.Q")
             dh = self.state(f"{v}.dH")
 
-            # Determine the maximum discharge that can go through the Valve
-            # by looking at connected pipes.
-            q_aliases = self.alias_relation.aliases(q.name())
-            connected_pipes = {p for p in all_pipes if f"{p}.Q" in q_aliases}
-
-            maximum_discharge = 0.0
-
-            for p in connected_pipes:
-                try:
-                    pipe_classes = self.__pipe_topo_pipe_class_map[p].keys()
-                    max_discharge_pipe = max(c.maximum_discharge for c in pipe_classes)
-                except KeyError:
-                    max_discharge_pipe = maximum_velocity * parameters[f"{p}.area"]
-
-                maximum_discharge = max(maximum_discharge, max_discharge_pipe)
+            maximum_discharge = maximum_discharges[v]
 
             maximum_head_loss = self.__maximum_total_head_loss
 
@@ -1680,8 +1911,10 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
 
             constraints.append(((cost_sym - costs_expr) / costs_constraint_nominal, 0.0, 0.0))
 
+        component_index = self.heat_network_component_index
+
         for p, heat_losses in self.__pipe_topo_heat_losses.items():
-            assert self.is_hot_pipe(p)
+            assert component_index.is_hot_pipe(p)
 
             pipe_classes = self.__pipe_topo_pipe_class_map[p]
             v = []
@@ -1701,6 +1934,8 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
     def __pipe_topology_path_constraints(self, ensemble_member):
         constraints = []
 
+        hot_to_cold = self.heat_network_component_index.hot_to_cold
+
         # Clip discharge based on pipe class
         for p, pipe_classes in self.__pipe_topo_pipe_class_map.items():
             v = []
@@ -1709,7 +1944,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
 
             # Match the indicators to the discharge symbol(s)
             discharge_sym_hot = self.state(f"{p}.Q")
-            discharge_sym_cold = self.state(f"{self.hot_to_cold_pipe(p)}.Q")
+            discharge_sym_cold = self.state(f"{hot_to_cold[p]}.Q")
 
             maximum_discharges = [c.maximum_discharge for c in pipe_classes.keys()]
 
@@ -1811,11 +2046,13 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         return options
 
     def __pipe_class_to_results(self):
+        hot_to_cold = self.heat_network_component_index.hot_to_cold
+
         for ensemble_member in range(self.ensemble_size):
             results = self.extract_results(ensemble_member)
 
             for pipe in self.hot_pipes:
-                pipe_classes = self.pipe_classes(pipe)
+                pipe_classes = self.__pipe_topo_screened_pipe_classes[pipe]
 
                 if not pipe_classes:
                     continue
@@ -1828,21 +2065,24 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
                         if round(results[s][0]) == 1.0
                     )
 
-                for p in [pipe, self.hot_to_cold_pipe(pipe)]:
+                for p in [pipe, hot_to_cold[pipe]]:
                     self.__pipe_topo_pipe_class_result[p] = pipe_class
 
     def __pipe_diameter_to_parameters(self):
+        hot_to_cold = self.heat_network_component_index.hot_to_cold
+
         for ensemble_member in range(self.ensemble_size):
             d = self.__pipe_topo_diameter_area_parameters[ensemble_member]
             for pipe in self.__pipe_topo_pipe_class_map:
                 pipe_class = self.get_optimized_pipe_class(pipe)
 
-                for p in [pipe, self.hot_to_cold_pipe(pipe)]:
+                for p in [pipe, hot_to_cold[pipe]]:
                     d[f"{p}.diameter"] = pipe_class.inner_diameter
                     d[f"{p}.area"] = pipe_class.area
 
     def __pipe_heat_loss_to_parameters(self):
         options = self.heat_network_options()
+        hot_to_cold = self.heat_network_component_index.hot_to_cold
 
         for ensemble_member in range(self.ensemble_size):
             parameters = self.parameters(ensemble_member)
@@ -1851,7 +2091,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
             for pipe in self.__pipe_topo_heat_losses:
                 pipe_class = self.get_optimized_pipe_class(pipe)
 
-                cold_pipe = self.hot_to_cold_pipe(pipe)
+                cold_pipe = hot_to_cold[pipe]
 
                 for p in [pipe, cold_pipe]:
                     h[f"{p}.Heat_loss"] = self.__pipe_heat_loss(
@@ -1886,6 +2126,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
         results = self.extract_results()
         parameters = self.parameters(0)
         options = self.heat_network_options()
+        component_index = self.heat_network_component_index
 
         # The flow directions are the same as the heat directions if the
         # return (i.e. cold) line has zero heat throughout. Here we check that
@@ -1905,10 +2146,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
                 else:
                     q = results[f"{p}.Q"]
 
-                    if self.is_cold_pipe(p):
-                        hot_pipe = self.cold_to_hot_pipe(p)
-                    else:
-                        hot_pipe = p
+                    hot_pipe = component_index.hot_pipe(p)
 
                     try:
                         is_disconnected = np.round(results[self.__pipe_disconnect_map[hot_pipe]])
@@ -1923,10 +2161,7 @@ class HeatMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOpti
 
         minimum_velocity = options["minimum_velocity"]
         for p in self.heat_network_components["pipe"]:
-            if self.is_cold_pipe(p):
-                hot_pipe = self.cold_to_hot_pipe(p)
-            else:
-                hot_pipe = p
+            hot_pipe = component_index.hot_pipe(p)
             area = parameters[f"{p}.area"]
 
             if area == 0.0:
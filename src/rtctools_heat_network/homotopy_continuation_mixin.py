@@ -0,0 +1,359 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import casadi as ca
+
+import numpy as np
+
+from rtctools.optimization.homotopy_mixin import HomotopyMixin
+from rtctools.optimization.optimization_problem import OptimizationProblem
+from rtctools.optimization.timeseries import Timeseries
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+@dataclass(frozen=True)
+class HomotopyStep:
+    theta: float
+    delta_theta: float
+    success: bool
+    iterations: int
+
+
+@dataclass(frozen=True)
+class _SolverPoint:
+    x: np.ndarray
+    lam_x: np.ndarray
+    lam_g: np.ndarray
+
+
+class _ContinuationState:
+    """
+    Book keeping of the solves within a homotopy step. Solutions are keyed
+    on the priority (if goal programming is used) and the dimensions of the
+    NLP, such that they are only used to warm start the same problem at the
+    next value of theta.
+    """
+
+    def __init__(self):
+        self.priority = None
+        self.iterations = 0
+        self.solves = 0
+        self.previous: Dict[Tuple, _SolverPoint] = {}
+        self.current: Dict[Tuple, _SolverPoint] = {}
+
+
+class _ContinuationSolver:
+    """
+    Wraps the solver returned by the CasADi solver constructor, to pass the
+    primal and dual values of a previous homotopy step as initial point, and
+    to keep track of the number of iterations.
+    """
+
+    def __init__(self, solver, state: _ContinuationState, key: Tuple, warm_start: _SolverPoint):
+        self._solver = solver
+        self._state = state
+        self._key = key
+        self._warm_start = warm_start
+
+    def __call__(self, **kwargs):
+        if self._warm_start is not None:
+            kwargs["x0"] = self._warm_start.x
+            kwargs["lam_x0"] = self._warm_start.lam_x
+            kwargs["lam_g0"] = self._warm_start.lam_g
+
+        results = self._solver(**kwargs)
+
+        stats = self._solver.stats()
+        self._state.iterations += stats.get("iter_count", 0)
+        self._state.solves += 1
+
+        if stats.get("success", False):
+            self._state.current[self._key] = _SolverPoint(
+                np.array(results["x"]).ravel(),
+                np.array(results["lam_x"]).ravel(),
+                np.array(results["lam_g"]).ravel(),
+            )
+
+        return results
+
+    def stats(self):
+        return self._solver.stats()
+
+
+class HomotopyContinuationMixin(OptimizationProblem):
+    """
+    Replacement of :py:class:`HomotopyMixin` with adaptive step size control
+    of the homotopy parameter, and warm starts between homotopy steps. It
+    takes the place of :py:class:`HomotopyMixin` in the list of base classes
+    of the optimization problem, and cannot be combined with it.
+
+    After every successful step, the step size is scaled with the ratio of
+    the target number of solver iterations and the average number of
+    iterations of the solves in this step. Steps that converge quickly thus lead to larger
+    steps, and vice versa. Failed steps are retried with half the step size,
+    like in :py:class:`HomotopyMixin`.
+
+    When IPOPT is used, every NLP that is solved at a value of theta is
+    warm started with the primal and dual solution of the same NLP at the
+    previous value of theta. Because the homotopy parameter is a dynamic
+    parameter for theta > 0, the transcription cache, and thereby the
+    sparsity structure of the collocated model, is reused for all steps.
+
+    Like with :py:class:`HomotopyMixin`, the value of theta is set as the
+    homotopy parameter in :py:meth:`parameters`, and the first solve of a
+    step is seeded with the results of the previous step.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if isinstance(self, HomotopyMixin):
+            raise Exception(
+                "HomotopyContinuationMixin replaces HomotopyMixin, the class cannot inherit "
+                "from both"
+            )
+
+        self.__theta: Optional[float] = None
+        self.__results: List[Dict] = []
+
+        super().__init__(*args, **kwargs)
+
+        self.__state = _ContinuationState()
+        self.__homotopy_steps = []
+        self.__warm_start_allowed = False
+
+    def seed(self, ensemble_member):
+        seed = super().seed(ensemble_member)
+        options = self.homotopy_options()
+
+        # Like HomotopyMixin, only the first solve of the goal programming
+        # loop is seeded with the results of the previous step.
+        if (
+            self.__theta is not None
+            and self.__theta > options["theta_start"]
+            and getattr(self, "_gp_first_run", True)
+        ):
+            for key, result in self.__results[ensemble_member].items():
+                times = self.times(key)
+                if (result.ndim == 1 and len(result) == len(times)) or (
+                    result.ndim == 2 and result.shape[0] == len(times)
+                ):
+                    seed[key] = Timeseries(times, result)
+                elif (result.ndim == 1 and len(result) == 1) or (
+                    result.ndim == 2 and result.shape[0] == 1
+                ):
+                    seed[key] = result
+
+        return seed
+
+    def parameters(self, ensemble_member):
+        parameters = super().parameters(ensemble_member)
+
+        # Theta is only set within the optimization loop, to avoid accidental
+        # use of its value in e.g. pre().
+        if self.__theta is not None:
+            parameters[self.homotopy_options()["homotopy_parameter"]] = self.__theta
+
+        return parameters
+
+    def dynamic_parameters(self):
+        dynamic_parameters = super().dynamic_parameters()
+
+        if self.__theta is not None and self.__theta > 0:
+            # For theta = 0, the homotopy parameter is not dynamic, so that
+            # the correct sparsity structure is obtained for the linear model.
+            options = self.homotopy_options()
+            dynamic_parameters.append(self.variable(options["homotopy_parameter"]))
+
+        return dynamic_parameters
+
+    def homotopy_options(self) -> Dict[str, object]:
+        """
+        Returns a dictionary of options controlling the homotopy process. On
+        top of the options of :py:class:`HomotopyMixin`, with the same default
+        values, the following options are available:
+
+        +------------------------+------------+---------------+
+        | Option                 | Type       | Default value |
+        +========================+============+===============+
+        | ``target_iterations``  | ``int``    | ``20``        |
+        +------------------------+------------+---------------+
+        | ``delta_theta_max``    | ``float``  | ``1.0``       |
+        +------------------------+------------+---------------+
+        | ``warm_start``         | ``bool``   | ``True``      |
+        +------------------------+------------+---------------+
+
+        The step size of theta is adapted to make every solve take
+        approximately ``target_iterations`` solver iterations, but will never
+        exceed ``delta_theta_max`` or fall below ``delta_theta_min``. The
+        step size is changed by at most a factor of two per step.
+
+        The ``warm_start`` option controls whether solutions at the previous
+        value of theta are used as the initial primal and dual values of the
+        solver. The step from theta = 0 is only seeded with the primal
+        solution, like in :py:class:`HomotopyMixin`, as the multipliers of
+        the linear problem at theta = 0 are typically a poor estimate.
+
+        :returns: A dictionary of homotopy options.
+        """
+
+        options = {}
+        options["theta_start"] = 0.0
+        options["delta_theta_0"] = 1.0
+        options["delta_theta_min"] = 0.01
+        options["homotopy_parameter"] = "theta"
+        options["target_iterations"] = 20
+        options["delta_theta_max"] = 1.0
+        options["warm_start"] = True
+        return options
+
+    @property
+    def homotopy_steps(self) -> List[HomotopyStep]:
+        """
+        The homotopy steps of the last call to :py:meth:`optimize`.
+        """
+        return self.__homotopy_steps
+
+    def priority_started(self, priority):
+        super().priority_started(priority)
+        self.__state.priority = priority
+
+    def solver_options(self):
+        options = super().solver_options()
+
+        if options["solver"] != "ipopt":
+            return options
+
+        casadi_solver = options["casadi_solver"]
+        if isinstance(casadi_solver, str):
+            casadi_solver = getattr(ca, casadi_solver)
+
+        state = self.__state
+        warm_start_allowed = self.homotopy_options()["warm_start"] and self.__warm_start_allowed
+
+        def _continuation_solver(name, solver, nlp, nlpsol_options):
+            key = (state.priority, nlp["x"].size1(), nlp["g"].size1())
+
+            warm_start = state.previous.get(key) if warm_start_allowed else None
+
+            if warm_start is not None:
+                ipopt_options = nlpsol_options.get("ipopt", {}).copy()
+                ipopt_options["warm_start_init_point"] = "yes"
+                ipopt_options["warm_start_bound_push"] = 1e-5
+                ipopt_options["warm_start_slack_bound_push"] = 1e-5
+                ipopt_options["warm_start_mult_bound_push"] = 1e-5
+                ipopt_options["mu_init"] = 1e-3
+                # Starting close to the bounds makes it more likely that the
+                # solution violates them slightly, which can lead to
+                # inconsistent goal programming constraints.
+                ipopt_options["honor_original_bounds"] = "yes"
+                nlpsol_options = {**nlpsol_options, "ipopt": ipopt_options}
+
+            return _ContinuationSolver(
+                casadi_solver(name, solver, nlp, nlpsol_options), state, key, warm_start
+            )
+
+        options["casadi_solver"] = _continuation_solver
+
+        return options
+
+    def optimize(self, preprocessing=True, postprocessing=True, log_solver_failure_as_error=True):
+        # Pre-processing
+        if preprocessing:
+            self.pre()
+
+        options = self.homotopy_options()
+        theta_start = options["theta_start"]
+        delta_theta = options["delta_theta_0"]
+
+        self.__state = state = _ContinuationState()
+        self.__homotopy_steps = []
+        self.__warm_start_allowed = False
+
+        theta = self.__theta = theta_start
+        previous_theta: Optional[float] = None
+
+        while True:
+            logger.info(f"Solving with homotopy parameter theta = {theta}.")
+
+            state.iterations = 0
+            state.solves = 0
+            state.current = {}
+
+            success = super().optimize(
+                preprocessing=False, postprocessing=False, log_solver_failure_as_error=False
+            )
+
+            self.__homotopy_steps.append(
+                HomotopyStep(
+                    theta,
+                    theta - previous_theta if previous_theta is not None else 0.0,
+                    success,
+                    state.iterations,
+                )
+            )
+
+            if success:
+                logger.info(f"Homotopy step to theta = {theta} took {state.iterations} iterations.")
+
+                self.__results = [
+                    self.extract_results(ensemble_member)
+                    for ensemble_member in range(self.ensemble_size)
+                ]
+
+                state.previous = state.current
+
+                if theta >= 1.0:
+                    break
+
+                if theta == 0.0:
+                    self.check_collocation_linearity = False
+                    self.linear_collocation = False
+
+                    # Recompute the sparsity structure for the nonlinear model family.
+                    self.clear_transcription_cache()
+                elif previous_theta is not None:
+                    # Adapt the step size based on the number of iterations
+                    mean_iterations = state.iterations / max(state.solves, 1)
+                    factor = options["target_iterations"] / max(mean_iterations, 1)
+                    delta_theta *= min(max(factor, 0.5), 2.0)
+                    delta_theta = max(delta_theta, options["delta_theta_min"])
+
+                delta_theta = min(delta_theta, options["delta_theta_max"])
+
+                self.__warm_start_allowed = theta > 0.0
+                previous_theta = theta
+            else:
+                if previous_theta is None:
+                    break
+
+                delta_theta /= 2
+
+                if delta_theta < options["delta_theta_min"]:
+                    failure_message = (
+                        "Solver failed with homotopy parameter theta = {}. Theta cannot "
+                        "be decreased further, as that would violate the minimum delta "
+                        "theta of {}.".format(previous_theta, options["delta_theta_min"])
+                    )
+                    if log_solver_failure_as_error:
+                        logger.error(failure_message)
+                    else:
+                        # In this case we expect some higher level process to deal
+                        # with the solver failure, so we only log it as info here.
+                        logger.info(failure_message)
+
+                    # Post-processing should see the theta of the last
+                    # successful step, like with HomotopyMixin.
+                    self.__theta = previous_theta
+                    break
+
+            theta = min(previous_theta + delta_theta, 1.0)
+            if 1.0 - theta < 1e-12:
+                theta = 1.0
+            self.__theta = theta
+
+        # Post-processing
+        if postprocessing:
+            self.post()
+
+        return success
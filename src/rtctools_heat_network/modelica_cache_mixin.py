@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import casadi as ca
+
+import pymoca
+import pymoca.backends.casadi.api
+
+from rtctools.optimization.optimization_problem import OptimizationProblem
+
+from . import __version__
+from ._cache_directory import default_cache_directory, is_private, private_directory
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+# Bump when the layout of the cache directory changes
+_CACHE_FORMAT_VERSION = 1
+
+
+def _modelica_files(folder: Path) -> List[Path]:
+    """
+    All Modelica files in a folder and its subfolders, in the same way pymoca
+    looks them up, sorted for a deterministic order.
+    """
+    files = []
+    for root, _, names in os.walk(folder, followlinks=True):
+        files.extend(Path(root) / n for n in names if n.endswith(".mo"))
+    return sorted(files)
+
+
+def _model_key(model_folder: Path, model_name: str, compiler_options: Dict) -> str:
+    """
+    Hash of everything that determines the compiled model: the versions of
+    the libraries involved, the compiler options and the contents of the
+    Modelica files of the model and the Modelica libraries.
+    """
+    h = hashlib.sha1()
+
+    options = {k: v for k, v in compiler_options.items() if k != "library_folders"}
+    for item in [
+        _CACHE_FORMAT_VERSION,
+        __version__,
+        pymoca.__version__,
+        ca.__version__,
+        model_name,
+        sorted(options.items()),
+    ]:
+        h.update(repr(item).encode())
+
+    for folder in [model_folder, *map(Path, compiler_options["library_folders"])]:
+        for f in _modelica_files(folder):
+            h.update(str(f.relative_to(folder)).encode())
+            h.update(f.read_bytes())
+
+    return h.hexdigest()
+
+
+class ModelicaCacheMixin(OptimizationProblem):
+    """
+    Keeps the models compiled by :py:class:`ModelicaMixin` in a cache
+    directory, keyed on the contents of the model and the Modelica libraries
+    (e.g. the bundled WarmingUp library), and the versions of the libraries
+    involved.
+
+    Contrary to the cache of pymoca, which is stored next to the model and
+    invalidated based on modification times, the cache is reused across
+    checkouts, installations and processes, and a model is never loaded from
+    a cache that is out of date. Models are compiled in a temporary folder
+    and moved into place when done, so that processes that start at the same
+    time, e.g. in a parameter sweep, never see a partially written cache.
+
+    As pymoca unpickles the cached models, models are only cached in, and
+    loaded from, folders that are owned by the current user and cannot be
+    written by other users.
+
+    This mixin has to come before :py:class:`ModelicaMixin` in the list of
+    base classes of the optimization problem.
+    """
+
+    def __init__(self, *args, **kwargs):
+        options = self.modelica_cache_options()
+
+        self.__cached = False
+
+        if options["enabled"] and self.compiler_options().get("cache", False):
+            if "model_name" in kwargs:
+                model_name = kwargs["model_name"]
+            else:
+                model_name = getattr(self, "model_name", self.__class__.__name__)
+
+            folder = self.__cached_model_folder(Path(kwargs["model_folder"]), model_name, options)
+            if folder is not None:
+                kwargs["model_folder"] = str(folder)
+                self.__cached = True
+
+        super().__init__(*args, **kwargs)
+
+    def modelica_cache_options(self):
+        r"""
+        Returns a dictionary of options controlling the cache of compiled
+        Modelica models.
+
+        +------------------+----------+---------------+
+        | Option           | Type     | Default value |
+        +==================+==========+===============+
+        | ``enabled``      | ``bool`` | ``True``      |
+        +------------------+----------+---------------+
+        | ``directory``    | ``str``  | ``None``      |
+        +------------------+----------+---------------+
+
+        The compiled models are kept in ``directory``, which defaults to a
+        folder in the cache directory of the user (``$XDG_CACHE_HOME`` or
+        ``~/.cache``). When the cache is disabled, when the ``cache`` compiler
+        option is False, or when the directory can be written by other users,
+        the model is compiled like :py:class:`ModelicaMixin` does.
+
+        :returns: A dictionary of Modelica cache options.
+        """
+
+        options = {}
+
+        options["enabled"] = True
+        options["directory"] = None
+
+        return options
+
+    def compiler_options(self):
+        options = super().compiler_options()
+
+        if self.__cached:
+            # The cached model is keyed on the contents of the Modelica
+            # files, so there is no need to compare their modification times.
+            # Pymoca would otherwise recompile the cached model in place when
+            # e.g. the library is reinstalled with the same contents.
+            options["mtime_check"] = False
+
+        return options
+
+    def __cached_model_folder(self, model_folder: Path, model_name: str, options) -> Optional[Path]:
+        """
+        The folder of the cached model, compiling it first if needed, or None
+        if the cache directory cannot be trusted.
+        """
+        compiler_options = {**self.compiler_options(), "mtime_check": False}
+
+        root = Path(options["directory"] or default_cache_directory("models"))
+
+        try:
+            trusted = private_directory(root)
+        except OSError as e:
+            logger.warning(f"Cannot create folder for compiled models: {e}")
+            return None
+
+        if not trusted:
+            logger.warning(
+                f"Not caching model {model_name}, as '{root}' is not owned by the current "
+                f"user or writable by others"
+            )
+            return None
+
+        folder = root / f"{model_name}_{_model_key(model_folder, model_name, compiler_options)}"
+        cache_file = folder / f"{model_name}.pymoca_cache"
+
+        if os.path.lexists(cache_file):
+            if is_private(folder) and is_private(cache_file):
+                logger.debug(f"Loading model {model_name} from '{folder}'")
+                return folder
+
+            logger.warning(
+                f"Not loading model {model_name} from '{folder}', as it is not owned by "
+                f"the current user or writable by others"
+            )
+            return None
+
+        logger.info(f"Compiling model {model_name} to '{folder}'")
+
+        build_folder = Path(tempfile.mkdtemp(prefix=f".{model_name}_", dir=root))
+
+        try:
+            # Copy the Modelica files of the model, such that the cached
+            # model can still be compiled from its folder if loading fails.
+            for f in _modelica_files(model_folder):
+                target = build_folder / f.relative_to(model_folder)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(f, target)
+
+            pymoca.backends.casadi.api.transfer_model(
+                str(build_folder), model_name, compiler_options
+            )
+
+            try:
+                os.rename(build_folder, folder)
+            except OSError:
+                # Another process compiled the same model in the meantime
+                pass
+        finally:
+            shutil.rmtree(build_folder, ignore_errors=True)
+
+        return folder
@@ -1,10 +1,50 @@
-from typing import Dict
+from typing import Dict, List, Tuple
 
-from pymoca.backends.casadi.alias_relation import AliasRelation
+import numpy as np
 
 from .base_component_type_mixin import BaseComponentTypeMixin
 from .heat_network_common import NodeConnectionDirection
-from .topology import Topology
+from .topology import NodePipeAdjacency, Topology
+
+
+class _PipeSeriesUnionFind:
+    """
+    Union-find over pipe indices, where every pipe stores its orientation
+    relative to the root of its series.
+    """
+
+    def __init__(self, n: int):
+        self._parent: List[int] = list(range(n))
+        self._sign: List[int] = [1] * n
+
+    def find(self, i: int) -> Tuple[int, int]:
+        sign = 1
+        path = []
+        while self._parent[i] != i:
+            path.append(i)
+            sign *= self._sign[i]
+            i = self._parent[i]
+
+        # Path compression
+        rel = sign
+        for j in path:
+            s = self._sign[j]
+            self._parent[j] = i
+            self._sign[j] = rel
+            rel *= s
+
+        return i, sign
+
+    def union(self, a: int, b: int, sign: int):
+        """
+        Put pipes `a` and `b` in the same series, where the orientation of `a`
+        is `sign` times that of `b`.
+        """
+        root_a, sign_a = self.find(a)
+        root_b, sign_b = self.find(b)
+        if root_a != root_b:
+            self._parent[root_b] = root_a
+            self._sign[root_b] = sign_a * sign * sign_b
 
 
 class ModelicaComponentTypeMixin(BaseComponentTypeMixin):
@@ -13,11 +53,11 @@ class ModelicaComponentTypeMixin(BaseComponentTypeMixin):
         nodes = components.get("node", [])
         pipes = components["pipe"]
         buffers = components.get("buffer", [])
+        component_index = self.heat_network_component_index
 
         # Figure out which pipes are connected to which nodes, which pipes
         # are connected in series, and which pipes are connected to which buffers.
 
-        pipes_set = set(pipes)
         parameters = [self.parameters(e) for e in range(self.ensemble_size)]
         node_connections = {}
 
@@ -28,6 +68,35 @@ class ModelicaComponentTypeMixin(BaseComponentTypeMixin):
         except KeyError:
             heat_network_model_type = "QTH"
 
+        # Note that we do this based on temperature, because discharge may
+        # be an alias of yet some other further away connected pipe.
+        prop = "T" if heat_network_model_type == "QTH" else "Heat"
+
+        # Map the in/out port variables of all pipes to the pipe's index and
+        # its orientation as seen from whatever is connected to the port.
+        pipe_ports = {}
+        for i, p in enumerate(pipes):
+            pipe_ports[f"{p}.{heat_network_model_type}In.{prop}"] = (i, NodeConnectionDirection.OUT)
+            pipe_ports[f"{p}.{heat_network_model_type}Out.{prop}"] = (i, NodeConnectionDirection.IN)
+
+        def _connected_pipe(port):
+            connected = [
+                pipe_ports[x]
+                for x in self.alias_relation.aliases(f"{port}.{prop}")
+                if x in pipe_ports
+            ]
+
+            if len(connected) > 1:
+                raise Exception(f"More than one connection to {port}")
+            elif len(connected) == 0:
+                raise Exception(f"Found no connection to {port}")
+
+            return connected[0]
+
+        indptr = [0]
+        indices = []
+        orientations = []
+
         for n in nodes:
             n_connections = [ens_params[f"{n}.n"] for ens_params in parameters]
 
@@ -38,42 +107,26 @@ class ModelicaComponentTypeMixin(BaseComponentTypeMixin):
 
             n_connections = n_connections[0]
 
-            # Note that we do this based on temperature, because discharge may
-            # be an alias of yet some other further away connected pipe.
             node_connections[n] = connected_pipes = {}
 
             for i in range(n_connections):
-                cur_port = f"{n}.{heat_network_model_type}Conn[{i + 1}]"
-                prop = "T" if heat_network_model_type == "QTH" else "Heat"
-                aliases = [
-                    x
-                    for x in self.alias_relation.aliases(f"{cur_port}.{prop}")
-                    if not x.startswith(n) and x.endswith(f".{prop}")
-                ]
-
-                if len(aliases) > 1:
-                    raise Exception(f"More than one connection to {cur_port}")
-                elif len(aliases) == 0:
-                    raise Exception(f"Found no connection to {cur_port}")
-
-                in_suffix = ".QTHIn.T" if heat_network_model_type == "QTH" else ".HeatIn.Heat"
-                out_suffix = ".QTHOut.T" if heat_network_model_type == "QTH" else ".HeatOut.Heat"
-
-                if aliases[0].endswith(out_suffix):
-                    pipe_w_orientation = (
-                        aliases[0][: -len(out_suffix)],
-                        NodeConnectionDirection.IN,
-                    )
-                else:
-                    assert aliases[0].endswith(in_suffix)
-                    pipe_w_orientation = (
-                        aliases[0][: -len(in_suffix)],
-                        NodeConnectionDirection.OUT,
-                    )
+                pipe_index, orientation = _connected_pipe(
+                    f"{n}.{heat_network_model_type}Conn[{i + 1}]"
+                )
+
+                connected_pipes[i] = (pipes[pipe_index], orientation)
+                indices.append(pipe_index)
+                orientations.append(orientation)
 
-                assert pipe_w_orientation[0] in pipes_set
+            indptr.append(len(indices))
 
-                connected_pipes[i] = pipe_w_orientation
+        adjacency = NodePipeAdjacency(
+            tuple(nodes),
+            tuple(pipes),
+            np.array(indptr, dtype=int),
+            np.array(indices, dtype=int),
+            np.array(orientations, dtype=int),
+        )
 
         # Note that a pipe series can include both hot and cold pipes for
         # QTH models. It is only about figuring out which pipes are
@@ -81,52 +134,38 @@ class ModelicaComponentTypeMixin(BaseComponentTypeMixin):
         # For Heat models, only hot pipes are allowed to be part of pipe
         # series, as the cold part is zero heat by construction.
         if heat_network_model_type == "QTH":
-            alias_relation = self.alias_relation
+            canonical_pipe_qs = [self.alias_relation.canonical_signed(f"{p}.Q") for p in pipes]
         elif heat_network_model_type == "Heat":
-            # There is no proper AliasRelation yet (because there is heat loss in pipes).
-            # So we build one, as that is the easiest way to figure out which pipes are
-            # connected to each other in series. We do this by making a temporary/shadow
-            # discharge (".Q") variable per pipe, as that way we can share the processing
-            # logic for determining pipe series with that of QTH models.
-            alias_relation = AliasRelation()
-
-            # Look for aliases only in the hot pipes. All cold pipes are zero by convention anyway.
-            hot_pipes = self.hot_pipes.copy()
-
-            pipes_map = {f"{pipe}.HeatIn.Heat": pipe for pipe in hot_pipes}
-            pipes_map.update({f"{pipe}.HeatOut.Heat": pipe for pipe in hot_pipes})
-
-            for p in hot_pipes:
-                for port in ["In", "Out"]:
-                    heat_port = f"{p}.Heat{port}.Heat"
-                    connected = self.alias_relation.aliases(heat_port).intersection(
-                        pipes_map.keys()
-                    )
-                    connected.remove(heat_port)
-
-                    if connected:
-                        other_pipe_port = next(iter(connected))
-                        if other_pipe_port.endswith(f".Heat{port}.Heat"):
-                            sign_prefix = "-"
-                        else:
-                            sign_prefix = ""
-                        other_pipe = pipes_map[other_pipe_port]
-                        if f"{other_pipe}.Q" not in alias_relation.canonical_variables:
-                            alias_relation.add(f"{p}.Q", f"{sign_prefix}{other_pipe}.Q")
-
-        canonical_pipe_qs = {p: alias_relation.canonical_signed(f"{p}.Q") for p in pipes}
-        # Move sign from canonical to alias
-        canonical_pipe_qs = {(p, d): c for p, (c, d) in canonical_pipe_qs.items()}
-        # Reverse the dictionary from `Dict[alias, canonical]` to `Dict[canonical, Set[alias]]`
+            # There is no proper AliasRelation for the discharge (because
+            # there is heat loss in pipes). We therefore union the hot pipes
+            # that have their heat ports directly connected to each other.
+            # All cold pipes are zero by convention anyway.
+            series = _PipeSeriesUnionFind(len(pipes))
+
+            hot_pipe_ports = {k: v for k, v in pipe_ports.items() if component_index.is_hot[v[0]]}
+
+            for port, (pipe_index, orientation) in hot_pipe_ports.items():
+                for x in self.alias_relation.aliases(port):
+                    if x != port and x in hot_pipe_ports:
+                        other_index, other_orientation = hot_pipe_ports[x]
+                        # Two pipes connected with their in (or out) ports
+                        # have an opposite orientation.
+                        series.union(
+                            pipe_index, other_index, -1 if orientation == other_orientation else 1
+                        )
+                        break
+
+            canonical_pipe_qs = [series.find(i) for i in range(len(pipes))]
+
+        # Group the pipes by their canonical discharge, where pipes with
+        # opposite orientations end up in a different group.
         pipe_sets = {}
-        for a, c in canonical_pipe_qs.items():
-            pipe_sets.setdefault(c, []).append(a)
-
-        pipe_series_with_orientation = list(pipe_sets.values())
+        for p, (c, d) in zip(pipes, canonical_pipe_qs):
+            pipe_sets.setdefault(c, []).append((p, d))
 
         # Check that all pipes in the series have the same orientation
         pipe_series = []
-        for ps in pipe_series_with_orientation:
+        for ps in pipe_sets.values():
             if not len({orientation for _, orientation in ps}) == 1:
                 raise Exception(f"Pipes in series {ps} do not all have the same orientation")
             pipe_series.append([name for name, _ in ps])
@@ -137,46 +176,19 @@ class ModelicaComponentTypeMixin(BaseComponentTypeMixin):
             buffer_connections[b] = []
 
             for k in ["In", "Out"]:
-                b_conn = f"{b}.{heat_network_model_type}{k}"
-                prop = "T" if heat_network_model_type == "QTH" else "Heat"
-                aliases = [
-                    x
-                    for x in self.alias_relation.aliases(f"{b_conn}.{prop}")
-                    if not x.startswith(b) and x.endswith(f".{prop}")
-                ]
-
-                if len(aliases) > 1:
-                    raise Exception(f"More than one connection to {b_conn}")
-                elif len(aliases) == 0:
-                    raise Exception(f"Found no connection to {b_conn}")
-
-                in_suffix = ".QTHIn.T" if heat_network_model_type == "QTH" else ".HeatIn.Heat"
-                out_suffix = ".QTHOut.T" if heat_network_model_type == "QTH" else ".HeatOut.Heat"
-
-                if aliases[0].endswith(out_suffix):
-                    pipe_w_orientation = (
-                        aliases[0][: -len(out_suffix)],
-                        NodeConnectionDirection.IN,
-                    )
-                else:
-                    assert aliases[0].endswith(in_suffix)
-                    pipe_w_orientation = (
-                        aliases[0][: -len(in_suffix)],
-                        NodeConnectionDirection.OUT,
-                    )
-
-                assert pipe_w_orientation[0] in pipes_set
+                pipe_index, orientation = _connected_pipe(f"{b}.{heat_network_model_type}{k}")
+                pipe_w_orientation = (pipes[pipe_index], orientation)
 
                 if k == "In":
-                    assert self.is_hot_pipe(pipe_w_orientation[0])
+                    assert component_index.is_hot[pipe_index]
                 else:
-                    assert self.is_cold_pipe(pipe_w_orientation[0])
+                    assert component_index.is_cold[pipe_index]
 
                 buffer_connections[b].append(pipe_w_orientation)
 
             buffer_connections[b] = tuple(buffer_connections[b])
 
-        self.__topology = Topology(node_connections, pipe_series, buffer_connections)
+        self.__topology = Topology(node_connections, pipe_series, buffer_connections, adjacency)
 
         super().pre()
 
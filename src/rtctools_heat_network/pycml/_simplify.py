@@ -0,0 +1,415 @@
+import itertools
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+import casadi as ca
+
+import numpy as np
+
+from pymoca.backends.casadi._options import _merge_default_options
+from pymoca.backends.casadi.model import Model as _Model, _DefaultValue
+
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+SUBSTITUTE_LOOP_LIMIT = 100
+CASADI_COMPARISON_DEPTH = 2**63 - 1
+
+_METADATA_ATTRIBUTES = ["value", "min", "max", "start", "fixed", "nominal"]
+
+# The options that are handled by `simplify`. Any other option that is
+# different from the pymoca default requires the generic pymoca simplification.
+_SUPPORTED_OPTIONS = {
+    "resolve_parameter_values",
+    "replace_parameter_expressions",
+    "detect_aliases",
+    "allow_derivative_aliases",
+}
+
+# Options that do not affect simplification
+_COMPILER_OPTIONS = {
+    "library_folders",
+    "verbose",
+    "check_balanced",
+    "mtime_check",
+    "cache",
+    "codegen",
+    "unroll_loops",
+    "inline_functions",
+}
+
+
+class _UnionFind:
+    """
+    Union-find over (signed) variable names, where every variable is stored
+    relative to the root of its set as `variable = sign * root`.
+    """
+
+    def __init__(self):
+        self._parent = {}
+
+    def find(self, name: str) -> Tuple[str, int]:
+        path = []
+        sign = 1
+        while name in self._parent:
+            path.append(name)
+            name, s = self._parent[name]
+            sign *= s
+
+        # Path compression
+        root = name
+        rel = sign
+        for x in path:
+            _, s = self._parent[x]
+            self._parent[x] = (root, rel)
+            rel *= s
+
+        return root, sign
+
+    def union(self, a: str, b: str, sign: int = 1) -> bool:
+        """
+        Merge the sets of `a` and `b`, where `a = sign * b`. The root of `a`
+        becomes the root of the merged set. Returns False if the variables
+        already were in the same set.
+        """
+        root_a, sign_a = self.find(a)
+        root_b, sign_b = self.find(b)
+        if root_a == root_b:
+            return False
+
+        # a = sign_a * root_a, b = sign_b * root_b and a = sign * b
+        self._parent[root_b] = (root_a, sign_a * sign * sign_b)
+        return True
+
+    def groups(self, names: Iterable[str]) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Aliases per root, in the order of `names`.
+        """
+        groups = OrderedDict()
+        for name in names:
+            if name in self._parent:
+                root, sign = self.find(name)
+                groups.setdefault(root, []).append((name, sign))
+        return groups
+
+
+def _is_supported(model: _Model, options: dict) -> bool:
+    default_options = _merge_default_options(None)
+
+    for k, v in options.items():
+        if k in _SUPPORTED_OPTIONS or k in _COMPILER_OPTIONS:
+            continue
+        if default_options.get(k) != v:
+            return False
+
+    if model.constants or model.delay_states or model.delay_arguments:
+        return False
+
+    for p in model.parameters:
+        if isinstance(p.value, (list, np.ndarray)):
+            return False
+
+    return True
+
+
+def _substitute_metadata(model, symbols, values):
+    substitutions = []
+    for variable in itertools.chain(model.states, model.alg_states, model.inputs, model.parameters):
+        for attribute in _METADATA_ATTRIBUTES:
+            value = getattr(variable, attribute)
+            if isinstance(value, ca.MX) and not value.is_constant():
+                substitutions.append((value, variable, attribute))
+
+    if len(substitutions) == 0:
+        return
+
+    expressions, variables, attributes = zip(*substitutions)
+    expressions = ca.substitute(expressions, symbols, values)
+
+    for variable, attribute, value in zip(variables, attributes, expressions):
+        if variable.python_type in {int, float}:
+            if isinstance(value, ca.MX) and value.is_constant() and value.shape == (1, 1):
+                if attribute in {"value", "start", "min", "max", "nominal"}:
+                    # Inf is common/the default for min/max. Because
+                    # integers cannot represent this value, we cast them
+                    # to floats instead.
+                    if value.is_regular():
+                        value = variable.python_type(float(value))
+                    else:
+                        value = float(value)
+
+        setattr(variable, attribute, value)
+
+
+def _resolve_parameter_values(model):
+    current_parameters = list(model.parameters)
+
+    for _ in range(SUBSTITUTE_LOOP_LIMIT):
+        symbols, values = [], []
+        next_parameters = []
+
+        for p in current_parameters:
+            value = ca.MX(p.value)
+            if value.is_constant() and value.is_regular():
+                symbols.append(p.symbol)
+                values.append(value)
+            else:
+                next_parameters.append(p)
+
+        if not values:
+            break
+
+        _substitute_metadata(model, symbols, values)
+
+        current_parameters = next_parameters
+
+
+def _replace_parameter_expressions(model):
+    simple_parameters, symbols, values = [], [], []
+    for p in model.parameters:
+        value = ca.MX(p.value)
+        if value.is_constant():
+            simple_parameters.append(p)
+        else:
+            symbols.append(p.symbol)
+            values.append(value)
+
+    model.parameters = simple_parameters
+
+    if len(values) == 0:
+        return
+
+    # Resolve expressions that include other, non-simple parameter expressions
+    for _ in range(SUBSTITUTE_LOOP_LIMIT):
+        new_values = ca.substitute(values, symbols, values)
+        converged = ca.is_equal(ca.veccat(*values), ca.veccat(*new_values), CASADI_COMPARISON_DEPTH)
+        values = new_values
+        if converged:
+            break
+    else:
+        logger.warning("Substitution of expressions exceeded maximum iteration limit.")
+
+    if len(model.equations) > 0:
+        model.equations = ca.substitute(model.equations, symbols, values)
+    if len(model.initial_equations) > 0:
+        model.initial_equations = ca.substitute(model.initial_equations, symbols, values)
+
+    _substitute_metadata(model, symbols, values)
+
+
+def _start_conflicts(start, alias_start, sign):
+    start_mx = ca.MX(start)
+    alias_start_mx = ca.MX(alias_start)
+    return (
+        start_mx.is_constant() != alias_start_mx.is_constant()
+        or (start_mx.is_symbolic() and str(start_mx) != str(sign * alias_start_mx))
+        or start != alias_start_mx
+    )
+
+
+def _detect_aliases(model, options, connections):
+    states = {s.symbol.name() for s in model.states}
+    der_states = {s.symbol.name() for s in model.der_states}
+    alg_states = {s.symbol.name() for s in model.alg_states}
+    inputs = {s.symbol.name() for s in model.inputs}
+    parameters = {s.symbol.name() for s in model.parameters}
+
+    all_states = OrderedDict(
+        (s.symbol.name(), s)
+        for s in itertools.chain(
+            model.states, model.der_states, model.alg_states, model.inputs, model.parameters
+        )
+    )
+
+    # For now, we only eliminate algebraic states.
+    do_not_eliminate = states | der_states | inputs | parameters
+
+    aliases = _UnionFind()
+
+    def _make_alias(deps, negative_alias=False):
+        # Note that the logic of which variable to eliminate follows that of
+        # pymoca, such that we end up with the same canonical variables.
+        name_0, name_1 = deps[0].name(), deps[1].name()
+
+        if name_0 in alg_states:
+            alg_state, other_state = name_0, name_1
+        elif name_1 in alg_states:
+            alg_state, other_state = name_1, name_0
+        else:
+            return False
+
+        if name_0 in alg_states and name_1 in alg_states:
+            if aliases.find(alg_state)[0] in do_not_eliminate:
+                other_state, alg_state = alg_state, other_state
+
+        if not options["allow_derivative_aliases"] and (
+            alg_state in der_states or other_state in der_states
+        ):
+            return False
+
+        if (
+            aliases.find(alg_state)[0] in do_not_eliminate
+            and aliases.find(other_state)[0] in do_not_eliminate
+        ):
+            return False
+
+        # Eliminate alg_state by aliasing it to other_state. To keep the
+        # equations balanced, we drop this equation (even if the two were
+        # already aliases of each other).
+        aliases.union(other_state, alg_state, -1 if negative_alias else 1)
+        return True
+
+    def _detect_alias(eq):
+        # We do fast checks first, and the slower (but more generic)
+        # checks after.
+        deps = ca.symvar(eq)
+
+        if len(deps) == 2:
+            if eq.n_dep() == 2 and (eq.is_op(ca.OP_SUB) or eq.is_op(ca.OP_ADD)):
+                if eq.dep(0).is_symbolic() and eq.dep(1).is_symbolic():
+                    return deps, eq.is_op(ca.OP_ADD)
+
+        non_param_deps = [sym for sym in deps if sym.name() not in parameters]
+
+        for d in [deps, non_param_deps]:
+            if not len(d) == 2:
+                continue
+
+            # Check with substitute, which is a more expensive operation
+            if ca.substitute(eq, d[0], d[1]).is_zero():
+                return d, False
+            elif ca.substitute(eq, d[0], -1 * d[1]).is_zero():
+                return d, True
+
+        return [], False
+
+    reduced_equations = []
+    for i, eq in enumerate(model.equations):
+        if (
+            i in connections
+            and eq.is_op(ca.OP_SUB)
+            and eq.dep(0).is_symbolic()
+            and eq.dep(1).is_symbolic()
+        ):
+            # Connection equations are of the form `a - b`, so we already
+            # know that they are an alias.
+            symbols, negative_alias = [eq.dep(0), eq.dep(1)], False
+        else:
+            symbols, negative_alias = _detect_alias(eq)
+
+        if not (symbols and _make_alias(symbols, negative_alias)):
+            reduced_equations.append(eq)
+
+    # Eliminate alias variables, and merge the metadata of the aliases into
+    # that of the canonical variable.
+    variables, values = [], []
+    for canonical, group in aliases.groups(list(all_states)).items():
+        canonical_state = all_states[canonical]
+
+        python_type = canonical_state.python_type
+        start = canonical_state.start
+        min_, max_ = canonical_state.min, canonical_state.max
+        nominal = canonical_state.nominal
+        fixed = canonical_state.fixed
+
+        alias_names = set()
+
+        for alias, sign in group:
+            alias_state = all_states[alias]
+            alias_names.add(alias if sign == 1 else f"-{alias}")
+
+            model.alias_relation.add(canonical, alias if sign == 1 else f"-{alias}")
+
+            variables.append(alias_state.symbol)
+            values.append(sign * canonical_state.symbol)
+
+            # If any of the aliases has a nonstandard type, apply it to
+            # the canonical state as well
+            if alias_state.python_type != float:
+                python_type = alias_state.python_type
+
+            # If any of the aliases has a nondefault start value, apply it to
+            # the canonical state as well
+            if not isinstance(alias_state.start, _DefaultValue):
+                if isinstance(start, _DefaultValue):
+                    start = sign * alias_state.start
+                elif _start_conflicts(start, alias_state.start, sign):
+                    logger.warning(
+                        "Current start attribute of canonical variable '{}' ({})"
+                        " conflicts with that of its alias '{}' ({})."
+                        " Will keep existing value of {}.".format(
+                            canonical, start, alias, alias_state.start, start
+                        )
+                    )
+
+            # The intersection of all bound ranges applies
+            min_ = ca.fmax(min_, alias_state.min if sign == 1 else -alias_state.max)
+            max_ = ca.fmin(max_, alias_state.max if sign == 1 else -alias_state.min)
+
+            # Take the largest nominal of all aliases
+            nominal = ca.fmax(nominal, alias_state.nominal)
+
+            # If any of the aliases is fixed, the canonical state is as well
+            fixed = ca.fmax(fixed, alias_state.fixed)
+
+            del all_states[alias]
+
+        canonical_state.aliases = alias_names
+        canonical_state.python_type = python_type
+        canonical_state.start = start
+        canonical_state.min = min_
+        canonical_state.max = max_
+        canonical_state.nominal = nominal
+        canonical_state.fixed = fixed
+
+    model.states = [v for k, v in all_states.items() if k in states]
+    model.der_states = [v for k, v in all_states.items() if k in der_states]
+    model.alg_states = [v for k, v in all_states.items() if k in alg_states]
+    model.inputs = [v for k, v in all_states.items() if k in inputs]
+    model.parameters = [v for k, v in all_states.items() if k in parameters]
+    model.equations = reduced_equations
+
+    if len(model.equations) > 0:
+        model.equations = ca.substitute(model.equations, variables, values)
+    if len(model.initial_equations) > 0:
+        model.initial_equations = ca.substitute(model.initial_equations, variables, values)
+
+
+def simplify(model: _Model, options: dict, connections: Iterable[int] = ()) -> bool:
+    """
+    Simplify a pymoca model that was built from a flattened PyCML model.
+
+    This is a direct implementation of the subset of pymoca's simplification
+    passes that is used for PyCML models: resolving parameter values,
+    replacing parameter expressions and detecting aliases. Aliases are
+    collected with a union-find, and only put in the alias relation of the
+    model at the end. Connection equations are known to be aliases, and
+    are therefore not analyzed.
+
+    The resulting model is the same as that of `model.simplify(options)`,
+    i.e. with the same canonical variables.
+
+    :param model: Pymoca model to simplify in place.
+    :param options: Pymoca compiler options.
+    :param connections: Indices of the connection equations.
+
+    :returns: True if the model was simplified, False if the options (or
+        the model) require the generic pymoca simplification instead.
+    """
+    options = _merge_default_options(options)
+
+    if not _is_supported(model, options):
+        return False
+
+    if options["resolve_parameter_values"]:
+        _resolve_parameter_values(model)
+
+    if options["replace_parameter_expressions"]:
+        _replace_parameter_expressions(model)
+
+    if options["detect_aliases"]:
+        _detect_aliases(model, options, set(connections))
+
+    return True
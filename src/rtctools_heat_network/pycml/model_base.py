@@ -1,4 +1,5 @@
-from typing import Dict, List, Tuple, Union
+import functools
+from typing import Dict, List, NamedTuple, Tuple, Union
 
 import casadi as ca
 
@@ -6,7 +7,6 @@ import numpy as np
 
 from pymoca.backends.casadi.model import Variable as _Variable
 
-
 MATHEMATICAL_OPERATORS = [
     "__add__",
     "__radd__",
@@ -157,7 +157,9 @@ class Model:
     _initial_equations: List[ca.MX] = []
     _inequalities: List[Tuple[ca.MX, float, float]] = []
     _initial_inequalities: List[Tuple[ca.MX, float, float]] = []
+    _connections: List[int] = []
     _skip_variables = None
+    _templates = None
 
     def __init__(self, name, **modifiers):
         # Note that this method should be such that it's allowed to be called
@@ -168,6 +170,9 @@ class Model:
         self._derivatives = {}
         self._equations = []
         self._initial_equations = []
+        self._inequalities = []
+        self._initial_inequalities = []
+        self._connections = []
 
         self.name = name
         # Value assignment can be done directly, but we move it to the value attribute to
@@ -181,9 +186,83 @@ class Model:
         self.__prefix = "" if name is None else f"{self.name}."
 
         if Model._skip_variables is None:
-            Model._skip_variables = dir(self)
+            Model._skip_variables = frozenset(dir(self))
 
     def add_variable(self, type_, var_name, *dimensions, **kwargs):
+        kwargs = self.__pop_modifiers(var_name, kwargs)
+        var = self.__instantiate_variable(type_, var_name, dimensions, kwargs)
+        self.__register_variable(var_name, var)
+
+    def add_variables(
+        self,
+        variables: List[Tuple[type, str, dict]],
+        use_templates: bool = False,
+    ):
+        """
+        Add multiple (scalar) variables or components to the model at once.
+
+        The variables are added to the model in the order in which they are
+        passed. Variable names and the order of variables and equations are
+        therefore the same as when calling :py:meth:`add_variable` for each
+        of them in turn.
+
+        With `use_templates`, components of the same type and with the same
+        structure of modifiers are only constructed once. Every such
+        component is a copy of this template with its own symbols and its
+        own parameter values, see :py:class:`ComponentTemplate`. The
+        templates are kept for the lifetime of the model, so they are also
+        used by subsequent calls.
+
+        :param variables: List of tuples of type, name and modifiers.
+        :param use_templates: Whether to instantiate components from templates.
+        """
+        names = set()
+        for _, var_name, _ in variables:
+            if var_name in names:
+                raise Exception(f"Variable with name '{var_name}' already exists")
+            names.add(var_name)
+
+        # Popping the modifiers mutates the model, so we do that up front
+        jobs = [
+            (type_, var_name, (), self.__pop_modifiers(var_name, kwargs))
+            for type_, var_name, kwargs in variables
+        ]
+
+        if not use_templates:
+            instances = [self.__instantiate_variable(*x) for x in jobs]
+        else:
+            if self._templates is None:
+                self._templates = {}
+
+            instances = [self.__instantiate_from_template(*x) for x in jobs]
+
+        for (_, var_name, _, _), var in zip(jobs, instances):
+            self.__register_variable(var_name, var)
+
+    def __instantiate_from_template(self, type_, var_name, dimensions, kwargs):
+        name = f"{self.__prefix}{var_name}"
+
+        key = ComponentTemplate.key(type_, kwargs)
+        if key is not None and key not in self._templates:
+            try:
+                self._templates[key] = ComponentTemplate(type_, name, kwargs)
+            except (RuntimeError, TypeError):
+                # The component cannot be constructed with symbolic parameter
+                # values, e.g. because it branches on one of them.
+                self._templates[key] = None
+
+        if key is not None and self._templates[key] is None:
+            # Fall back to a template per set of parameter values
+            key = ComponentTemplate.key(type_, kwargs, parametrize=False)
+            if key is not None and key not in self._templates:
+                self._templates[key] = ComponentTemplate(type_, name, kwargs, parametrize=False)
+
+        if key is None:
+            return self.__instantiate_variable(type_, var_name, dimensions, kwargs)
+        else:
+            return self._templates[key].instantiate(name, kwargs)
+
+    def __pop_modifiers(self, var_name, kwargs):
         if var_name in self._variables:
             raise Exception(f"Variable with name '{var_name}' already exists")
 
@@ -194,12 +273,16 @@ class Model:
                 if isinstance(v, BaseVariable):
                     kwargs[k] = ca.MX(v)
 
+        return kwargs
+
+    def __instantiate_variable(self, type_, var_name, dimensions, kwargs):
         if dimensions:
-            var = self._variables[var_name] = Array(
-                type_, f"{self.__prefix}{var_name}", dimensions, **kwargs
-            )
+            return Array(type_, f"{self.__prefix}{var_name}", dimensions, **kwargs)
         else:
-            var = self._variables[var_name] = type_(f"{self.__prefix}{var_name}", **kwargs)
+            return type_(f"{self.__prefix}{var_name}", **kwargs)
+
+    def __register_variable(self, var_name, var):
+        self._variables[var_name] = var
 
         if isinstance(var, (Variable, ControlInput, ConstantInput)) and (
             isinstance(var.value, (ca.MX, BaseVariable)) or not np.isnan(var.value)
@@ -231,7 +314,11 @@ class Model:
                 f"of type {type(b)} as they have different variables."
             )
 
+        # We keep track of which equations are connections, as these are
+        # trivial aliases that do not have to be analyzed further.
+        n = len(self._equations)
         self._equations.extend([a.variables[k] - b.variables[k] for k in a.variables.keys()])
+        self._connections.extend(range(n, len(self._equations)))
 
     def der(self, var: Variable):
         return var.der()
@@ -248,6 +335,14 @@ class Model:
     def equations(self):
         return self._equations.copy()
 
+    @property
+    def connections(self):
+        """
+        Indices of the equations that are connection equations, i.e. of the
+        form `a - b` with `a` and `b` variables of two connected ports.
+        """
+        return self._connections.copy()
+
     @property
     def initial_equations(self):
         return self._initial_equations.copy()
@@ -311,64 +406,371 @@ class Model:
     def __str__(self):
         return self.name
 
-    def flatten(self):
-        if self._modifiers:
-            raise Exception("Cannot flatten a model with remaining modifiers")
+    def flattened_size(self) -> "FlattenedSize":
+        """
+        Size of the model after flattening, without actually flattening it.
+        """
+        models, n_variables = self.__walk()
+
+        return FlattenedSize(
+            n_variables,
+            sum(len(m._numeric_parameters) for m in models),
+            sum(len(m._equations) for m in models),
+            sum(len(m._initial_equations) for m in models),
+            sum(len(m._inequalities) for m in models),
+            sum(len(m._initial_inequalities) for m in models),
+        )
 
+    def flatten(self):
         m = FlattenedModel()
 
-        all_variables = {}
-        all_parameters = {}
+        variables = {}
+        models, _ = self.__walk(variables)
+
+        m._variables = variables
+        m._numeric_parameters = {
+            f"{x.__prefix}{p}": v for x in models for p, v in x._numeric_parameters.items()
+        }
 
-        all_equations = []
-        all_initial_equations = []
+        m._equations = self.__concatenate(x._equations for x in models)
 
-        all_inequalities = []
-        all_initial_inequalities = []
+        offset = 0
+        connections = []
+        for x in models:
+            connections.extend(offset + i for i in x._connections)
+            offset += len(x._equations)
+        m._connections = connections
+        m._initial_equations = self.__concatenate(x._initial_equations for x in models)
 
-        # First we expand arrays
-        variables = {}
+        m._inequalities = self.__concatenate(x._inequalities for x in models)
+        m._initial_inequalities = self.__concatenate(x._initial_inequalities for x in models)
+
+        return m
+
+    def __walk(self, variables=None):
+        """
+        Iterative depth-first walk over this model and all its submodels.
+
+        :param variables: Dictionary to put the (prefixed) variables in, in
+            the order in which they appear in the model hierarchy.
+
+        :returns: List of all models in post-order, and the number of
+            variables in them.
+        """
+        models = []
+        n_variables = 0
+
+        stack = [(self, self.__expanded_variables())]
+        while stack:
+            model, items = stack[-1]
+            for k, var in items:
+                if isinstance(var, Model):
+                    stack.append((var, var.__expanded_variables()))
+                    break
+                n_variables += 1
+                if variables is not None:
+                    variables[f"{model.__prefix}{k}"] = var
+            else:
+                if model._modifiers:
+                    raise Exception("Cannot flatten a model with remaining modifiers")
+                stack.pop()
+                models.append(model)
+
+        return models, n_variables
+
+    def __expanded_variables(self):
         for k, var in self._variables.items():
             if isinstance(var, Array):
-                for el, suff in zip(var._array.ravel(), var._names.ravel()):
-                    variables[f"{k}{suff}"] = el
+                yield from zip((f"{k}{suff}" for suff in var._names.flat), var._array.flat)
             else:
-                variables[k] = var
+                yield k, var
+
+    @staticmethod
+    def __concatenate(lists):
+        lists = list(lists)
+        result = [None] * sum(len(x) for x in lists)
+        i = 0
+        for x in lists:
+            result[i : i + len(x)] = x
+            i += len(x)
+        return result
+
+
+class FlattenedSize(NamedTuple):
+    variables: int
+    numeric_parameters: int
+    equations: int
+    initial_equations: int
+    inequalities: int
+    initial_inequalities: int
+
+
+class _Identity:
+    """
+    Hashable wrapper of a symbolic modifier value, comparing by identity of
+    the underlying CasADi node.
+    """
+
+    __slots__ = ("value", "_hash")
+
+    def __init__(self, value):
+        self.value = value
+        self._hash = value.__hash__()
+
+    def __eq__(self, other):
+        return isinstance(other, _Identity) and self._hash == other._hash
+
+    def __hash__(self):
+        return self._hash
+
+
+class ComponentTemplate:
+    """
+    Template from which copies of a component can be instantiated cheaply.
+
+    A template is made by constructing the component once, with a symbol in
+    place of every (finite) float in its modifiers. All expressions in the
+    component (equations, inequalities, symbolic attributes and numeric
+    parameters) are then collected into CasADi Functions of the symbols
+    owned by the component, i.e. those of the variables in it and its
+    subcomponents, and of these parameter symbols. Symbols that are not
+    owned by the component, e.g. a global parameter, are passed through as
+    is.
+
+    Instantiating a template copies the structure of the component, creates
+    new symbols for the new name, and calls these Functions (inlined) to
+    bind the new symbols and the parameter values of the instance into the
+    expressions. Expressions that only depend on parameter values, e.g. the
+    numeric parameters and nominals, are evaluated to floats. Components are
+    therefore interchangeable if they have the same type and the same
+    structure of modifiers, see :py:meth:`key`.
+
+    A component that cannot be constructed with symbolic parameter values,
+    e.g. because it branches on one of them, raises a RuntimeError or
+    TypeError. Such a component can still be templated with
+    `parametrize=False`, in which case its parameter values are part of
+    the template.
+    """
+
+    def __init__(self, type_, name: str, modifiers: dict, parametrize: bool = True):
+        self._name = name
+
+        parameters = []
+        if parametrize:
+            modifiers = self._parametrize(modifiers, parameters)
+        component = type_(name, **modifiers)
+
+        # Make a private copy, such that later changes to the component do
+        # not end up in the template.
+        old_symbols = []
+        symbols = []
+        slots = []
+        self._prototype = self._copy(component, self._name, old_symbols, symbols, slots)
+
+        # Expressions that only depend on parameter values are evaluated
+        # numerically, all others are bound symbolically.
+        parameter_hashes = {x.__hash__() for x in parameters}
+        self._numeric = []
+        numeric_expressions = []
+        expressions = []
+        for i, (_, expr) in enumerate(slots):
+            dependencies = {x.__hash__() for x in ca.symvar(expr)}
+            if dependencies and dependencies <= parameter_hashes:
+                self._numeric.append(i)
+                numeric_expressions.append(expr)
+            else:
+                expressions.append(expr)
+
+        numeric = set(self._numeric)
+        self._symbolic = [i for i in range(len(slots)) if i not in numeric]
+
+        self._parameter_function = None
+        if numeric_expressions:
+            self._parameter_function = ca.Function("parameters", parameters, numeric_expressions)
+
+        if expressions:
+            owned = {x.__hash__() for x in old_symbols} | parameter_hashes
+            self._external = [
+                x for x in ca.symvar(ca.veccat(*expressions)) if x.__hash__() not in owned
+            ]
+            self._function = ca.Function(
+                "template", [*old_symbols, *self._external, *parameters], expressions
+            )
+        else:
+            self._external = []
+            self._function = None
+
+        self._parametrized = parametrize
+
+    @staticmethod
+    def _is_parameter(v):
+        return isinstance(v, float) and np.isfinite(v)
 
-        # Move variables to flattened model
-        for k, var in variables.items():
-            if isinstance(var, Model):
-                flatten_var = var.flatten()
-                all_variables.update(flatten_var._variables)
-                all_parameters.update(flatten_var._numeric_parameters)
+    @classmethod
+    def _parametrize(cls, modifiers, parameters):
+        """
+        Copy of the modifiers with every parameter value replaced by a
+        symbol, in the order of :py:meth:`_parameter_values`.
+        """
+        result = {}
+        for k in sorted(modifiers):
+            v = modifiers[k]
+            if isinstance(v, dict):
+                v = cls._parametrize(v, parameters)
+            elif cls._is_parameter(v):
+                v = ca.MX.sym(f"p{len(parameters)}")
+                parameters.append(v)
+            result[k] = v
+        return result
+
+    @classmethod
+    def _parameter_values(cls, modifiers, values):
+        for k in sorted(modifiers):
+            v = modifiers[k]
+            if isinstance(v, dict):
+                cls._parameter_values(v, values)
+            elif cls._is_parameter(v):
+                values.append(v)
+        return values
 
-                all_equations.extend(flatten_var._equations)
-                all_initial_equations.extend(flatten_var._initial_equations)
+    @classmethod
+    def key(cls, type_, modifiers, parametrize=True):
+        """
+        Key by which components are interchangeable, or None if the modifiers
+        cannot be hashed. With `parametrize`, the key only includes the
+        structure of the modifiers, and not the values of parameters.
+        """
 
-                all_inequalities.extend(flatten_var._inequalities)
-                all_initial_inequalities.extend(flatten_var._initial_inequalities)
+        def _freeze(v):
+            if isinstance(v, dict):
+                return tuple(sorted((k, _freeze(x)) for k, x in v.items()))
+            elif isinstance(v, (ca.MX, BaseVariable)):
+                return _Identity(ca.MX(v))
+            elif parametrize and cls._is_parameter(v):
+                return (float,)
+            elif isinstance(v, float) and np.isnan(v):
+                return ("nan",)
             else:
-                all_variables[f"{self.__prefix}{k}"] = var
+                hash(v)
+                return (type(v), v)
 
-        all_parameters.update(
-            {f"{self.__prefix}{p}": v for p, v in self._numeric_parameters.items()}
+        try:
+            return (type_, parametrize, _freeze(modifiers))
+        except TypeError:
+            return None
+
+    def instantiate(self, name: str, modifiers: dict) -> "Model":
+        symbols = []
+        slots = []
+        component = self._copy(self._prototype, name, [], symbols, slots)
+
+        values = []
+        if self._parametrized:
+            values = self._parameter_values(modifiers, values)
+
+        if self._parameter_function is not None:
+            for i, v in zip(self._numeric, self._parameter_function.call(values)):
+                setter, _ = slots[i]
+                setter(float(v) if v.is_scalar() else np.array(v))
+
+        if self._function is not None:
+            values = [ca.MX(v) for v in values]
+            expressions = self._function.call([*symbols, *self._external, *values], True, False)
+            for i, v in zip(self._symbolic, expressions):
+                setter, _ = slots[i]
+                setter(v)
+
+        return component
+
+    def _rename(self, name, new_name):
+        if name.startswith("der("):
+            return f"der({self._rename(name[4:-1], new_name)})"
+        assert name.startswith(self._name)
+        return f"{new_name}{name[len(self._name):]}"
+
+    def _copy(self, obj, new_name, old_symbols, symbols, slots):
+        if isinstance(obj, Model):
+            return self._copy_model(obj, new_name, old_symbols, symbols, slots)
+        elif isinstance(obj, Array):
+            new = object.__new__(Array)
+            new._names = obj._names.copy()
+            new._array = np.empty(obj._array.shape, dtype=object)
+            for index in np.ndindex(obj._array.shape):
+                new._array[index] = self._copy(
+                    obj._array[index], new_name, old_symbols, symbols, slots
+                )
+            return new
+        else:
+            return self._copy_variable(obj, new_name, old_symbols, symbols, slots)
+
+    def _copy_variable(self, var, new_name, old_symbols, symbols, slots):
+        # Avoid copy.copy() and the wrapped attribute access, as this is
+        # called for every variable of every component.
+        new = object.__new__(type(var))
+        d = new.__dict__
+        d.update(var.__dict__)
+
+        symbol = var.symbol
+        d["symbol"] = new_symbol = ca.MX.sym(
+            self._rename(symbol.name(), new_name), symbol.size1(), symbol.size2()
         )
-        all_equations.extend(self.equations)
-        all_initial_equations.extend(self.initial_equations)
-
-        all_inequalities.extend(self.inequalities)
-        all_initial_inequalities.extend(self.initial_inequalities)
+        d["aliases"] = set(var.aliases)
+        old_symbols.append(symbol)
+        symbols.append(new_symbol)
 
-        m._variables = all_variables
-        m._numeric_parameters = all_parameters
+        for attr in ("value", "min", "max", "nominal"):
+            if isinstance(d[attr], ca.MX):
+                slots.append((functools.partial(d.__setitem__, attr), d[attr]))
 
-        m._equations = all_equations
-        m._initial_equations = all_initial_equations
+        if "_derivative" in d:
+            d["_derivative"] = self._copy_variable(
+                var._derivative, new_name, old_symbols, symbols, slots
+            )
 
-        m._inequalities = all_inequalities
-        m._initial_inequalities = all_initial_inequalities
+        return new
+
+    def _copy_model(self, model, new_name, old_symbols, symbols, slots):
+        new = object.__new__(type(model))
+        d = new.__dict__
+        d.update(model.__dict__)
+
+        name = self._rename(model.name, new_name)
+        d["name"] = name
+        d["_Model__prefix"] = f"{name}."
+        d["_modifiers"] = dict(model._modifiers)
+        d["_derivatives"] = dict(model._derivatives)
+        d["_connections"] = list(model._connections)
+
+        d["_variables"] = {
+            k: self._copy(v, new_name, old_symbols, symbols, slots)
+            for k, v in model._variables.items()
+        }
+
+        d["_numeric_parameters"] = parameters = dict(model._numeric_parameters)
+        for k, v in parameters.items():
+            if isinstance(v, ca.MX):
+                slots.append((functools.partial(parameters.__setitem__, k), v))
+
+        for attr in ("_equations", "_initial_equations"):
+            d[attr] = equations = list(getattr(model, attr))
+            for i, eq in enumerate(equations):
+                if isinstance(eq, ca.MX):
+                    slots.append((functools.partial(equations.__setitem__, i), eq))
+
+        for attr in ("_inequalities", "_initial_inequalities"):
+            d[attr] = inequalities = list(getattr(model, attr))
+            for i, (expr, lb, ub) in enumerate(inequalities):
+                for j, x in enumerate((expr, lb, ub)):
+                    if isinstance(x, ca.MX):
+                        slots.append((functools.partial(self._set_bound, inequalities, i, j), x))
+
+        return new
 
-        return m
+    @staticmethod
+    def _set_bound(inequalities, i, j, value):
+        inequality = list(inequalities[i])
+        inequality[j] = value
+        inequalities[i] = tuple(inequality)
 
 
 class FlattenedModel(Model):
@@ -13,6 +13,7 @@ from rtctools._internal.caching import cached
 from rtctools.optimization.optimization_problem import OptimizationProblem
 
 from . import ConstantInput, ControlInput, Model, SymbolicParameter, Variable
+from ._simplify import simplify
 
 
 logger = logging.getLogger("rtctools_heat_network")
@@ -24,6 +25,17 @@ class PyCMLMixin(OptimizationProblem):
 
         pycml_model = self.pycml_model()
 
+        # We can check the size of the model up front, before flattening it
+        size = pycml_model.flattened_size()
+        logger.debug(
+            "Flattened model has {} variables and {} equations.".format(
+                size.variables, size.equations
+            )
+        )
+
+        if size.inequalities > 0 or size.initial_inequalities > 0:
+            raise NotImplementedError("Inequalities are not supported yet")
+
         self.__flattened_model = pycml_model.flatten()
 
         self.__pymoca_model = _Model()
@@ -40,24 +52,25 @@ class PyCMLMixin(OptimizationProblem):
 
         self.__pymoca_model.equations = self.__flattened_model.equations
         self.__pymoca_model.initial_equations = self.__flattened_model.initial_equations
-        self.__pymoca_model.simplify(self.compiler_options())
 
-        if (
-            len(self.__flattened_model.inequalities) > 0
-            or len(self.__flattened_model.initial_inequalities) > 0
+        # PyCML models only need a small subset of the pymoca simplification
+        # passes, for which we have a direct implementation.
+        compiler_options = self.compiler_options().copy()
+        direct_simplification = compiler_options.pop("pycml_direct_simplification", True)
+
+        if not (
+            direct_simplification
+            and simplify(self.__pymoca_model, compiler_options, self.__flattened_model.connections)
         ):
-            raise NotImplementedError("Inequalities are not supported yet")
+            self.__pymoca_model.simplify(compiler_options)
 
         # Note that we do not pass the numeric parameters to the Pymoca model
         # in their entirety. That way we can avoid making useless Variable
         # instances, as the parameters do not appear in any equations anyway.
-        self.__parameters = {
-            k: v
-            for k, v in self.__flattened_model.numeric_parameters.items()
-            if not isinstance(v, str)
-        }
+        numeric_parameters = self.__flattened_model.numeric_parameters
+        self.__parameters = {k: v for k, v in numeric_parameters.items() if not isinstance(v, str)}
         self.__string_parameters = {
-            k: v for k, v in self.__flattened_model.numeric_parameters.items() if isinstance(v, str)
+            k: v for k, v in numeric_parameters.items() if isinstance(v, str)
         }
 
         # Extract the CasADi MX variables used in the model
@@ -119,6 +132,10 @@ class PyCMLMixin(OptimizationProblem):
         Subclasses can configure the `pymoca <http://github.com/pymoca/pymoca>`_
         compiler options here.
 
+        In addition to the pymoca options, the option `pycml_direct_simplification`
+        (default True) can be used to disable the direct simplification of the
+        model, and use the generic pymoca simplification instead.
+
         :returns: A dictionary of pymoca compiler options. See the pymoca documentation
                   for details.
         """
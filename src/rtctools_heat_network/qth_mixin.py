@@ -13,7 +13,7 @@ from rtctools.optimization.collocated_integrated_optimization_problem import (
 from rtctools.optimization.homotopy_mixin import HomotopyMixin
 from rtctools.optimization.timeseries import Timeseries
 
-from rtctools_heat_network._heat_loss_u_values_pipe import heat_loss_u_values_pipe
+from rtctools_heat_network._heat_loss_u_values_pipe import heat_loss_u_values_pipes
 
 from .base_component_type_mixin import BaseComponentTypeMixin
 from .head_loss_mixin import (
@@ -27,6 +27,7 @@ from .heat_network_common import (
     NodeConnectionDirection,
     PipeFlowDirection,
 )
+from .homotopy_continuation_mixin import HomotopyContinuationMixin
 
 logger = logging.getLogger("rtctools_heat_network")
 
@@ -95,10 +96,12 @@ class QTHMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOptim
         self.__implied_directions = None
         self.__direction_bounds = None
 
-        if not isinstance(self, HomotopyMixin):
+        if not isinstance(self, (HomotopyMixin, HomotopyContinuationMixin)):
             # Note that we inherit ourselves, as there is a certain in which
             # inheritance is required.
-            raise Exception("Class needs to inherit from HomotopyMixin")
+            raise Exception(
+                "Class needs to inherit from HomotopyMixin or HomotopyContinuationMixin"
+            )
 
         self.__flow_direction_bounds = None
         self.__demand_temperature_bounds = None
@@ -107,6 +110,8 @@ class QTHMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOptim
         self.__flow_direction_bounds = None
         self.__demand_temperature_bounds = None
         self.__temperature_pipe_theta_zero = None
+        self.__heat_loss_coefficients = {}
+        self.__node_mixing = None
 
         self.__buffer_t0_bounds = {}
 
@@ -336,26 +341,43 @@ class QTHMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOptim
             self.state_vector(canonical, ensemble_member) * self.variable_nominal(canonical) * sign
         )
 
-    def __pipe_heat_loss_constraints(self, ensemble_member):
-        parameters = self.parameters(ensemble_member)
-        constraints = []
+    def __pipe_heat_loss_coefficients(self, ensemble_member):
+        """
+        Per-pipe coefficients of the heat loss equations, as arrays in the
+        order of the pipes in the component index. These only depend on the
+        parameters, so we compute them once per ensemble member. The
+        nominals of the equations are computed on every call, as the
+        nominals of the variables may change between transcriptions.
+        """
+        try:
+            coefficients = self.__heat_loss_coefficients[ensemble_member]
+        except KeyError:
+            coefficients = self.__heat_loss_coefficients[ensemble_member] = (
+                self.__compute_pipe_heat_loss_coefficients(ensemble_member)
+            )
 
-        theta = parameters[self.homotopy_options()["homotopy_parameter"]]
-        components = self.heat_network_components
+        rho_cp, loss, loss_ground, loss_dtemp = coefficients
 
-        # At theta=0, the temperature of the hot/cold pipes are constant
-        # and equal to the design ones. Thus heat loss equations do not apply.
-        if theta == 0.0:
-            return []
+        # We want to scale the equation appropriately. We therefore find
+        # the (approximate) geometric mean of the coefficients in the
+        # jacobian.
+        pipes = self.heat_network_component_index.pipes
+        q_nominal = np.array([self.variable_nominal(f"{p}.Q") for p in pipes], dtype=float)
+        t_nominal = np.array([self.variable_nominal(f"{p}.QTHIn.T") for p in pipes], dtype=float)
 
-        interpolated_flow_dir_values = self.__get_interpolated_flow_directions(ensemble_member)
+        heat_nominal = rho_cp * q_nominal * t_nominal
+        heat_loss_nominal = loss * t_nominal
+        equation_nominal = (heat_nominal * heat_loss_nominal) ** 0.5
 
-        for p in components["pipe"]:
-            temp_in_sym = self.__state_vector_scaled(f"{p}.QTHIn.T", ensemble_member)
-            temp_out_sym = self.__state_vector_scaled(f"{p}.QTHOut.T", ensemble_member)
-            q_sym = self.__state_vector_scaled(f"{p}.Q", ensemble_member)
+        return rho_cp, loss, loss_ground, loss_dtemp, equation_nominal
+
+    def __compute_pipe_heat_loss_coefficients(self, ensemble_member):
+        parameters = self.parameters(ensemble_member)
+        component_index = self.heat_network_component_index
 
-            u_kwargs = {
+        u_kwargs = []
+        for p in component_index.pipes:
+            kwargs = {
                 "inner_diameter": parameters[f"{p}.diameter"],
                 "insulation_thicknesses": parameters[f"{p}.insulation_thickness"],
                 "conductivities_insulation": parameters[f"{p}.conductivity_insulation"],
@@ -366,154 +388,240 @@ class QTHMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOptim
             }
 
             # NaN values mean we use the function default
-            u_kwargs = {k: v for k, v in u_kwargs.items() if not np.all(np.isnan(v))}
-            u_1, u_2 = heat_loss_u_values_pipe(**u_kwargs)
+            u_kwargs.append({k: v for k, v in kwargs.items() if not np.all(np.isnan(v))})
 
+        u_1_values, u_2_values = heat_loss_u_values_pipes(u_kwargs)
+
+        rho_cp = []
+        loss = []
+        loss_ground = []
+        loss_dtemp = []
+
+        for p, u_1, u_2 in zip(component_index.pipes, u_1_values, u_2_values):
             cp = parameters[f"{p}.cp"]
             rho = parameters[f"{p}.rho"]
             length = parameters[f"{p}.length"]
 
             temp_ground = parameters[f"{p}.T_ground"]
-            sign_dtemp = 1 if self.is_hot_pipe(p) else -1
+            sign_dtemp = 1 if component_index.is_hot_pipe(p) else -1
             dtemp = sign_dtemp * parameters[f"{p}.dT"]
 
-            flow_direction = interpolated_flow_dir_values[p]
-            heat_loss_eq = []
-            no_heat_loss_eq = []
+            rho_cp.append(rho * cp)
+            loss.append(length * (u_1 - u_2))
+            loss_ground.append(length * (u_1 - u_2) * temp_ground)
+            loss_dtemp.append(length * u_2 * dtemp)
 
-            # We want to scale the equation appropriately. We therefore find
-            # the (approximate) geometric mean of the coefficients in the
-            # jacobian.
-            heat_nominal = (
-                rho * cp * self.variable_nominal(f"{p}.Q") * self.variable_nominal(f"{p}.QTHIn.T")
-            )
-            heat_loss_nominal = length * (u_1 - u_2) * self.variable_nominal(f"{p}.QTHIn.T")
-            equation_nominal = (heat_nominal * heat_loss_nominal) ** 0.5
-
-            # If pipe is connected, add heat losses
-            # The heat losses have three components:
-            # - dependency on the pipe temperature
-            # - dependency on the ground temperature
-            # - dependency on temperature difference between the supply/return line.
-            # This latter term assumes that the supply and return lines lie close
-            # to, and thus influence, each other. I.e., the supply line loses
-            # heat that is absorbed by the return line. Note that the term dtemp is
-            # positive when the pipe is in the supply line and negative otherwise.
-            heat_loss_inds = np.flatnonzero((flow_direction != 0).astype(int)).tolist()
-            heat_loss_eq.append(
-                (
-                    (1 - theta) * (temp_out_sym - temp_in_sym)
-                    + theta
-                    * (
-                        (temp_out_sym - temp_in_sym) * q_sym * cp * rho
-                        + length * (u_1 - u_2) * (temp_in_sym + temp_out_sym) / 2
-                        - (length * (u_1 - u_2) * temp_ground)
-                        + (length * u_2 * dtemp)
-                    )
-                    / equation_nominal
-                )[heat_loss_inds]
-            )
+        return tuple(np.array(x, dtype=float) for x in (rho_cp, loss, loss_ground, loss_dtemp))
 
-            if len(heat_loss_inds) > 0:
-                constraints.append((ca.vertcat(*heat_loss_eq), 0.0, 0.0))
+    def __pipe_heat_loss_constraints(self, ensemble_member):
+        parameters = self.parameters(ensemble_member)
 
-            # If pipe is disabled, no heat equations
-            no_heat_loss_inds = np.flatnonzero((flow_direction == 0).astype(int)).tolist()
-            no_heat_loss_eq.append((temp_out_sym - temp_in_sym)[no_heat_loss_inds])
+        theta = parameters[self.homotopy_options()["homotopy_parameter"]]
 
-            if len(no_heat_loss_inds) > 0:
-                constraints.append((ca.vertcat(*no_heat_loss_eq), 0.0, 0.0))
+        # At theta=0, the temperature of the hot/cold pipes are constant
+        # and equal to the design ones. Thus heat loss equations do not apply.
+        if theta == 0.0:
+            return []
 
-        return constraints
+        interpolated_flow_dir_values = self.__get_interpolated_flow_directions(ensemble_member)
+        pipes = self.heat_network_component_index.pipes
+        n_times = len(self.times())
+
+        # The equations of all pipes are stacked in a single vector, with
+        # the index of an equation being `i_pipe * n_times + i_time`.
+        temp_in_sym = ca.vertcat(
+            *(self.__state_vector_scaled(f"{p}.QTHIn.T", ensemble_member) for p in pipes)
+        )
+        temp_out_sym = ca.vertcat(
+            *(self.__state_vector_scaled(f"{p}.QTHOut.T", ensemble_member) for p in pipes)
+        )
+        q_sym = ca.vertcat(*(self.__state_vector_scaled(f"{p}.Q", ensemble_member) for p in pipes))
+
+        rho_cp, loss, loss_ground, loss_dtemp, equation_nominal = (
+            np.repeat(x, n_times) for x in self.__pipe_heat_loss_coefficients(ensemble_member)
+        )
+
+        flow_direction = np.concatenate([interpolated_flow_dir_values[p] for p in pipes])
 
-    def __node_mixing_constraints(self, ensemble_member):
-        parameters = self.parameters(ensemble_member)
         constraints = []
 
-        theta = parameters[self.homotopy_options()["homotopy_parameter"]]
+        # If pipe is connected, add heat losses
+        # The heat losses have three components:
+        # - dependency on the pipe temperature
+        # - dependency on the ground temperature
+        # - dependency on temperature difference between the supply/return line.
+        # This latter term assumes that the supply and return lines lie close
+        # to, and thus influence, each other. I.e., the supply line loses
+        # heat that is absorbed by the return line. Note that the term dtemp is
+        # positive when the pipe is in the supply line and negative otherwise.
+        heat_loss_inds = np.flatnonzero(flow_direction != 0).tolist()
+
+        if len(heat_loss_inds) > 0:
+            inds = heat_loss_inds
+            temp_in = temp_in_sym[inds]
+            temp_out = temp_out_sym[inds]
+            heat_loss_eq = (1 - theta) * (temp_out - temp_in) + theta * (
+                (temp_out - temp_in) * q_sym[inds] * rho_cp[inds]
+                + loss[inds] * (temp_in + temp_out) / 2
+                - loss_ground[inds]
+                + loss_dtemp[inds]
+            ) / equation_nominal[inds]
+            constraints.append((heat_loss_eq, 0.0, 0.0))
+
+        # If pipe is disabled, no heat equations
+        no_heat_loss_inds = np.flatnonzero(flow_direction == 0).tolist()
+
+        if len(no_heat_loss_inds) > 0:
+            constraints.append(((temp_out_sym - temp_in_sym)[no_heat_loss_inds], 0.0, 0.0))
 
-        interpolated_flow_dir_values = self.__get_interpolated_flow_directions(ensemble_member)
+        return constraints
+
+    def __node_mixing_structure(self):
+        """
+        The connections of all nodes, and the nominals of their equations.
+        Connections are ordered as in the node-pipe adjacency of the topology,
+        i.e. grouped per node and in order of the connection index. Only the
+        connections are cached, as the nominals of the variables may change
+        between transcriptions.
+        """
+        if self.__node_mixing is None:
+            adjacency = self.heat_network_topology.adjacency
+
+            conn_q = []
+            conn_t = []
+
+            for i, node in enumerate(adjacency.nodes):
+                n_conn = adjacency.indptr[i + 1] - adjacency.indptr[i]
+                conn_base = [f"{node}.QTHConn[{i_conn + 1}]" for i_conn in range(n_conn)]
+
+                conn_q.extend(f"{c}.Q" for c in conn_base)
+                conn_t.extend(f"{c}.T" for c in conn_base)
+
+            # Index of the node of every connection
+            conn_node = np.repeat(np.arange(len(adjacency.nodes)), np.diff(adjacency.indptr))
+
+            self.__node_mixing = (adjacency, conn_q, conn_t, conn_node)
 
-        for node, connected_pipes in self.heat_network_topology.nodes.items():
-            temperature_node_sym = self.__state_vector_scaled(f"{node}.Tnode", ensemble_member)
-            temperature_estimate = parameters[f"{node}.temperature"]
+        adjacency, conn_q, conn_t, conn_node = self.__node_mixing
 
-            # Definition of in/outflows
-            q_in_sum = 0.0
-            q_t_in_sum = 0.0
-            q_out_sum = 0.0
+        q_nominal = []
+        t_nominal = []
+        for i in range(len(adjacency.nodes)):
+            conn = slice(adjacency.indptr[i], adjacency.indptr[i + 1])
+            q_nominal.append(np.median([self.variable_nominal(v) for v in conn_q[conn]]))
+            t_nominal.append(np.median([self.variable_nominal(v) for v in conn_t[conn]]))
 
-            t_out_conn = []
+        return (
+            adjacency,
+            conn_q,
+            conn_t,
+            conn_node,
+            np.array(q_nominal),
+            np.array(t_nominal),
+        )
 
-            for i_conn, (pipe, orientation) in connected_pipes.items():
-                flow_direction = interpolated_flow_dir_values[pipe]
+    def __node_mixing_constraints(self, ensemble_member):
+        parameters = self.parameters(ensemble_member)
+        constraints = []
 
-                assert (
-                    len(flow_direction) == temperature_node_sym.size1()
-                ), "Collocation times mismatch"
+        theta = parameters[self.homotopy_options()["homotopy_parameter"]]
 
-                # The direction at the node is the product of the flow direction and whether
-                # the orientation pipe is in or out of the node.
-                # A positive flow in a pipe at any time step (= 1) and the pipe orientation
-                # into the node (= 1) mean that flow is going into the node (1 * 1 = 1).
-                # Similarly, a negative flow in a pipe at any time step (= -1), combined with
-                # an orientation _out of_ the node (-1), also means flow going into the node
-                # (-1 * -1 = 1)
-                node_in_or_out = orientation * flow_direction
+        interpolated_flow_dir_values = self.__get_interpolated_flow_directions(ensemble_member)
 
-                node_in = (node_in_or_out == NodeConnectionDirection.IN).astype(int)
-                node_out = (node_in_or_out == NodeConnectionDirection.OUT).astype(int)
+        (
+            adjacency,
+            conn_q_vars,
+            conn_t_vars,
+            conn_node,
+            q_nominal,
+            t_nominal,
+        ) = self.__node_mixing_structure()
+
+        if not adjacency.nodes:
+            return constraints
+
+        n_times = len(self.times())
+        n_nodes = len(adjacency.nodes)
+        n_conn = len(conn_node)
+        e = ensemble_member
+
+        # All symbols are stacked per node (or connection), with the index of
+        # an element being `i_node * n_times + i_time`.
+        temperature_node_sym = ca.vertcat(
+            *(self.__state_vector_scaled(f"{node}.Tnode", e) for node in adjacency.nodes)
+        )
+        temperature_estimate = np.repeat(
+            [parameters[f"{node}.temperature"] for node in adjacency.nodes], n_times
+        )
+        conn_q = ca.vertcat(*(self.__state_vector_scaled(v, e) for v in conn_q_vars))
+        conn_t = ca.vertcat(*(self.__state_vector_scaled(v, e) for v in conn_t_vars))
+
+        assert temperature_node_sym.size1() == n_nodes * n_times
+        assert conn_q.size1() == n_conn * n_times
+
+        # The direction at the node is the product of the flow direction and whether
+        # the orientation pipe is in or out of the node.
+        # A positive flow in a pipe at any time step (= 1) and the pipe orientation
+        # into the node (= 1) mean that flow is going into the node (1 * 1 = 1).
+        # Similarly, a negative flow in a pipe at any time step (= -1), combined with
+        # an orientation _out of_ the node (-1), also means flow going into the node
+        # (-1 * -1 = 1)
+        flow_direction = np.stack(
+            [interpolated_flow_dir_values[adjacency.pipes[p]] for p in adjacency.indices]
+        )
+        assert flow_direction.shape == (n_conn, n_times), "Collocation times mismatch"
 
-                conn_base = f"{node}.QTHConn[{i_conn + 1}]"
-                conn_q = self.__state_vector_scaled(f"{conn_base}.Q", ensemble_member)
-                conn_q_abs = conn_q * flow_direction
-                conn_t = self.__state_vector_scaled(f"{conn_base}.T", ensemble_member)
+        node_in_or_out = adjacency.orientation[:, None] * flow_direction
 
-                # In
-                q_in_sum += conn_q_abs * node_in
-                q_t_in_sum += conn_q_abs * conn_t * node_in
+        node_in = node_in_or_out == NodeConnectionDirection.IN
+        node_out = node_in_or_out == NodeConnectionDirection.OUT
 
-                # Out
-                q_out_sum += conn_q_abs * node_out
+        # Incidence matrices mapping the (absolute) flows of the connections
+        # to the in- and outflows of their nodes.
+        def _incidence(mask):
+            conn_inds, time_inds = np.nonzero(mask)
+            rows = (conn_node[conn_inds] * n_times + time_inds).tolist()
+            cols = (conn_inds * n_times + time_inds).tolist()
+            sparsity = ca.Sparsity.triplet(n_nodes * n_times, n_conn * n_times, rows, cols)
+            return ca.DM(sparsity, flow_direction[conn_inds, time_inds])
 
-                inds = np.flatnonzero(node_out).tolist()
-                t_out_conn.append((conn_t - temperature_node_sym)[inds])
+        incidence_in = _incidence(node_in)
+        incidence_out = _incidence(node_out)
 
-            assert q_in_sum.size1() == len(self.times())
+        q_in_sum = ca.mtimes(incidence_in, conn_q)
+        q_t_in_sum = ca.mtimes(incidence_in, conn_q * conn_t)
+        q_out_sum = ca.mtimes(incidence_out, conn_q)
 
-            q_nominal = np.median(
-                [
-                    self.variable_nominal(f"{node}.QTHConn[{i_conn + 1}].Q")
-                    for i in range(len(connected_pipes))
-                ]
-            )
-            t_nominal = np.median(
-                [
-                    self.variable_nominal(f"{node}.QTHConn[{i_conn + 1}].T")
-                    for i in range(len(connected_pipes))
-                ]
-            )
-            qt_nominal = q_nominal * t_nominal
+        q_nominal_vec = np.repeat(q_nominal, n_times)
+        t_nominal_vec = np.repeat(t_nominal, n_times)
+        qt_nominal_vec = q_nominal_vec * t_nominal_vec
 
-            # Conservation of mass
-            constraints.append(((q_in_sum - q_out_sum) / q_nominal, 0.0, 0.0))
+        # Conservation of mass
+        constraints.append(((q_in_sum - q_out_sum) / q_nominal_vec, 0.0, 0.0))
 
-            # Conservation of heat
-            constraints.append(
+        # Conservation of heat
+        constraints.append(
+            (
                 (
-                    (
-                        (1 - theta) * (temperature_node_sym - temperature_estimate) / t_nominal
-                        + theta * (q_in_sum * temperature_node_sym - q_t_in_sum) / qt_nominal
-                    ),
-                    0.0,
-                    0.0,
-                )
+                    (1 - theta) * (temperature_node_sym - temperature_estimate) / t_nominal_vec
+                    + theta * (q_in_sum * temperature_node_sym - q_t_in_sum) / qt_nominal_vec
+                ),
+                0.0,
+                0.0,
             )
+        )
 
-            if theta > 0.0:
-                # Temperature of outgoing flows is equal to mixing temperature
-                # At theta zero this is implied by the bounds on temperature.
-                constraints.append((ca.vertcat(*t_out_conn) / t_nominal, 0.0, 0.0))
+        if theta > 0.0:
+            # Temperature of outgoing flows is equal to mixing temperature
+            # At theta zero this is implied by the bounds on temperature.
+            conn_inds, time_inds = np.nonzero(node_out)
+            if len(conn_inds) > 0:
+                node_inds = conn_node[conn_inds] * n_times + time_inds
+                t_out_conn = (
+                    conn_t[(conn_inds * n_times + time_inds).tolist()]
+                    - temperature_node_sym[node_inds.tolist()]
+                )
+                constraints.append((t_out_conn / t_nominal_vec[node_inds], 0.0, 0.0))
 
         return constraints
 
@@ -1246,5 +1354,9 @@ class QTHMixin(_HeadLossMixin, BaseComponentTypeMixin, CollocatedIntegratedOptim
 
     def homotopy_options(self):
         options = super().homotopy_options()
-        options["delta_theta_min"] = 1.0
+        if not isinstance(self, HomotopyContinuationMixin):
+            # Only solve the linear and the fully nonlinear problem. The
+            # continuation engine instead chooses the intermediate steps
+            # itself.
+            options["delta_theta_min"] = 1.0
         return options
@@ -0,0 +1,366 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import casadi as ca
+
+import numpy as np
+
+from rtctools._internal.alias_tools import AliasDict
+from rtctools.optimization.optimization_problem import OptimizationProblem
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+@dataclass(frozen=True)
+class ScalingEntry:
+    """
+    Magnitude of the nonzero Jacobian entries of a single constraint (row), or
+    of all the collocation points of a single variable (column).
+    """
+
+    name: str
+    component: str
+    min_abs: float
+    max_abs: float
+
+    @property
+    def badness(self) -> float:
+        """
+        Number of decades that the entry furthest away from one is off.
+        """
+        return max(abs(np.log10(self.min_abs)), abs(np.log10(self.max_abs)))
+
+
+@dataclass(frozen=True)
+class ScalingReport:
+    n_rows: int
+    n_columns: int
+    n_nonzeros: int
+    min_abs: float
+    max_abs: float
+    rows: Tuple[ScalingEntry, ...]
+    columns: Tuple[ScalingEntry, ...]
+    components: Dict[str, Tuple[float, float]]
+
+    def __str__(self):
+        lines = [
+            f"Jacobian of {self.n_rows} x {self.n_columns} with {self.n_nonzeros} nonzeros, "
+            f"absolute values in [{self.min_abs:.2e}, {self.max_abs:.2e}]",
+            "Worst scaled constraints:",
+            *(
+                f"  {e.name:<12} {e.component:<30} [{e.min_abs:.2e}, {e.max_abs:.2e}]"
+                for e in self.rows
+            ),
+            "Worst scaled variables:",
+            *(f"  {e.name:<43} [{e.min_abs:.2e}, {e.max_abs:.2e}]" for e in self.columns),
+            "Per component:",
+            *(f"  {c:<43} [{lo:.2e}, {hi:.2e}]" for c, (lo, hi) in sorted(self.components.items())),
+        ]
+        return "\n".join(lines)
+
+
+def _power_of_two(x: np.ndarray, max_exponent: int = 20) -> np.ndarray:
+    return np.exp2(np.clip(np.round(np.log2(x)), -max_exponent, max_exponent))
+
+
+class ScalingAnalysisMixin(OptimizationProblem):
+    """
+    Analyzes the scaling of the transcribed problem, by evaluating the
+    Jacobian of the constraints at the seed. Optionally, the nominals of the
+    variables and scale factors of the constraints are tuned based on this
+    analysis.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.__tuned_nominals = None
+        self.__scaling_report = None
+
+    def scaling_options(self):
+        r"""
+        Returns a dictionary of options controlling the scaling analysis.
+
+        +------------------------+-----------+---------------+
+        | Option                 | Type      | Default value |
+        +========================+===========+===============+
+        | ``analyze``            | ``bool``  | ``False``     |
+        +------------------------+-----------+---------------+
+        | ``report_size``        | ``int``   | ``10``        |
+        +------------------------+-----------+---------------+
+        | ``tune_nominals``      | ``bool``  | ``False``     |
+        +------------------------+-----------+---------------+
+        | ``scale_constraints``  | ``bool``  | ``False``     |
+        +------------------------+-----------+---------------+
+        | ``equilibration_iter`` | ``int``   | ``5``         |
+        +------------------------+-----------+---------------+
+
+        When ``analyze`` is True, a :py:class:`ScalingReport` is made of
+        every transcription and logged. It lists the ``report_size`` worst
+        scaled constraints and variables, and the range of the Jacobian
+        entries per component. The most recent report is available as
+        :py:attr:`scaling_report`.
+
+        When ``tune_nominals`` is True, the nominals of all continuous
+        variables with a scalar nominal are tuned once, at the first
+        transcription of the problem. The Jacobian is equilibrated with
+        ``equilibration_iter`` iterations of alternating row and column
+        scaling, where all collocation points of a variable share a single
+        scale factor. The nominals are rounded to a power of two, and stay
+        fixed afterwards, such that results of previous priorities and
+        homotopy steps remain consistent.
+
+        When ``scale_constraints`` is True, every constraint is divided by
+        the largest absolute value in its row of the Jacobian, rounded to a
+        power of two. This is done on every transcription.
+
+        :returns: A dictionary of scaling options.
+        """
+
+        options = {}
+
+        options["analyze"] = False
+        options["report_size"] = 10
+        options["tune_nominals"] = False
+        options["scale_constraints"] = False
+        options["equilibration_iter"] = 5
+
+        return options
+
+    @property
+    def scaling_report(self) -> Optional[ScalingReport]:
+        """
+        The scaling report of the most recent transcription.
+        """
+        return self.__scaling_report
+
+    def variable_nominal(self, variable):
+        if self.__tuned_nominals:
+            try:
+                return self.__tuned_nominals[variable]
+            except KeyError:
+                pass
+        return super().variable_nominal(variable)
+
+    def solver_options(self):
+        options = super().solver_options()
+
+        scaling_options = self.scaling_options()
+        if options["solver"] == "ipopt" and (
+            scaling_options["tune_nominals"] or scaling_options["scale_constraints"]
+        ):
+            # The violation variables of goal programming are bounded
+            # between 0 and 1, and end up slightly outside of that interval
+            # more easily when they are (re)scaled. That leads to inconsistent
+            # goal programming constraints at the next priority.
+            ipopt_options = options.setdefault("ipopt", {})
+            ipopt_options["honor_original_bounds"] = "yes"
+
+        return options
+
+    def transcribe(self):
+        options = self.scaling_options()
+
+        discrete, lbx, ubx, lbg, ubg, x0, nlp = super().transcribe()
+
+        if not (options["analyze"] or options["tune_nominals"] or options["scale_constraints"]):
+            return discrete, lbx, ubx, lbg, ubg, x0, nlp
+
+        if options["tune_nominals"] and self.__tuned_nominals is None:
+            rows, cols, values = self.__jacobian_entries(nlp, x0)
+            self.__tuned_nominals = self.__tune_nominals(
+                rows, cols, values, nlp["g"].size1(), discrete, options["equilibration_iter"]
+            )
+
+            # The transcription of the problem depends on the nominals in
+            # many places, so we have to redo it.
+            discrete, lbx, ubx, lbg, ubg, x0, nlp = super().transcribe()
+
+        rows, cols, values = self.__jacobian_entries(nlp, x0)
+        n_rows = nlp["g"].size1()
+
+        if options["analyze"]:
+            self.__scaling_report = self.__analyze(
+                rows, cols, values, n_rows, nlp["x"].size1(), options["report_size"]
+            )
+            logger.info(f"Scaling analysis of the transcribed problem:\n{self.__scaling_report}")
+
+        if options["scale_constraints"] and n_rows > 0:
+            row_max = np.zeros(n_rows)
+            np.maximum.at(row_max, rows, values)
+            row_max[row_max == 0.0] = 1.0
+            scale = 1.0 / _power_of_two(row_max)
+
+            lbg = np.array(ca.veccat(*lbg)).ravel() * scale
+            ubg = np.array(ca.veccat(*ubg)).ravel() * scale
+            nlp = {**nlp, "g": nlp["g"] * ca.DM(scale)}
+
+            lbg, ubg = list(lbg), list(ubg)
+
+        return discrete, lbx, ubx, lbg, ubg, x0, nlp
+
+    def __jacobian_entries(self, nlp, x0):
+        """
+        Absolute values of the nonzero entries of the constraint Jacobian,
+        evaluated at the seed.
+        """
+        jac = ca.Function("jac_g", [nlp["x"]], [ca.jacobian(nlp["g"], nlp["x"])])
+        jac_x0 = jac(x0)
+
+        rows, cols = jac_x0.sparsity().get_triplet()
+        rows = np.array(rows, dtype=int)
+        cols = np.array(cols, dtype=int)
+        values = np.abs(np.array(jac_x0.nonzeros()))
+
+        nonzero = (values > 0.0) & np.isfinite(values)
+        return rows[nonzero], cols[nonzero], values[nonzero]
+
+    def __column_variables(self, n_columns):
+        """
+        The (canonical) variable name of every column of the Jacobian.
+        """
+        names = np.full(n_columns, "", dtype=object)
+
+        variables = [
+            *self.controls,
+            *self.differentiated_states,
+            *self.algebraic_states,
+            *(v.name() for v in self.extra_variables),
+            *(v.name() for v in self.path_variables),
+        ]
+        if not variables:
+            return names
+
+        x = self.solver_input
+        for ensemble_member in range(self.ensemble_size):
+            # The state vector of a variable is a selection of the solver
+            # input, so evaluating it at the column numbers gives its columns.
+            state_vectors = [self.state_vector(v, ensemble_member) for v in variables]
+            columns = ca.Function("columns", [x], [ca.vertcat(*state_vectors)])
+            columns = np.array(columns(np.arange(n_columns))).ravel().astype(int)
+
+            sizes = [sv.numel() for sv in state_vectors]
+            names[columns] = np.repeat(np.array(variables, dtype=object), sizes)
+
+        return names
+
+    def __tune_nominals(self, rows, cols, values, n_rows, discrete, n_iter):
+        n_columns = len(discrete)
+        names = self.__column_variables(n_columns)
+
+        # All collocation points (and ensemble members) of a variable share
+        # the same scale factor. Discrete variables, and variables of which
+        # the nominal is not a scalar, keep their nominal.
+        variables = []
+        group_ids = {}
+        column_group = np.full(n_columns, -1, dtype=int)
+
+        for j, variable in enumerate(names):
+            if not variable or discrete[j]:
+                continue
+            if not np.isscalar(super().variable_nominal(variable)):
+                continue
+            try:
+                column_group[j] = group_ids[variable]
+            except KeyError:
+                column_group[j] = group_ids[variable] = len(variables)
+                variables.append(variable)
+
+        n_groups = len(variables)
+
+        log_values = np.log2(values)
+        log_row = np.zeros(n_rows)
+        log_group = np.zeros(n_groups + 1)
+
+        entry_group = column_group[cols]
+        entry_group[entry_group < 0] = n_groups
+        group_count = np.bincount(entry_group, minlength=n_groups + 1)
+        group_count[group_count == 0] = 1
+
+        for _ in range(n_iter):
+            # Row scaling, based on the largest entry per row
+            scaled = log_values + log_row[rows] + log_group[entry_group]
+            row_max = np.full(n_rows, -np.inf)
+            np.maximum.at(row_max, rows, scaled)
+            row_max[~np.isfinite(row_max)] = 0.0
+            log_row -= row_max
+
+            # Column scaling, based on the mean (in the log domain) over all
+            # entries of a variable, such that no single large entry dictates
+            # the nominal.
+            scaled = log_values + log_row[rows] + log_group[entry_group]
+            log_group -= (
+                np.bincount(entry_group, weights=scaled, minlength=n_groups + 1) / group_count
+            )
+            log_group[n_groups] = 0.0
+
+        factors = _power_of_two(np.exp2(log_group[:n_groups]))
+
+        nominals = AliasDict(self.alias_relation, signed_values=False)
+        n_changed = 0
+        for variable, factor in zip(variables, factors):
+            nominals[variable] = super().variable_nominal(variable) * factor
+            n_changed += factor != 1.0
+
+        logger.info(f"Tuned the nominals of {n_changed} out of {n_groups} variables.")
+
+        return nominals
+
+    def __analyze(self, rows, cols, values, n_rows, n_columns, report_size):
+        names = self.__column_variables(n_columns).astype(str)
+        variables, column_variable = np.unique(names, return_inverse=True)
+        components = np.array([v.split(".", 1)[0] for v in variables], dtype=object)
+
+        def _ranges(ids, n):
+            lo = np.full(n, np.inf)
+            hi = np.zeros(n)
+            np.minimum.at(lo, ids, values)
+            np.maximum.at(hi, ids, values)
+            return lo, hi
+
+        def _worst(lo, hi):
+            candidates = np.flatnonzero(hi > 0.0)
+            badness = np.maximum(np.abs(np.log10(lo[candidates])), np.abs(np.log10(hi[candidates])))
+            return candidates[np.argsort(-badness, kind="stable")[:report_size]]
+
+        # Row statistics. Every row is attributed to the component of the
+        # variable with the largest coefficient in that row.
+        row_min, row_max = _ranges(rows, n_rows)
+
+        order = np.lexsort((-values, rows))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = rows[order][1:] != rows[order][:-1]
+        row_component = np.zeros(n_rows, dtype=int)
+        row_component[rows[order][first]] = column_variable[cols[order][first]]
+
+        row_entries = tuple(
+            ScalingEntry(f"g[{i}]", components[row_component[i]], row_min[i], row_max[i])
+            for i in _worst(row_min, row_max)
+        )
+
+        # Column statistics, aggregated over all collocation points of a variable
+        var_min, var_max = _ranges(column_variable[cols], len(variables))
+
+        column_entries = tuple(
+            ScalingEntry(variables[i], components[i], var_min[i], var_max[i])
+            for i in _worst(var_min, var_max)
+        )
+
+        # Component statistics, based on the variables of every component
+        component_range = {}
+        for c, lo, hi in zip(components, var_min, var_max):
+            if hi > 0.0:
+                c_lo, c_hi = component_range.get(c, (np.inf, 0.0))
+                component_range[c] = (min(c_lo, lo), max(c_hi, hi))
+
+        return ScalingReport(
+            n_rows,
+            n_columns,
+            len(values),
+            float(values.min()) if len(values) else 0.0,
+            float(values.max()) if len(values) else 0.0,
+            row_entries,
+            column_entries,
+            component_range,
+        )
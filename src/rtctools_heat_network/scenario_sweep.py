@@ -0,0 +1,296 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from rtctools.optimization.optimization_problem import OptimizationProblem
+from rtctools.util import run_optimization_problem
+
+from .esdl.esdl_mixin import ESDLMixin
+from .pipe_class import PipeClass
+from .util import run_heat_network_optimization
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    A variant of an optimization problem.
+
+    The `options` are overrides of the options methods of the problem, keyed
+    on the name of the method, e.g. ``{"heat_network_options":
+    {"minimum_velocity": 0.0}}``. The `parameters` override the parameters of
+    the model, and the `pipe_classes` the pipe classes of hot pipes.
+    """
+
+    name: str
+    options: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    parameters: Dict[str, Any] = field(default_factory=dict)
+    pipe_classes: Dict[str, List[PipeClass]] = field(default_factory=dict)
+
+    def columns(self) -> Dict[str, Any]:
+        """
+        The overrides of the scenario as a flat dictionary, used for the
+        columns of the table of results.
+        """
+        columns = {}
+        for method, options in self.options.items():
+            columns.update({f"{method}.{k}": v for k, v in options.items()})
+        columns.update(self.parameters)
+        for pipe, pipe_classes in self.pipe_classes.items():
+            columns[f"{pipe}.pipe_classes"] = ", ".join(c.name for c in pipe_classes)
+        return columns
+
+
+def scenario_grid(
+    options: Optional[Dict[str, Dict[str, List[Any]]]] = None,
+    parameters: Optional[Dict[str, List[Any]]] = None,
+    pipe_classes: Optional[Dict[str, List[List[PipeClass]]]] = None,
+) -> List[Scenario]:
+    """
+    All combinations of the given values of options, parameters and pipe
+    classes. For example, ``scenario_grid(parameters={"ATES.max_power": [0,
+    20e6], "Tank.volume": [0, 100, 200]})`` returns six scenarios.
+    """
+    options = options or {}
+    parameters = parameters or {}
+    pipe_classes = pipe_classes or {}
+
+    axes = [
+        *((("options", (m, k)), v) for m, o in options.items() for k, v in o.items()),
+        *((("parameters", k), v) for k, v in parameters.items()),
+        *((("pipe_classes", k), v) for k, v in pipe_classes.items()),
+    ]
+
+    scenarios = []
+
+    for i, values in enumerate(itertools.product(*(v for _, v in axes))):
+        overrides = {"options": {}, "parameters": {}, "pipe_classes": {}}
+        for ((kind, key), _), value in zip(axes, values):
+            if kind == "options":
+                method, key = key
+                overrides["options"].setdefault(method, {})[key] = value
+            else:
+                overrides[kind][key] = value
+        scenarios.append(Scenario(f"scenario_{i}", **overrides))
+
+    return scenarios
+
+
+def scenario_problem_class(problem_class, scenario: Scenario, write_output: bool = True):
+    """
+    A subclass of the optimization problem class with the overrides of the
+    scenario applied. If `write_output` is False, no output is written.
+    """
+    cls = None
+
+    def options_method(method, overrides):
+        def options(self, *args, **kwargs):
+            options = getattr(super(cls, self), method)(*args, **kwargs)
+            options.update(overrides)
+            return options
+
+        return options
+
+    namespace = {m: options_method(m, o) for m, o in scenario.options.items()}
+
+    if scenario.parameters:
+
+        def parameters(self, ensemble_member):
+            parameters = super(cls, self).parameters(ensemble_member)
+            for k, v in scenario.parameters.items():
+                parameters[k] = v
+            return parameters
+
+        namespace["parameters"] = parameters
+
+    if scenario.pipe_classes:
+
+        def pipe_classes(self, pipe):
+            try:
+                return scenario.pipe_classes[pipe]
+            except KeyError:
+                return super(cls, self).pipe_classes(pipe)
+
+        namespace["pipe_classes"] = pipe_classes
+
+    if not write_output:
+
+        def write(self):
+            pass
+
+        namespace["write"] = write
+
+    if issubclass(problem_class, ESDLMixin):
+        namespace["esdl_share_parsed_assets"] = True
+
+    cls = type(problem_class.__name__, (problem_class,), namespace)
+    cls.__qualname__ = f"{problem_class.__qualname__}[{scenario.name}]"
+
+    return cls
+
+
+def default_kpis(*problems: OptimizationProblem) -> Dict[str, Any]:
+    """
+    The objective value and solver status of the last solved problem.
+    """
+    problem = problems[-1]
+    return {
+        "objective": float(problem.objective_value),
+        "success": bool(problem.solver_stats["success"]),
+    }
+
+
+@dataclass(frozen=True)
+class _Sweep:
+    problem_classes: Tuple[type, ...]
+    scenarios: Tuple[Scenario, ...]
+    kpis: Callable[..., Dict[str, Any]]
+    output_folder: Optional[str]
+    log_level: int
+    kwargs: Dict[str, Any]
+
+
+# The sweep that is run by the worker processes. With the fork start method,
+# it is inherited from the parent process and never pickled.
+_sweep: Optional[_Sweep] = None
+
+
+def _init_worker(sweep: _Sweep):
+    global _sweep
+    _sweep = sweep
+
+
+def _run_scenario(index: int) -> Tuple[Dict[str, Any], Optional[str]]:
+    sweep = _sweep
+    scenario = sweep.scenarios[index]
+
+    kwargs = dict(sweep.kwargs)
+    if sweep.output_folder is not None:
+        output_folder = Path(sweep.output_folder) / scenario.name
+        output_folder.mkdir(parents=True, exist_ok=True)
+        kwargs["output_folder"] = str(output_folder)
+
+    classes = [
+        scenario_problem_class(c, scenario, sweep.output_folder is not None)
+        for c in sweep.problem_classes
+    ]
+
+    try:
+        if len(classes) == 1:
+            problems = (run_optimization_problem(classes[0], log_level=sweep.log_level, **kwargs),)
+        else:
+            problems = run_heat_network_optimization(*classes, log_level=sweep.log_level, **kwargs)
+        return sweep.kpis(*problems), None
+    except Exception:
+        return {}, traceback.format_exc()
+
+
+def run_scenarios(
+    heat_class,
+    scenarios: List[Scenario],
+    qth_class=None,
+    kpis: Callable[..., Dict[str, Any]] = default_kpis,
+    max_workers: Optional[int] = None,
+    base_folder: str = "..",
+    output_folder: Optional[str] = None,
+    log_level: int = logging.WARNING,
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Solves every scenario in a pool of processes, and collects the key
+    performance indicators of the scenarios in a single table.
+
+    Every scenario is solved with :py:func:`run_optimization_problem`, or
+    with :py:func:`run_heat_network_optimization` if a `qth_class` is given.
+    The `kpis` function is called with the solved problem(s) of a scenario
+    in the worker process, and should return a dictionary of values that can
+    be pickled, e.g. floats. The table has a row per scenario, with the
+    overrides of the scenario, the KPIs and the error of scenarios that
+    failed.
+
+    Before starting the pool, the first scenario of `heat_class` is set up in
+    this process, such that the ESDL file is parsed, and a Modelica model is
+    compiled to its cache (see :py:class:`ModelicaCacheMixin`), only once.
+    Where available, the worker processes are forked and share the parsed
+    ESDL assets with this process. Every worker still builds the model of
+    its own problems, e.g. loading a compiled Modelica model from the cache.
+
+    No output is written, unless an `output_folder` is given. The output of
+    every scenario is then written to a subfolder named after the scenario.
+
+    :param heat_class: The optimization problem class to solve.
+    :param scenarios: The scenarios to solve, e.g. from :py:func:`scenario_grid`.
+    :param qth_class: The QTH problem class to solve after `heat_class`.
+    :param kpis: Function that computes the KPIs of the solved problem(s).
+    :param max_workers: The number of processes, defaults to the number of CPUs.
+    :param base_folder: Base folder, see :py:func:`run_optimization_problem`.
+    :param output_folder: The folder to write the output of all scenarios to.
+    :param log_level: The log level of the worker processes.
+
+    :returns: A DataFrame with a row per scenario.
+    """
+
+    names = [s.name for s in scenarios]
+    if len(set(names)) != len(names):
+        raise Exception("Scenario names have to be unique")
+
+    # Resolve the folders like run_optimization_problem does, so that the
+    # worker processes do not depend on the working directory or sys.path.
+    if not os.path.isabs(base_folder):
+        base_folder = os.path.join(sys.path[0], base_folder)
+    for name, subfolder in [
+        ("model_folder", "model"),
+        ("input_folder", "input"),
+        ("output_folder", "output"),
+    ]:
+        kwargs.setdefault(name, os.path.join(base_folder, subfolder))
+
+    problem_classes = (heat_class,) if qth_class is None else (heat_class, qth_class)
+
+    sweep = _Sweep(problem_classes, tuple(scenarios), kpis, output_folder, log_level, kwargs)
+
+    if scenarios:
+        try:
+            scenario_problem_class(heat_class, scenarios[0], False)(**kwargs)
+        except Exception as e:
+            # The worker that solves this scenario reports the full error
+            logger.warning(f"Could not set up scenario {scenarios[0].name}: {e}")
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(scenarios))
+
+    if max_workers <= 1:
+        _init_worker(sweep)
+        try:
+            results = [_run_scenario(i) for i in range(len(scenarios))]
+        finally:
+            _init_worker(None)
+    else:
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+
+        with ProcessPoolExecutor(
+            max_workers, mp_context=context, initializer=_init_worker, initargs=(sweep,)
+        ) as executor:
+            results = list(executor.map(_run_scenario, range(len(scenarios))))
+
+    rows = []
+    for scenario, (values, error) in zip(scenarios, results):
+        if error is not None:
+            logger.error(f"Scenario {scenario.name} failed:\n{error}")
+        rows.append({**scenario.columns(), **values, "error": error})
+
+    return pd.DataFrame(rows, index=pd.Index(names, name="scenario"))
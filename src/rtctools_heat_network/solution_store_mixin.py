@@ -0,0 +1,410 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Optional
+
+import casadi as ca
+
+import numpy as np
+
+from rtctools.optimization.optimization_problem import OptimizationProblem
+from rtctools.optimization.timeseries import Timeseries
+
+from ._cache_directory import default_cache_directory, is_private, private_directory
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+# Bump when the layout of a stored solution changes
+_STORE_FORMAT_VERSION = 1
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _seconds_since_epoch(reference_datetime: datetime.datetime, times: np.ndarray) -> np.ndarray:
+    """
+    Absolute times as seconds since the Unix epoch, such that solutions of
+    runs with a different reference datetime can be compared.
+    """
+    if reference_datetime.tzinfo is None:
+        reference_datetime = reference_datetime.replace(tzinfo=datetime.timezone.utc)
+    return (reference_datetime - _EPOCH).total_seconds() + np.asarray(times, dtype=float)
+
+
+class _StoredSolution:
+    """
+    A solution of a previous run, with the arrays memory-mapped from the
+    store such that only the values of the variables that are seeded are
+    read from disk.
+    """
+
+    def __init__(self, folder: Path):
+        with open(folder / "solution.json") as f:
+            metadata = json.load(f)
+
+        if metadata["format"] != _STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported solution store format {metadata['format']}")
+
+        self.variables = {v: i for i, v in enumerate(metadata["variables"])}
+        self.times = np.load(folder / "times.npy", mmap_mode="r")
+        self.values = np.load(folder / "values.npy", mmap_mode="r")
+
+        self.lam_x: Optional[np.ndarray] = None
+        self.lam_g: Optional[np.ndarray] = None
+        if metadata["duals"]:
+            self.lam_x = np.load(folder / "lam_x.npy", mmap_mode="r")
+            self.lam_g = np.load(folder / "lam_g.npy", mmap_mode="r")
+
+    def values_at(self, variable: str, ensemble_member: int, times: np.ndarray):
+        """
+        The values of a variable interpolated to the given absolute times.
+        Values before the first and after the last stored time are held
+        constant, which amounts to shifting the solution in time.
+        """
+        ensemble_member = min(ensemble_member, self.values.shape[0] - 1)
+        values = self.values[ensemble_member, self.variables[variable]]
+        if not np.all(np.isfinite(values)):
+            return None
+        return np.interp(times, self.times, values)
+
+
+class _FirstSolveSolver:
+    """
+    Wraps the solver of the first solve of a run, to pass the multipliers of
+    the same solve in the previous run as initial dual values, and to keep
+    the multipliers of this solve for the next run.
+    """
+
+    def __init__(self, solver, on_solve: Callable, lam_x0=None, lam_g0=None):
+        self._solver = solver
+        self._on_solve = on_solve
+        self._lam_x0 = lam_x0
+        self._lam_g0 = lam_g0
+
+    def __call__(self, **kwargs):
+        if self._lam_x0 is not None:
+            kwargs["lam_x0"] = self._lam_x0
+            kwargs["lam_g0"] = self._lam_g0
+
+        results = self._solver(**kwargs)
+        self._on_solve(results, self._solver.stats())
+
+        return results
+
+    def stats(self):
+        return self._solver.stats()
+
+
+class SolutionStoreMixin(OptimizationProblem):
+    """
+    Keeps the solution of every run of a problem on disk, and seeds the next
+    run of the same problem with it, e.g. for daily runs of the same network
+    with updated forecasts.
+
+    The results of all time dependent variables, including the auxiliary
+    variables of goals, are stored per ensemble member against absolute
+    time, and interpolated to the times of the next run. Only the first
+    solve of a run is seeded from the store. Subsequent solves, e.g. of the
+    next priority or homotopy step, are seeded from the solution of the
+    previous solve as usual.
+
+    For mixed integer problems solved with CBC, the seed is passed as
+    initial solution (``hot_start``). The values of discrete variables are
+    rounded, but a shifted solution may still be infeasible, in which case
+    CBC ignores it.
+
+    For IPOPT, the multipliers of the first solve are stored as well. They
+    are only passed to the solver when the next run has exactly the same
+    relative time grid and NLP dimensions, as the multipliers of the
+    constraints cannot be mapped to other times.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.__stored_solution: Optional[_StoredSolution] = None
+        self.__seeded = False
+        self.__solved = False
+        self.__first_solve_duals = None
+
+    def solution_store_options(self):
+        r"""
+        Returns a dictionary of options controlling the solution store.
+
+        +------------------+----------+---------------+
+        | Option           | Type     | Default value |
+        +==================+==========+===============+
+        | ``enabled``      | ``bool`` | ``True``      |
+        +------------------+----------+---------------+
+        | ``directory``    | ``str``  | ``None``      |
+        +------------------+----------+---------------+
+        | ``key``          | ``str``  | ``None``      |
+        +------------------+----------+---------------+
+        | ``seed``         | ``bool`` | ``True``      |
+        +------------------+----------+---------------+
+
+        Solutions are kept in ``directory``, which defaults to a folder in the
+        cache directory of the user (``$XDG_CACHE_HOME`` or ``~/.cache``), in
+        a subfolder per ``key``. The
+        key defaults to the name of the problem class and a hash of the
+        names of its free variables, such that different networks solved
+        with the same class do not share a solution. When ``seed`` is False,
+        solutions are stored but not used. Solutions are neither stored in,
+        nor loaded from, a directory that can be written by other users.
+
+        :returns: A dictionary of solution store options.
+        """
+
+        options = {}
+
+        options["enabled"] = True
+        options["directory"] = None
+        options["key"] = None
+        options["seed"] = True
+
+        return options
+
+    @property
+    def solution_store_path(self) -> Path:
+        """
+        The folder in which the solution of this problem is stored.
+        """
+        options = self.solution_store_options()
+
+        key = options["key"]
+        if key is None:
+            h = hashlib.sha1()
+            for v in sorted(v.name() for v in self.dae_variables["free_variables"]):
+                h.update(v.encode())
+                h.update(b"\0")
+            key = f"{type(self).__name__}_{h.hexdigest()}"
+
+        root = Path(options["directory"] or default_cache_directory("solutions"))
+        return root / key
+
+    @property
+    def seeded_from_store(self) -> bool:
+        """
+        Whether the first solve of the last run was seeded from a stored
+        solution.
+        """
+        return self.__seeded
+
+    def __absolute_times(self) -> np.ndarray:
+        return _seconds_since_epoch(self.io.reference_datetime, self.times())
+
+    def pre(self):
+        super().pre()
+
+        self.__stored_solution = None
+        self.__seeded = False
+        self.__solved = False
+        self.__first_solve_duals = None
+
+        options = self.solution_store_options()
+        if not options["enabled"] or not options["seed"]:
+            return
+
+        folder = self.solution_store_path
+        if not (folder / "solution.json").exists():
+            return
+
+        try:
+            if not (is_private(folder.parent) and is_private(folder)):
+                logger.warning(
+                    f"Not loading stored solution from '{folder}', as it is not owned by the "
+                    f"current user or writable by others"
+                )
+                return
+            self.__stored_solution = _StoredSolution(folder)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load stored solution from '{folder}': {e}")
+        else:
+            logger.debug(f"Loaded stored solution from '{folder}'")
+
+    def seed(self, ensemble_member):
+        seed = super().seed(ensemble_member)
+
+        stored = self.__stored_solution
+        if stored is None or self.__solved:
+            return seed
+
+        times = self.times()
+        absolute_times = self.__absolute_times()
+
+        for variable in stored.variables:
+            values = stored.values_at(variable, ensemble_member, absolute_times)
+            if values is None:
+                continue
+            if self.variable_is_discrete(variable):
+                values = np.round(values)
+
+            seed[variable] = Timeseries(times, values)
+
+        self.__seeded = True
+
+        return seed
+
+    def solver_options(self):
+        options = super().solver_options()
+
+        if self.__solved or not self.solution_store_options()["enabled"]:
+            return options
+
+        solver_name = options["solver"]
+        if self.__seeded and solver_name == "cbc":
+            options["hot_start"] = True
+
+        casadi_solver = options["casadi_solver"]
+        if isinstance(casadi_solver, str):
+            casadi_solver = getattr(ca, casadi_solver)
+
+        lam_x0, lam_g0 = None, None
+        if self.__seeded and solver_name == "ipopt":
+            lam_x0, lam_g0 = self.__stored_duals()
+
+        def _first_solve_solver(name, solver, nlp, nlpsol_options):
+            warm_start = (None, None)
+            if (
+                lam_x0 is not None
+                and len(lam_x0) == nlp["x"].size1()
+                and len(lam_g0) == nlp["g"].size1()
+            ):
+                logger.debug("Warm starting with the multipliers of the stored solution")
+                warm_start = (lam_x0, lam_g0)
+
+                ipopt_options = nlpsol_options.get("ipopt", {}).copy()
+                ipopt_options["warm_start_init_point"] = "yes"
+                ipopt_options["warm_start_bound_push"] = 1e-5
+                ipopt_options["warm_start_slack_bound_push"] = 1e-5
+                ipopt_options["warm_start_mult_bound_push"] = 1e-5
+                nlpsol_options = {**nlpsol_options, "ipopt": ipopt_options}
+
+            return _FirstSolveSolver(
+                casadi_solver(name, solver, nlp, nlpsol_options),
+                self.__on_solve if solver_name == "ipopt" else self.__on_solve_without_duals,
+                *warm_start,
+            )
+
+        options["casadi_solver"] = _first_solve_solver
+
+        return options
+
+    def __stored_duals(self):
+        stored = self.__stored_solution
+        if stored.lam_x is None:
+            return None, None
+
+        # The multipliers of the constraints are only meaningful for the
+        # same constraints at the same times.
+        absolute_times = self.__absolute_times()
+        relative_times = absolute_times - absolute_times[0]
+        stored_relative_times = stored.times - stored.times[0]
+        if len(relative_times) != len(stored_relative_times) or not np.array_equal(
+            relative_times, stored_relative_times
+        ):
+            return None, None
+
+        return np.array(stored.lam_x), np.array(stored.lam_g)
+
+    def __on_solve_without_duals(self, results, stats):
+        self.__solved = True
+
+    def __on_solve(self, results, stats):
+        self.__solved = True
+        if stats.get("success", False):
+            self.__first_solve_duals = (
+                np.array(results["lam_x"]).ravel(),
+                np.array(results["lam_g"]).ravel(),
+            )
+
+    def post(self):
+        super().post()
+
+        if not self.solution_store_options()["enabled"]:
+            return
+
+        if not self.solver_stats.get("success", False):
+            logger.info("Not storing the solution, as the last solve failed")
+            return
+
+        folder = self.solution_store_path
+
+        # Storing the solution is best effort, and never fails a run
+        try:
+            if not private_directory(folder.parent):
+                logger.warning(
+                    f"Not storing the solution in '{folder}', as '{folder.parent}' is not "
+                    f"owned by the current user or writable by others"
+                )
+                return
+            self.__write_solution(folder)
+        except OSError as e:
+            logger.warning(f"Could not store solution in '{folder}': {e}")
+
+    def __write_solution(self, folder: Path):
+        n_times = len(self.times())
+        variables = [k for k, v in self.extract_results().items() if np.size(v) == n_times]
+
+        build_folder = Path(tempfile.mkdtemp(prefix=f".{folder.name}_", dir=folder.parent))
+
+        try:
+            np.save(build_folder / "times.npy", self.__absolute_times())
+
+            values = np.lib.format.open_memmap(
+                build_folder / "values.npy",
+                mode="w+",
+                dtype=float,
+                shape=(self.ensemble_size, len(variables), n_times),
+            )
+            values[...] = np.nan
+            for ensemble_member in range(self.ensemble_size):
+                results = self.extract_results(ensemble_member)
+                for i, v in enumerate(variables):
+                    result = np.ravel(results.get(v, np.nan))
+                    if len(result) == n_times:
+                        values[ensemble_member, i] = result
+            values.flush()
+            del values
+
+            duals = self.__first_solve_duals
+            if duals is not None:
+                np.save(build_folder / "lam_x.npy", duals[0])
+                np.save(build_folder / "lam_g.npy", duals[1])
+
+            with open(build_folder / "solution.json", "w") as f:
+                json.dump(
+                    {
+                        "format": _STORE_FORMAT_VERSION,
+                        "variables": variables,
+                        "duals": duals is not None,
+                    },
+                    f,
+                )
+
+            # Move the previous solution out of the way first, as a folder
+            # cannot be replaced by another one.
+            previous_folder = None
+            if folder.exists():
+                previous_folder = Path(
+                    tempfile.mkdtemp(prefix=f".{folder.name}_old_", dir=folder.parent)
+                )
+                os.replace(folder, previous_folder / folder.name)
+
+            try:
+                os.rename(build_folder, folder)
+            except OSError:
+                # Another process stored a solution in the meantime
+                pass
+
+            if previous_folder is not None:
+                shutil.rmtree(previous_folder, ignore_errors=True)
+        finally:
+            shutil.rmtree(build_folder, ignore_errors=True)
+
+        logger.debug(f"Stored solution in '{folder}'")
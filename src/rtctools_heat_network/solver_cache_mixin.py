@@ -0,0 +1,401 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple
+
+import casadi as ca
+
+import numpy as np
+
+from rtctools.optimization.optimization_problem import OptimizationProblem
+
+from ._cache_directory import default_cache_directory, is_private, private_directory
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+def _hash(*items: str) -> str:
+    h = hashlib.sha1()
+    for item in items:
+        h.update(item.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _options_key(options: Dict) -> str:
+    """
+    Normalized representation of solver options, which unlike their repr()
+    does not depend on e.g. the order of the keys or memory addresses.
+
+    :raises TypeError: If an option is not a plain value, e.g. a callback.
+    """
+
+    def _normalize(v):
+        if isinstance(v, dict):
+            return {str(k): _normalize(x) for k, x in v.items()}
+        elif isinstance(v, (list, tuple)):
+            return [_normalize(x) for x in v]
+        elif isinstance(v, (np.ndarray, np.generic)):
+            return v.tolist()
+        elif v is None or isinstance(v, (str, bool, int, float)):
+            return v
+        else:
+            raise TypeError(f"Cannot hash option value of type {type(v).__name__}")
+
+    return json.dumps(_normalize(options), sort_keys=True)
+
+
+def _parametric_nlp(nlp: Dict[str, ca.MX]) -> Tuple[Dict[str, ca.MX], np.ndarray]:
+    """
+    The NLP with all numerical constants in its expression graph, e.g. the
+    values of bounds on goals, parameters and time series, replaced by the
+    entries of the NLP parameter vector ``p``, and the values of those
+    constants. NLPs that only differ in these values have the same
+    parametric NLP.
+
+    Constants inside the functions that the NLP calls, e.g. the collocated
+    model equations, are not replaced, and are therefore part of the
+    structure of the NLP.
+
+    :raises TypeError: If the NLP is not an MX graph, or already has
+        parameters.
+    """
+    if "p" in nlp or not all(isinstance(nlp[k], ca.MX) for k in ["x", "f", "g"]):
+        raise TypeError("Only NLPs of MX expressions without parameters are supported")
+
+    function = ca.Function("nlp", [nlp["x"]], [nlp["f"], nlp["g"]])
+    constants = [
+        function.instruction_MX(k)
+        for k in range(function.n_instructions())
+        if function.instruction_id(k) == ca.OP_CONST
+    ]
+
+    p = ca.MX.sym("p", sum(c.nnz() for c in constants))
+
+    offset = 0
+    parameters = []
+    for c in constants:
+        parameters.append(ca.MX(c.sparsity(), p[offset : offset + c.nnz()]))
+        offset += c.nnz()
+
+    f, g = ca.graph_substitute([nlp["f"], nlp["g"]], constants, parameters)
+    values = np.concatenate([np.zeros(0), *(np.array(ca.evalf(c).nonzeros()) for c in constants)])
+
+    return {"x": nlp["x"], "p": p, "f": f, "g": g}, values
+
+
+def _structure_hash(nlp: Dict[str, ca.MX]) -> str:
+    """
+    Hash of the serialized expressions of a parametric NLP. Serialization is
+    deterministic, so equal hashes mean that the NLPs have the same
+    variables, sparsity and expression graph, and therefore also the same
+    network topology and time grid. Only the values of the parameters can
+    differ.
+    """
+    function = ca.Function("nlp", [nlp["x"], nlp["p"]], [nlp["f"], nlp["g"]])
+    return _hash(function.serialize())
+
+
+class _ParametricSolver:
+    """
+    Calls a solver of a parametric NLP with the values of its parameters.
+    """
+
+    def __init__(self, solver: ca.Function, p: np.ndarray):
+        self._solver = solver
+        self._p = p
+
+    def __call__(self, **kwargs):
+        return self._solver(p=self._p, **kwargs)
+
+    def stats(self):
+        return self._solver.stats()
+
+
+# Constructed solvers of parametric NLPs, keyed on the solver, its options
+# and the structure hash of the NLP. Shared between all problems in the
+# process, with the least recently used entries evicted first.
+_SOLVER_CACHE: "OrderedDict[str, ca.Function]" = OrderedDict()
+
+
+# Functions of an IPOPT solver that are evaluated in every iteration, and
+# which are passed to the solver as options when loading them from a library.
+_COMPILED_FUNCTIONS = {
+    "nlp_grad_f": "grad_f",
+    "nlp_jac_g": "jac_g",
+    "nlp_hess_l": "hess_lag",
+}
+
+
+def _compile_solver_functions(
+    solver: ca.Function, library: Path, compiler: str, flags: Tuple[str, ...]
+) -> None:
+    """
+    Generate C code for the NLP oracle and derivative functions of `solver`,
+    and compile them into the shared library `library`.
+    """
+    oracle = solver.oracle()
+
+    # The derivatives of the oracle are looked up by name when loading it as
+    # an external function, e.g. for the final evaluation of the multipliers.
+    generator = ca.CodeGenerator(f"{library.stem}.c")
+    generator.add(oracle)
+    generator.add(oracle.reverse(1))
+    generator.add(oracle.jacobian())
+    for name in _COMPILED_FUNCTIONS:
+        if name in solver.get_function():
+            generator.add(solver.get_function(name))
+
+    with tempfile.TemporaryDirectory(dir=library.parent) as build_dir:
+        generator.generate(f"{build_dir}{os.sep}")
+
+        # Compile to a temporary file first, such that other processes never
+        # load a partially written library.
+        tmp_library = Path(build_dir) / library.name
+        subprocess.run(
+            [compiler, *flags, "-fPIC", "-shared", f"{library.stem}.c", "-o", str(tmp_library)],
+            cwd=build_dir,
+            check=True,
+            capture_output=True,
+        )
+        os.chmod(tmp_library, 0o700)
+        os.replace(tmp_library, library)
+
+
+def _load_compiled_solver(
+    name: str, solver: str, library: Path, nlpsol_options: Dict
+) -> ca.Function:
+    library = str(library)
+
+    options = nlpsol_options.copy()
+    for function_name, option in _COMPILED_FUNCTIONS.items():
+        try:
+            options[option] = ca.external(function_name, library)
+        except RuntimeError:
+            # E.g. no Hessian when using a quasi-Newton approximation
+            pass
+
+    # The oracle of CasADi's NLP solvers is always called "nlp"
+    return ca.nlpsol(name, solver, ca.external("nlp", library), options)
+
+
+def _prune_libraries(directory: Path, max_libraries: int) -> None:
+    """
+    Removes the least recently used libraries in `directory`, such that at
+    most `max_libraries` remain. Libraries are touched when loaded, so their
+    modification time is the time they were last used.
+    """
+    libraries = []
+    for library in directory.glob("nlp_*.so"):
+        try:
+            libraries.append((library.stat().st_mtime, library))
+        except OSError:
+            # E.g. removed by another process in the meantime
+            pass
+
+    libraries.sort(reverse=True)
+    for _, library in libraries[max_libraries:]:
+        logger.debug(f"Removing least recently used NLP functions '{library}'")
+        try:
+            library.unlink()
+        except OSError:
+            pass
+
+
+class SolverCacheMixin(OptimizationProblem):
+    """
+    Reuses the CasADi solvers of NLPs with the same structure, e.g. for daily
+    runs of the same network with updated forecasts, or the solves of the
+    different priorities of such runs.
+
+    The transcribed NLP contains the values of e.g. bounds on goals,
+    parameters and time series as constants. These are replaced by NLP
+    parameters, such that NLPs of the same network, options and time grid
+    have the same expressions, and only differ in the values of the
+    parameters. Solvers are looked up by a hash of these expressions and the
+    solver options. A cached solver skips the construction of the solver,
+    i.e. the derivatives of the NLP and their sparsity patterns, but the
+    problem is still transcribed to determine the values of the parameters.
+
+    Optionally, the functions that IPOPT evaluates in every iteration are
+    compiled to a shared library, which is stored on disk and reused by
+    other processes.
+
+    Only solvers constructed with ``nlpsol`` or ``qpsol`` are cached, so this
+    mixin has to come after mixins that wrap the solver, e.g.
+    :py:class:`HomotopyContinuationMixin`, in the list of base classes.
+    """
+
+    def solver_cache_options(self):
+        r"""
+        Returns a dictionary of options controlling the solver cache.
+
+        +-------------------+----------+---------------+
+        | Option            | Type     | Default value |
+        +===================+==========+===============+
+        | ``enabled``       | ``bool`` | ``True``      |
+        +-------------------+----------+---------------+
+        | ``max_entries``   | ``int``  | ``16``        |
+        +-------------------+----------+---------------+
+        | ``compile``       | ``bool`` | ``False``     |
+        +-------------------+----------+---------------+
+        | ``directory``     | ``str``  | ``None``      |
+        +-------------------+----------+---------------+
+        | ``compiler``      | ``str``  | ``cc``        |
+        +-------------------+----------+---------------+
+        | ``flags``         | ``list`` | ``["-O1"]``   |
+        +-------------------+----------+---------------+
+        | ``max_libraries`` | ``int``  | ``32``        |
+        +-------------------+----------+---------------+
+
+        The cache is shared by all problems in the process, and holds at most
+        ``max_entries`` solvers. The least recently used solver is evicted
+        first.
+
+        With the ``compile`` option, the NLP oracle, the gradient of the
+        objective, the Jacobian of the constraints and the Hessian of the
+        Lagrangian of IPOPT solvers are generated as C code and compiled with
+        ``compiler`` and ``flags``. The shared libraries are kept in
+        ``directory``, which defaults to a folder in the cache directory of
+        the user (``~/.cache``), and reused across processes. Like the
+        solvers, they are keyed on the structure of the NLP, so a library is
+        also reused when only the data changes. At most ``max_libraries``
+        libraries are kept, the least recently used ones are removed after
+        compiling a new one. As the libraries are loaded into the process,
+        they are only used when both the library and the directory are owned
+        by the current user and not writable by others. Compilation can take
+        considerably longer than a solve, so this is only worthwhile for
+        problems with the same structure that are solved many times. Solvers
+        of linear problems (``qpsol``) are never compiled. If compilation
+        fails, a warning is logged and the uncompiled solver is used.
+
+        :returns: A dictionary of solver cache options.
+        """
+
+        options = {}
+
+        options["enabled"] = True
+        options["max_entries"] = 16
+        options["compile"] = False
+        options["directory"] = None
+        options["compiler"] = "cc"
+        options["flags"] = ["-O1"]
+        options["max_libraries"] = 32
+
+        return options
+
+    def solver_options(self):
+        options = super().solver_options()
+
+        cache_options = self.solver_cache_options()
+        if not cache_options["enabled"]:
+            return options
+
+        casadi_solver = options["casadi_solver"]
+        if isinstance(casadi_solver, str):
+            casadi_solver = getattr(ca, casadi_solver)
+
+        if casadi_solver is not ca.nlpsol and casadi_solver is not ca.qpsol:
+            return options
+
+        compile_directory = Path(cache_options["directory"] or default_cache_directory("solvers"))
+        compile_solver = cache_options["compile"] and casadi_solver is ca.nlpsol
+
+        def _cached_solver(name, solver, nlp, nlpsol_options):
+            try:
+                parametric_nlp, p = _parametric_nlp(nlp)
+                key = _hash(
+                    casadi_solver.__name__,
+                    str(compile_solver),
+                    solver,
+                    _options_key(nlpsol_options),
+                    _structure_hash(parametric_nlp),
+                )
+            except TypeError as e:
+                logger.debug(f"Not caching solver: {e}")
+                return casadi_solver(name, solver, nlp, nlpsol_options)
+
+            try:
+                result = _SOLVER_CACHE.pop(key)
+            except KeyError:
+                if compile_solver:
+                    result = self.__compiled_solver(
+                        compile_directory / f"nlp_{key}.so",
+                        cache_options,
+                        name,
+                        solver,
+                        parametric_nlp,
+                        nlpsol_options,
+                    )
+                else:
+                    result = casadi_solver(name, solver, parametric_nlp, nlpsol_options)
+            else:
+                logger.debug("Reusing cached solver")
+
+            _SOLVER_CACHE[key] = result
+            while len(_SOLVER_CACHE) > cache_options["max_entries"]:
+                _SOLVER_CACHE.popitem(last=False)
+
+            return _ParametricSolver(result, p)
+
+        options["casadi_solver"] = _cached_solver
+
+        return options
+
+    def __compiled_solver(self, library, cache_options, name, solver, nlp, nlpsol_options):
+        try:
+            trusted = private_directory(library.parent)
+        except OSError as e:
+            logger.warning(f"Cannot create folder for compiled NLP functions: {e}")
+            trusted = False
+        else:
+            if not trusted:
+                logger.warning(
+                    f"Not using compiled NLP functions, as '{library.parent}' is not "
+                    f"owned by the current user or writable by others"
+                )
+
+        if trusted and os.path.lexists(library):
+            if is_private(library):
+                logger.debug(f"Loading compiled NLP functions from '{library}'")
+                # Mark the library as recently used, see _prune_libraries()
+                try:
+                    os.utime(library)
+                except OSError:
+                    pass
+                return _load_compiled_solver(name, solver, library, nlpsol_options)
+
+            logger.warning(
+                f"Not loading compiled NLP functions from '{library}', as it is not "
+                f"owned by the current user or writable by others"
+            )
+            trusted = False
+
+        result = ca.nlpsol(name, solver, nlp, nlpsol_options)
+
+        if not trusted:
+            return result
+
+        logger.info(f"Compiling NLP functions to '{library}'")
+        try:
+            _compile_solver_functions(
+                result, library, cache_options["compiler"], tuple(cache_options["flags"])
+            )
+        except subprocess.CalledProcessError as e:
+            logger.warning(
+                f"Compilation of NLP functions failed, using uncompiled solver: "
+                f"{e.stderr.decode(errors='replace')}"
+            )
+            return result
+        except OSError as e:
+            logger.warning(f"Compilation of NLP functions failed, using uncompiled solver: {e}")
+            return result
+
+        _prune_libraries(library.parent, cache_options["max_libraries"])
+
+        return _load_compiled_solver(name, solver, library, nlpsol_options)
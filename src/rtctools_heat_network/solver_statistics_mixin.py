@@ -0,0 +1,192 @@
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rtctools.optimization.optimization_problem import OptimizationProblem
+
+logger = logging.getLogger("rtctools_heat_network")
+
+
+@dataclass(frozen=True)
+class SolveStatistics:
+    """
+    Statistics of a single solve. The `stats` are the scalar entries of the
+    CasADi solver statistics, e.g. the time spent in every function for NLP
+    solvers, or the node count for MILP solvers.
+    """
+
+    index: int
+    priority: Optional[int]
+    theta: Optional[float]
+    ensemble_size: int
+    success: bool
+    return_status: str
+    iterations: Optional[int]
+    wall_time: Optional[float]
+    function_time: Optional[float]
+    transcribe_time: float
+    n_variables: int
+    n_discrete: int
+    n_constraints: int
+    stats: Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class PrioritySummary:
+    priority: Optional[int]
+    solves: int
+    iterations: int
+    wall_time: float
+    transcribe_time: float
+
+
+def _scalar_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The entries of the solver stats that can be written to JSON. Nested
+    entries, like the iterates of IPOPT, are left out.
+    """
+    result = {}
+    for k, v in stats.items():
+        if isinstance(v, (bool, str)):
+            result[k] = v
+        elif isinstance(v, (int, np.integer)):
+            result[k] = int(v)
+        elif isinstance(v, (float, np.floating)):
+            result[k] = float(v)
+    return result
+
+
+class SolverStatisticsMixin(OptimizationProblem):
+    """
+    Collects the statistics of every solve, i.e. of every priority when using
+    goal programming, and every homotopy step when using homotopy.
+
+    All ensemble members are solved as a single problem, so the statistics
+    hold for the ensemble as a whole.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.__statistics = []
+        self.__priority = None
+        self.__transcribe_time = 0.0
+        self.__n_discrete = 0
+
+    def solver_statistics_options(self):
+        r"""
+        Returns a dictionary of options controlling the collection of solver
+        statistics.
+
+        +-------------------+----------+---------------+
+        | Option            | Type     | Default value |
+        +===================+==========+===============+
+        | ``json_log``      | ``str``  | ``None``      |
+        +-------------------+----------+---------------+
+
+        When ``json_log`` is set, the statistics of every solve are appended
+        to that file as a single line of JSON, directly after the solve.
+
+        :returns: A dictionary of solver statistics options.
+        """
+
+        options = {}
+
+        options["json_log"] = None
+
+        return options
+
+    @property
+    def solver_statistics(self) -> Tuple[SolveStatistics, ...]:
+        """
+        The statistics of all solves since the last call to :py:meth:`pre`.
+        """
+        return tuple(self.__statistics)
+
+    def solver_statistics_per_priority(self) -> List[PrioritySummary]:
+        """
+        The solver statistics aggregated per priority, in order of solving.
+        """
+        summaries = {}
+        for s in self.__statistics:
+            solves, iterations, wall_time, transcribe_time = summaries.get(
+                s.priority, (0, 0, 0.0, 0.0)
+            )
+            summaries[s.priority] = (
+                solves + 1,
+                iterations + (s.iterations or 0),
+                wall_time + (s.wall_time or 0.0),
+                transcribe_time + s.transcribe_time,
+            )
+
+        return [PrioritySummary(p, *v) for p, v in summaries.items()]
+
+    def pre(self):
+        super().pre()
+
+        self.__statistics = []
+        self.__priority = None
+
+    def priority_started(self, priority):
+        super().priority_started(priority)
+        self.__priority = priority
+
+    def transcribe(self):
+        t0 = time.perf_counter()
+        result = super().transcribe()
+        self.__transcribe_time = time.perf_counter() - t0
+
+        discrete = result[0]
+        self.__n_discrete = int(np.sum(discrete))
+
+        return result
+
+    def solver_success(self, solver_stats, log_solver_failure_as_error):
+        success, log_level = super().solver_success(solver_stats, log_solver_failure_as_error)
+
+        problem = self.transcribed_problem
+
+        iterations = solver_stats.get("iter_count")
+        wall_time = solver_stats.get("t_wall_total", solver_stats.get("t_wall_solver"))
+        function_times = [
+            v for k, v in solver_stats.items() if k.startswith("t_wall_nlp_") and v is not None
+        ]
+
+        try:
+            theta = self.parameters(0)[self.homotopy_options()["homotopy_parameter"]]
+        except (AttributeError, KeyError):
+            theta = None
+
+        statistics = SolveStatistics(
+            index=len(self.__statistics),
+            priority=self.__priority,
+            theta=float(theta) if theta is not None else None,
+            ensemble_size=self.ensemble_size,
+            success=bool(success),
+            return_status=str(solver_stats.get("return_status")),
+            iterations=int(iterations) if iterations is not None else None,
+            wall_time=wall_time,
+            function_time=float(sum(function_times)) if function_times else None,
+            transcribe_time=self.__transcribe_time,
+            n_variables=len(problem["lbx"]),
+            n_discrete=self.__n_discrete,
+            n_constraints=int(problem["nlp"]["g"].size1()),
+            stats=_scalar_stats(solver_stats),
+        )
+        self.__statistics.append(statistics)
+
+        logger.debug(
+            f"Solve {statistics.index} (priority {statistics.priority}, theta {statistics.theta}) "
+            f"took {statistics.iterations} iterations and {statistics.wall_time} seconds"
+        )
+
+        json_log = self.solver_statistics_options()["json_log"]
+        if json_log is not None:
+            with open(json_log, "a") as f:
+                f.write(json.dumps(asdict(statistics)) + "\n")
+
+        return success, log_level
@@ -1,16 +1,45 @@
+from dataclasses import dataclass
 from typing import Dict, List, Tuple
 
+import numpy as np
+
 from .heat_network_common import NodeConnectionDirection
 
 
+@dataclass(frozen=True)
+class NodePipeAdjacency:
+    """
+    Connections between nodes and pipes in compressed sparse row (CSR)
+    format. The pipes connected to node `nodes[i]` are
+    `pipes[indices[indptr[i]:indptr[i + 1]]]`, in order of the node's
+    connection index. The corresponding entries in `orientation` are the
+    values of the `NodeConnectionDirection` of the pipes.
+    """
+
+    nodes: Tuple[str, ...]
+    pipes: Tuple[str, ...]
+    indptr: np.ndarray
+    indices: np.ndarray
+    orientation: np.ndarray
+
+    def connected_pipes(self, node: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Indices and orientations of the pipes connected to a node.
+        """
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return self.indices[start:end], self.orientation[start:end]
+
+
 class Topology:
-    def __init__(self, nodes=None, pipe_series=None, buffers=None):
+    def __init__(self, nodes=None, pipe_series=None, buffers=None, adjacency=None):
         if nodes is not None:
             self._nodes = nodes
         if pipe_series is not None:
             self._pipe_series = pipe_series
         if buffers is not None:
             self._buffers = buffers
+        if adjacency is not None:
+            self._adjacency = adjacency
 
     @property
     def nodes(self) -> Dict[str, Dict[int, Tuple[str, NodeConnectionDirection]]]:
@@ -50,3 +79,14 @@ class Topology:
             return self._buffers
         except AttributeError:
             raise NotImplementedError
+
+    @property
+    def adjacency(self) -> NodePipeAdjacency:
+        """
+        The node-pipe connections as integer arrays in CSR format, see
+        :py:class:`NodePipeAdjacency`.
+        """
+        try:
+            return self._adjacency
+        except AttributeError:
+            raise NotImplementedError
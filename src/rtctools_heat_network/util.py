@@ -17,6 +17,8 @@ def run_heat_network_optimization(heat_class, qht_class, *args, log_level=loggin
 
     directions = {}
 
+    hot_to_cold = heat_problem.heat_network_component_index.hot_to_cold
+
     for p in heat_problem.hot_pipes:
         heat_in = results[p + ".HeatIn.Heat"]
         heat_out = results[p + ".HeatOut.Heat"]
@@ -36,7 +38,7 @@ def run_heat_network_optimization(heat_class, qht_class, *args, log_level=loggin
 
         # NOTE: The assumption is that the orientation of the cold pipes is such that the flow
         # is always in the same direction as its "hot" pipe companion.
-        cold_pipe = heat_problem.hot_to_cold_pipe(p)
+        cold_pipe = hot_to_cold[p]
         directions[cold_pipe] = directions[p]
 
     for v in heat_problem.heat_network_components.get("check_valve", []):
@@ -10,6 +10,7 @@ from rtctools.util import run_optimization_problem
 from rtctools_heat_network.bounds_to_pipe_flow_directions_mixin import (
     BoundsToPipeFlowDirectionsMixin,
 )
+from rtctools_heat_network.homotopy_continuation_mixin import HomotopyContinuationMixin
 from rtctools_heat_network.modelica_component_type_mixin import ModelicaComponentTypeMixin
 from rtctools_heat_network.qth_mixin import QTHMixin
 
@@ -84,6 +85,23 @@ class DoublePipeUnequalWithValveQTH(DoublePipeBase):
     pass
 
 
+class DoublePipeUnequalContinuationQTH(
+    BoundsToPipeFlowDirectionsMixin,
+    QTHMixin,
+    ModelicaComponentTypeMixin,
+    HomotopyContinuationMixin,
+    GoalProgrammingMixin,
+    CSVMixin,
+    ModelicaMixin,
+    CollocatedIntegratedOptimizationProblem,
+):
+    def path_goals(self):
+        goals = super().path_goals().copy()
+        goals.append(TargetDemandGoal(self))
+        goals.append(MinimizeProduction())
+        return goals
+
+
 if __name__ == "__main__":
     single_pipe = run_optimization_problem(SinglePipeQTH)
     double_pipe_equal = run_optimization_problem(DoublePipeEqualQTH)
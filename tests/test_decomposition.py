@@ -0,0 +1,143 @@
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from rtctools.util import run_optimization_problem
+
+from rtctools_heat_network.decomposition import (
+    horizon_windows,
+    hydraulic_subsystems,
+    run_decomposed_optimization,
+    run_horizon_decomposed_optimization,
+)
+from rtctools_heat_network.esdl.esdl_mixin import _esdl_to_assets
+
+
+class TestDecomposition(TestCase):
+    def test_heat_exchanger(self):
+        import models.heat_exchange.src.run_heat_exchanger as run_heat_exchanger
+        from models.heat_exchange.src.run_heat_exchanger import HeatProblem
+
+        base_folder = Path(run_heat_exchanger.__file__).resolve().parent.parent
+
+        decomposed = run_decomposed_optimization(
+            HeatProblem, base_folder=base_folder, max_workers=2
+        )
+        results = decomposed.results
+
+        self.assertTrue(decomposed.converged)
+        self.assertEqual(len(decomposed.subsystems), 2)
+        self.assertEqual([c.name for c in decomposed.couplings], ["GenericConversion_3d3f"])
+
+        full = run_optimization_problem(HeatProblem, base_folder=base_folder).extract_results()
+
+        for variable in [
+            "HeatingDemand_3322.Heat_demand",
+            "HeatingDemand_18aa.Heat_demand",
+            "ResidualHeatSource_61b8.Heat_source",
+            "ResidualHeatSource_aec9.Heat_source",
+            "GenericConversion_3d3f.Primary_heat",
+            "GenericConversion_3d3f.Secondary_heat",
+        ]:
+            np.testing.assert_allclose(results[variable], full[variable], rtol=1e-4, atol=1.0)
+
+        np.testing.assert_allclose(
+            results["GenericConversion_3d3f.Primary_heat"] * 0.9,
+            results["GenericConversion_3d3f.Secondary_heat"],
+            rtol=1e-4,
+        )
+
+    def test_heat_pump(self):
+        import models.heatpump.src.run_heat_pump as run_heat_pump
+        from models.heatpump.src.run_heat_pump import HeatProblem
+
+        base_folder = Path(run_heat_pump.__file__).resolve().parent.parent
+
+        decomposed = run_decomposed_optimization(
+            HeatProblem, base_folder=base_folder, max_workers=2
+        )
+        results = decomposed.results
+
+        self.assertTrue(decomposed.converged)
+
+        # COP of 4.0 specified in ESDL, so 3/4 of the secondary heat comes from the primary side
+        np.testing.assert_allclose(
+            results["GenericConversion_3d3f.Primary_heat"],
+            results["GenericConversion_3d3f.Secondary_heat"] * 0.75,
+            rtol=1e-4,
+        )
+
+        # The split of heat between the heat pump and the sources is not
+        # unique, but the demands are met in the same way.
+        full = run_optimization_problem(HeatProblem, base_folder=base_folder).extract_results()
+        for d in ["HeatingDemand_18aa", "HeatingDemand_3322"]:
+            np.testing.assert_allclose(
+                results[f"{d}.Heat_demand"], full[f"{d}.Heat_demand"], rtol=1e-4, atol=1.0
+            )
+
+    def test_independent_networks(self):
+        import models.multiple_carriers.src.run_multiple_carriers as run_multiple_carriers
+        from models.multiple_carriers.src.run_multiple_carriers import HeatProblem
+
+        base_folder = Path(run_multiple_carriers.__file__).resolve().parent.parent
+
+        assets = _esdl_to_assets(base_folder / "model" / "MultipleCarrierTest.esdl")
+        subsystems, couplings = hydraulic_subsystems(assets)
+
+        self.assertEqual(len(subsystems), 2)
+        self.assertEqual(couplings, [])
+        self.assertEqual(
+            sorted(n for s in subsystems for n in s.assets), sorted(a.name for a in assets.values())
+        )
+
+        # Without couplings, every subsystem is solved exactly once
+        decomposed = run_decomposed_optimization(
+            HeatProblem, base_folder=base_folder, max_workers=2
+        )
+        self.assertTrue(decomposed.converged)
+        self.assertEqual(decomposed.iterations, 1)
+
+        full = run_optimization_problem(HeatProblem, base_folder=base_folder).extract_results()
+        for d in ["HeatingDemand_18aa", "HeatingDemand_3322"]:
+            np.testing.assert_allclose(
+                decomposed.results[f"{d}.Heat_demand"], full[f"{d}.Heat_demand"], rtol=1e-4
+            )
+
+
+class TestHorizonDecomposition(TestCase):
+    def test_windows(self):
+        windows = horizon_windows(24, 3, 2)
+
+        self.assertEqual([(w.start, w.stop) for w in windows], [(0, 10), (6, 18), (14, 24)])
+        self.assertEqual(
+            [i for w in windows for i in range(w.core_start, w.core_stop)], list(range(24))
+        )
+
+        with self.assertRaisesRegex(Exception, "overlap"):
+            horizon_windows(24, 3, 0)
+        with self.assertRaisesRegex(Exception, "fewer windows"):
+            horizon_windows(4, 3, 1)
+
+    def test_buffer(self):
+        import models.simple_buffer.src.simple_buffer as simple_buffer
+        from models.simple_buffer.src.simple_buffer import HeatBufferNoHistory
+
+        base_folder = Path(simple_buffer.__file__).resolve().parent.parent
+
+        decomposed = run_horizon_decomposed_optimization(
+            HeatBufferNoHistory, n_windows=3, overlap=4, base_folder=base_folder, max_workers=3
+        )
+        results = decomposed.results
+
+        self.assertTrue(decomposed.converged)
+        self.assertGreater(decomposed.iterations, 1)
+
+        full = run_optimization_problem(HeatBufferNoHistory, base_folder=base_folder)
+        full_results = full.extract_results()
+
+        for variable in ["demand.Heat_demand", "source.Heat_source", "buffer.Stored_heat"]:
+            self.assertEqual(len(results[variable]), len(full.times()))
+            np.testing.assert_allclose(
+                results[variable], full_results[variable], rtol=1e-4, atol=1.0
+            )
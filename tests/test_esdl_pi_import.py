@@ -0,0 +1,191 @@
+import datetime
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+import pandas as pd
+
+import rtctools.data.pi as pi
+from rtctools.util import run_optimization_problem
+
+from rtctools_heat_network.esdl.esdl_mixin import (
+    _ESDLInputDataConfig,
+    _ESDLOutputDataConfig,
+    _PIBulkImportUnsupportedError,
+    _PITimeseriesImport,
+    _esdl_to_assets,
+)
+
+
+def _write_pi_xml(path, n_series, n_members, n_times, time_step="second"):
+    """
+    Writes an ensemble of series with a few missing values, and series that
+    start later and end earlier than the others.
+    """
+    t0 = datetime.datetime(2020, 1, 1)
+
+    def date(i, tag):
+        t = t0 + datetime.timedelta(hours=i)
+        return f'<{tag} date="{t:%Y-%m-%d}" time="{t:%H:%M:%S}"'
+
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<TimeSeries xmlns="http://www.wldelft.nl/fews/PI" version="1.8">',
+        "<timeZone>1.0</timeZone>",
+    ]
+    for m in range(n_members):
+        for s in range(n_series):
+            start = 2 if s % 3 == 0 else 0
+            end = n_times - 1 - (s % 2)
+            lines.append(
+                f"<series><header><type>instantaneous</type>"
+                f"<locationId>location_{s}</locationId><parameterId>heat</parameterId>"
+                f"<qualifierId>a</qualifierId><qualifierId>b</qualifierId>"
+                f"<ensembleMemberIndex>{m}</ensembleMemberIndex>"
+                f'<timeStep unit="{time_step}" multiplier="3600"/>'
+                f'{date(start, "startDate")}/>{date(end, "endDate")}/>'
+                f"<missVal>-999.0</missVal><units>W</units></header>"
+            )
+            for i in range(start, end + 1):
+                value = -999.0 if i % 5 == 0 else 1000.0 * m + 10.0 * s + i
+                lines.append(f'{date(i, "event")} value="{value}" flag="0"/>')
+            lines.append("</series>")
+    lines.append("</TimeSeries>")
+
+    path.write_text("\n".join(lines))
+
+
+class TestPIBulkImport(TestCase):
+    def test_same_as_pi_timeseries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "timeseries_import.xml"
+            _write_pi_xml(path, n_series=7, n_members=3, n_times=20)
+
+            components = {"source": [], "demand": ["demand_1"]}
+            id_map = {"location_1": "demand_1"}
+
+            expected = pi.Timeseries(
+                _ESDLInputDataConfig(id_map, components), directory, path.stem, binary=False
+            )
+            bulk = _PITimeseriesImport(_ESDLInputDataConfig(id_map, components), path)
+
+        self.assertEqual(bulk.times, expected.times)
+        self.assertEqual(bulk.forecast_datetime, expected.forecast_datetime)
+        self.assertEqual(bulk.forecast_index, expected.forecast_index)
+        self.assertEqual(bulk.timezone, expected.timezone)
+        self.assertEqual(bulk.ensemble_size, 3)
+
+        for ensemble_member in range(3):
+            expected_items = dict(expected.items(ensemble_member))
+            bulk_items = dict(bulk.items(ensemble_member))
+            self.assertEqual(list(bulk_items), list(expected_items))
+            for variable, values in expected_items.items():
+                np.testing.assert_array_equal(bulk_items[variable], values)
+
+        self.assertIn("demand_1.target_heat_demand", bulk_items)
+        self.assertIn("location_2:heat:a:b", bulk_items)
+
+    def test_unsupported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "timeseries_import.xml"
+            _write_pi_xml(path, n_series=2, n_members=1, n_times=5, time_step="nonequidistant")
+
+            data_config = _ESDLInputDataConfig({}, {"source": [], "demand": []})
+            with self.assertRaisesRegex(_PIBulkImportUnsupportedError, "nonequidistant"):
+                _PITimeseriesImport(data_config, path)
+
+    def test_esdl_problem(self):
+        import models.unit_cases.case_3a.src.run_3a as run_3a
+        from models.unit_cases.case_3a.src.run_3a import HeatProblem
+
+        base_folder = Path(run_3a.__file__).resolve().parent.parent
+
+        class PIHeatProblem(HeatProblem):
+            esdl_pi_bulk_import = False
+
+        bulk = run_optimization_problem(HeatProblem, base_folder=base_folder)
+        expected = run_optimization_problem(PIHeatProblem, base_folder=base_folder)
+
+        self.assertEqual(bulk.io.datetimes, expected.io.datetimes)
+        for variable in expected.io.get_timeseries_names():
+            np.testing.assert_array_equal(
+                bulk.io.get_timeseries(variable)[1], expected.io.get_timeseries(variable)[1]
+            )
+        self.assertEqual(bulk.objective_value, expected.objective_value)
+
+
+class TestPIChunkedExport(TestCase):
+    def test_chunks(self):
+        import models.unit_cases.case_3a.src.run_3a as run_3a
+        from models.unit_cases.case_3a.src.run_3a import HeatProblem
+
+        base_folder = Path(run_3a.__file__).resolve().parent.parent
+        esdl_file = base_folder / "model" / "3a.esdl"
+        demands = {
+            a.id: a.name
+            for a in _esdl_to_assets(esdl_file).values()
+            if a.asset_type == "HeatingDemand"
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+
+            # A run info file that also writes output, with a template that
+            # asks for the heat demand of every demand.
+            (directory / "RunInfo.xml").write_text(
+                f'<Run xmlns="http://www.wldelft.nl/fews/PI" version="1.8">'
+                f"<workDir>{directory}</workDir>"
+                f"<inputTimeSeriesFile>"
+                f"{base_folder / 'input' / 'timeseries_import.xml'}</inputTimeSeriesFile>"
+                f"<outputTimeSeriesFile>timeseries_export.xml</outputTimeSeriesFile>"
+                f'<properties><string key="ESDL_File_Path" value="{esdl_file}"/></properties>'
+                f"</Run>"
+            )
+            (directory / "timeseries_export.xml").write_text(
+                '<TimeSeries xmlns="http://www.wldelft.nl/fews/PI" version="1.2">'
+                + "".join(
+                    f"<series><header><type>instantaneous</type>"
+                    f"<locationId>{location_id}</locationId>"
+                    f"<parameterId>Heat_demand</parameterId>"
+                    f'<timeStep unit="second" multiplier="3600"/>'
+                    f'<startDate date="2013-05-19" time="22:00:00"/>'
+                    f'<endDate date="2013-05-19" time="22:00:00"/>'
+                    f"<missVal>-999.0</missVal><units>W</units></header></series>"
+                    for location_id in demands
+                )
+                + "</TimeSeries>"
+            )
+
+            def problem_class(chunks):
+                class ExportHeatProblem(HeatProblem):
+                    esdl_run_info_path = directory / "RunInfo.xml"
+                    esdl_pi_export_chunks = chunks
+
+                return ExportHeatProblem
+
+            kwargs = dict(base_folder=base_folder, output_folder=str(directory))
+
+            problem = run_optimization_problem(problem_class("xml"), **kwargs)
+            results = problem.extract_results()
+            expected = {f"{d}.Heat_demand": results[f"{d}.Heat_demand"] for d in demands.values()}
+
+            index = pd.read_csv(directory / "timeseries_export_index.csv")
+            self.assertEqual(list(index["file"]), ["timeseries_export_0.xml"])
+
+            output_config = _ESDLOutputDataConfig(problem.esdl_asset_id_to_name_map)
+            xml_chunk = pi.Timeseries(output_config, directory, "timeseries_export_0", binary=False)
+            self.assertEqual(len(xml_chunk.times), len(problem.times()))
+
+            run_optimization_problem(problem_class("csv"), **kwargs)
+            csv_chunk = pd.read_csv(directory / "timeseries_export_0.csv")
+
+            # The default export fills in the output file itself
+            run_optimization_problem(problem_class(None), **kwargs)
+            single = pi.Timeseries(output_config, directory, "timeseries_export", binary=False)
+
+            for variable, values in expected.items():
+                np.testing.assert_allclose(xml_chunk.get(variable), values)
+                np.testing.assert_allclose(csv_chunk[variable], values)
+                np.testing.assert_allclose(single.get(variable), values)
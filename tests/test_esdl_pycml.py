@@ -5,6 +5,9 @@ import numpy as np
 
 from rtctools.util import run_optimization_problem
 
+from rtctools_heat_network.esdl.common import InsulationLayer
+from rtctools_heat_network.esdl.esdl_mixin import _esdl_to_assets
+
 
 class TestESDL(TestCase):
     def test_basic_source_and_demand_heat(self):
@@ -35,3 +38,23 @@ class TestESDL(TestCase):
         np.testing.assert_allclose(
             case_python._objective_values, case_esdl._objective_values, rtol=1e-5, atol=1e-5
         )
+
+    def test_plain_asset_attributes(self):
+        import models.unit_cases.case_3a.src.run_3a as run_3a
+
+        base_folder = Path(run_3a.__file__).resolve().parent.parent
+        assets = _esdl_to_assets(base_folder / "model" / "3a.esdl")
+
+        # No references to the pyecore objects are kept
+        plain_types = (type(None), bool, int, float, str, tuple)
+        for a in assets.values():
+            for k, v in a.attributes.items():
+                self.assertIsInstance(v, plain_types, msg=f"{a.name}.{k}")
+
+        pipe = next(a for a in assets.values() if a.name == "Pipe_e53a")
+        self.assertEqual(pipe.attributes["diameter"], "VALUE_SPECIFIED")
+        self.assertGreater(len(pipe.attributes["material"]), 0)
+        self.assertTrue(all(isinstance(x, InsulationLayer) for x in pipe.attributes["material"]))
+
+        source = next(a for a in assets.values() if a.asset_type == "GeothermalSource")
+        self.assertEqual(source.attributes["variableOperationalCosts"], 1.0)
@@ -0,0 +1,95 @@
+from pathlib import Path
+from unittest import TestCase
+
+import casadi as ca
+
+import numpy as np
+
+from rtctools.optimization.timeseries import Timeseries
+from rtctools.util import run_optimization_problem
+
+from rtctools_heat_network.goals import (
+    BufferTargetGoal,
+    DemandTrackingGoal,
+    MinimizeSourceHeatGoal,
+    PeakShavingGoal,
+    WeightedSumGoal,
+)
+
+
+class TestGoals(TestCase):
+    def test_vectorized_goals(self):
+        import models.simple_buffer.src.simple_buffer as simple_buffer
+        from models.simple_buffer.src.simple_buffer import HeatBufferNoHistory
+
+        base_folder = Path(simple_buffer.__file__).resolve().parent.parent
+
+        class LibraryGoals(HeatBufferNoHistory):
+            def path_goals(self):
+                return []
+
+            def goals(self):
+                target = self.get_timeseries("Heat_demand")
+                return [
+                    DemandTrackingGoal(self, "demand", target, priority=1, order=1),
+                    MinimizeSourceHeatGoal(self, priority=2),
+                ]
+
+        case = run_optimization_problem(LibraryGoals, base_folder=base_folder)
+        results = case.extract_results()
+        times = case.times()
+
+        def _evaluate(goal):
+            f = ca.Function("f", [case.solver_input], [goal.function(case, 0)])
+            return np.array(f(case.solver_output)).ravel()
+
+        # The demand targets are met, except at the initial time like with
+        # the original path goals of the model.
+        np.testing.assert_allclose(
+            results["demand.Heat_demand"][1:],
+            case.get_timeseries("Heat_demand").values[1:],
+            rtol=1e-4,
+        )
+
+        # The goal functions evaluate to the same values as the equivalent
+        # sums and slices of the results.
+        prices = np.linspace(1.0, 2.0, len(times))
+        weighted = WeightedSumGoal(case, ["source.Heat_source"], {"source.Heat_source": prices})
+        np.testing.assert_allclose(
+            _evaluate(weighted), np.sum(prices * results["source.Heat_source"]), rtol=1e-6
+        )
+
+        total = MinimizeSourceHeatGoal(case)
+        np.testing.assert_allclose(
+            _evaluate(total), np.sum(results["source.Heat_source"]), rtol=1e-6
+        )
+
+        peak = PeakShavingGoal(
+            case, ["source.Heat_source", "demand.Heat_demand"], 1e5, function_range=(0.0, 1e7)
+        )
+        self.assertEqual(peak.size, len(times))
+        np.testing.assert_allclose(
+            _evaluate(peak),
+            results["source.Heat_source"] + results["demand.Heat_demand"],
+            rtol=1e-6,
+        )
+
+        # A buffer target at the final time only
+        target = Timeseries(times[-1:], [1e6])
+        buffer = BufferTargetGoal(case, "buffer", target)
+        self.assertEqual(buffer.size, 1)
+        np.testing.assert_allclose(_evaluate(buffer), results["buffer.Stored_heat"][-1:], rtol=1e-6)
+
+        # The nominals are only used when building the goal function, as
+        # they can still change after the goals are constructed.
+        variable_nominal = case.variable_nominal
+        case.variable_nominal = lambda variable: 2.0 * variable_nominal(variable)
+        try:
+            np.testing.assert_allclose(
+                _evaluate(total), 2.0 * np.sum(results["source.Heat_source"]), rtol=1e-6
+            )
+            np.testing.assert_allclose(
+                _evaluate(buffer), 2.0 * results["buffer.Stored_heat"][-1:], rtol=1e-6
+            )
+        finally:
+            del case.variable_nominal
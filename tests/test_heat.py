@@ -25,6 +25,78 @@ class TestHeat(TestCase):
         # strictly lower than what is produced.
         np.testing.assert_array_less(demand, source)
 
+    def test_topology_adjacency(self):
+        import models.double_pipe_heat.src.double_pipe_heat as double_pipe_heat
+        from models.double_pipe_heat.src.double_pipe_heat import DoublePipeEqualHeat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        case = run_optimization_problem(DoublePipeEqualHeat, base_folder=base_folder)
+        topology = case.heat_network_topology
+        adjacency = topology.adjacency
+
+        # The CSR arrays should describe exactly the same connections as the
+        # dictionary of node connections.
+        self.assertEqual(set(adjacency.nodes), set(topology.nodes))
+
+        for i, node in enumerate(adjacency.nodes):
+            indices, orientations = adjacency.connected_pipes(i)
+            connections = topology.nodes[node]
+            self.assertEqual(len(indices), len(connections))
+
+            for k, (pipe_index, orientation) in enumerate(zip(indices, orientations)):
+                pipe, expected_orientation = connections[k]
+                self.assertEqual(adjacency.pipes[pipe_index], pipe)
+                self.assertEqual(orientation, expected_orientation.value)
+
+    def test_component_index(self):
+        import models.double_pipe_heat.src.double_pipe_heat as double_pipe_heat
+        from models.double_pipe_heat.src.double_pipe_heat import DoublePipeEqualHeat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        case = run_optimization_problem(DoublePipeEqualHeat, base_folder=base_folder)
+        index = case.heat_network_component_index
+
+        # The index is built only once
+        self.assertIs(index, case.heat_network_component_index)
+
+        self.assertEqual(index.pipes, tuple(case.heat_network_components["pipe"]))
+        self.assertEqual(index.hot_pipes, tuple(p for p in index.pipes if case.is_hot_pipe(p)))
+        self.assertEqual(index.cold_pipes, tuple(p for p in index.pipes if case.is_cold_pipe(p)))
+
+        for p in index.hot_pipes:
+            cold_pipe = case.hot_to_cold_pipe(p)
+            self.assertEqual(index.hot_to_cold[p], cold_pipe)
+            self.assertEqual(index.pipes[index.partner[index.pipe_ids[p]]], cold_pipe)
+            self.assertEqual(index.hot_pipe(cold_pipe), p)
+            self.assertEqual(index.hot_pipe(p), p)
+
+    def test_discharge_index(self):
+        import models.double_pipe_heat.src.double_pipe_heat as double_pipe_heat
+        from models.double_pipe_heat.src.double_pipe_heat import DoublePipeEqualHeat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        case = run_optimization_problem(DoublePipeEqualHeat, base_folder=base_folder)
+        index = case.heat_network_discharge_index
+
+        # The index is built only once
+        self.assertIs(index, case.heat_network_discharge_index)
+
+        # The index should give the same components as scanning the aliases
+        components = [
+            c for t, cs in case.heat_network_components.items() if t != "node" for c in cs
+        ]
+        for c in components:
+            canonical, _ = case.alias_relation.canonical_signed(f"{c}.Q")
+            aliases = {a.lstrip("-") for a in case.alias_relation.aliases(canonical)}
+            self.assertEqual(set(index[canonical]), {x for x in components if f"{x}.Q" in aliases})
+
+        # The source, pump and pipes in between share the same discharge
+        canonical, _ = case.alias_relation.canonical_signed("source.Q")
+        self.assertIn("pump", index[canonical])
+
     def test_zero_heat_loss(self):
         import models.basic_source_and_demand.src.heat_comparison as heat_comparison
         from models.basic_source_and_demand.src.heat_comparison import HeatPython
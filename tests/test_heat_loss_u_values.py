@@ -2,7 +2,11 @@ from unittest import TestCase
 
 import numpy as np
 
-from rtctools_heat_network._heat_loss_u_values_pipe import heat_loss_u_values_pipe
+import rtctools_heat_network._heat_loss_u_values_pipe as u_values_pipe
+from rtctools_heat_network._heat_loss_u_values_pipe import (
+    heat_loss_u_values_pipe,
+    heat_loss_u_values_pipes,
+)
 
 
 class TestHeatLossUValues(TestCase):
@@ -47,3 +51,51 @@ class TestHeatLossUValues(TestCase):
             heat_loss_u_values_pipe(0.15, [0.05, 0.05], [0.033, 0.033]),
             heat_loss_u_values_pipe(0.15, 0.1, 0.033),
         )
+
+    def test_multiple_pipes_equal_to_single_pipe(self):
+        pipes = [
+            dict(inner_diameter=0.15),
+            dict(inner_diameter=0.15, insulation_thicknesses=0.1, conductivities_insulation=0.033),
+            dict(
+                inner_diameter=0.3,
+                insulation_thicknesses=[0.075],
+                conductivities_insulation=[0.033],
+            ),
+            dict(
+                inner_diameter=0.15,
+                insulation_thicknesses=[0.075, 0.025],
+                conductivities_insulation=[0.033, 0.25],
+                depth=1.5,
+                pipe_distance=0.6,
+            ),
+            dict(inner_diameter=0.15),
+        ]
+
+        # Reference values of the implementation without caching
+        reference = [
+            (0.28270030513085315, 0.00824304275435162),
+            (0.23406372383977442, 0.005170378910046358),
+            (0.47044879152261987, 0.017853138439486844),
+            (0.2742025310436866, 0.009450209204275792),
+            (0.28270030513085315, 0.00824304275435162),
+        ]
+
+        u_values_pipe._U_VALUES_CACHE.clear()
+        u_1, u_2 = heat_loss_u_values_pipes(pipes)
+
+        self.assertEqual(len(u_1), len(pipes))
+        self.assertEqual(len(u_2), len(pipes))
+        np.testing.assert_allclose(np.column_stack((u_1, u_2)), reference, rtol=1e-12)
+
+        u_values_pipe._U_VALUES_CACHE.clear()
+        for kwargs, u_ref in zip(pipes, reference):
+            np.testing.assert_allclose(heat_loss_u_values_pipe(**kwargs), u_ref, rtol=1e-12)
+
+    def test_cache_is_bounded(self):
+        u_values_pipe._U_VALUES_CACHE.clear()
+
+        diameters = 0.1 + 0.001 * np.arange(u_values_pipe._U_VALUES_CACHE_SIZE + 10)
+        u_1, _ = heat_loss_u_values_pipes([dict(inner_diameter=float(d)) for d in diameters])
+
+        self.assertEqual(len(u_values_pipe._U_VALUES_CACHE), u_values_pipe._U_VALUES_CACHE_SIZE)
+        self.assertEqual(u_1[0], heat_loss_u_values_pipe(float(diameters[0]))[0])
@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from rtctools.util import run_optimization_problem
+
+from rtctools_heat_network.modelica_cache_mixin import ModelicaCacheMixin
+
+
+class TestModelicaCache(TestCase):
+    def test_cache_reuse_and_invalidation(self):
+        import models.basic_source_and_demand.src.heat_comparison as heat_comparison
+        from models.basic_source_and_demand.src.heat_comparison import HeatModelica
+
+        base_folder = Path(heat_comparison.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_folder = Path(tmp) / "cache"
+            model_folder = Path(tmp) / "model"
+            shutil.copytree(
+                base_folder / "model",
+                model_folder,
+                ignore=shutil.ignore_patterns("*.pymoca_cache"),
+            )
+
+            class CachedHeatModelica(ModelicaCacheMixin, HeatModelica):
+                model_name = "HeatModelica"
+
+                def modelica_cache_options(self):
+                    options = super().modelica_cache_options()
+                    options["directory"] = str(cache_folder)
+                    return options
+
+            def _run():
+                case = run_optimization_problem(
+                    CachedHeatModelica, base_folder=base_folder, model_folder=model_folder
+                )
+                return case.extract_results()["source.Heat_source"]
+
+            def _cached_models():
+                return sorted(p.name for p in cache_folder.iterdir())
+
+            first = _run()
+            cached_models = _cached_models()
+            self.assertEqual(len(cached_models), 1)
+
+            # Nothing is written to the model folder itself
+            self.assertEqual(list(model_folder.glob("*.pymoca_cache")), [])
+
+            # The second run uses the same cached model
+            second = _run()
+            self.assertEqual(_cached_models(), cached_models)
+            np.testing.assert_allclose(first, second)
+
+            # Changing the contents of the model invalidates the cache,
+            # regardless of modification times.
+            with open(model_folder / "HeatModelica.mo", "a") as f:
+                f.write("\n// Changed\n")
+
+            third = _run()
+            self.assertEqual(len(_cached_models()), 2)
+            np.testing.assert_allclose(first, third)
+
+    def test_untrusted_cache(self):
+        import models.basic_source_and_demand.src.heat_comparison as heat_comparison
+        from models.basic_source_and_demand.src.heat_comparison import HeatModelica
+
+        base_folder = Path(heat_comparison.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_folder = Path(tmp) / "cache"
+            model_folder = Path(tmp) / "model"
+            shutil.copytree(
+                base_folder / "model",
+                model_folder,
+                ignore=shutil.ignore_patterns("*.pymoca_cache"),
+            )
+
+            class CachedHeatModelica(ModelicaCacheMixin, HeatModelica):
+                model_name = "HeatModelica"
+
+                def modelica_cache_options(self):
+                    options = super().modelica_cache_options()
+                    options["directory"] = str(cache_folder)
+                    return options
+
+            def _run():
+                return run_optimization_problem(
+                    CachedHeatModelica, base_folder=base_folder, model_folder=model_folder
+                )
+
+            _run()
+            (cached_model,) = cache_folder.iterdir()
+
+            # Cached models that can be replaced by other users are never loaded
+            cached_model.chmod(0o777)
+
+            with self.assertLogs("rtctools_heat_network", level="WARNING") as cm:
+                _run()
+            self.assertTrue(any("Not loading model HeatModelica" in m for m in cm.output))
+
+            # Nor is anything cached in a folder that is writable by others
+            shutil.rmtree(cached_model)
+            cache_folder.chmod(0o777)
+
+            with self.assertLogs("rtctools_heat_network", level="WARNING") as cm:
+                _run()
+            self.assertTrue(any("Not caching model HeatModelica" in m for m in cm.output))
+            self.assertEqual(list(cache_folder.iterdir()), [])
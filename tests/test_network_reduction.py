@@ -0,0 +1,220 @@
+import math
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from rtctools.util import run_optimization_problem
+
+from rtctools_heat_network.esdl.esdl_heat_model import AssetToHeatComponent
+from rtctools_heat_network.esdl.esdl_mixin import _esdl_to_assets
+from rtctools_heat_network.esdl.network_reduction import (
+    LumpedBranch,
+    MergedSeries,
+    NetworkReductionMixin,
+    reduce_network,
+)
+from rtctools_heat_network.head_loss_mixin import HeadLossOption
+
+
+class _FixedDemands:
+    """
+    Fixes the heat demands to their targets, such that the solution does not
+    depend on how well the demand goals are met.
+    """
+
+    def bounds(self):
+        bounds = super().bounds().copy()
+        for d in self.heat_network_components["demand"]:
+            target = self.get_timeseries(f"{d}.target_heat_demand")
+            bounds[f"{d}.Heat_demand"] = (target, target)
+        return bounds
+
+
+class _NoHeadLoss:
+    def heat_network_options(self):
+        options = super().heat_network_options()
+        options["head_loss_option"] = HeadLossOption.NO_HEADLOSS
+        return options
+
+
+class TestNetworkReduction(TestCase):
+    def test_lump_dead_ends(self):
+        import models.unit_cases.case_1a.src.run_1a as run_1a
+
+        base_folder = Path(run_1a.__file__).resolve().parent.parent
+        assets = _esdl_to_assets(base_folder / "model" / "1a.esdl")
+
+        reduction = reduce_network(assets)
+        names = {a.name for a in reduction.assets.values()}
+        by_name = {a.name: a for a in assets.values()}
+
+        # The three demands behind the joint collapse into a single one,
+        # after which the feed pipe and the lumped pipe are merged.
+        self.assertEqual(len(names), 4)
+        self.assertEqual(
+            [type(s) for s in reduction.steps], [LumpedBranch, MergedSeries, MergedSeries]
+        )
+
+        branch, series, _ = reduction.steps
+        self.assertEqual(len(branch.demands), 3)
+        self.assertIn(branch.demand, names)
+        self.assertEqual(series.pipes, (series.pipe, branch.pipe))
+
+        lumped = next(a for a in reduction.assets.values() if a.name == branch.demand)
+        self.assertEqual(
+            lumped.attributes["power"], sum(by_name[d].attributes["power"] for d in branch.demands)
+        )
+
+        pipe = next(a for a in reduction.assets.values() if a.name == series.pipe)
+        self.assertAlmostEqual(
+            pipe.attributes["length"],
+            by_name[series.pipe].attributes["length"] + sum(branch.lengths),
+        )
+
+        # Nor are branches lumped when modelling head loss, as the equivalent
+        # pipe carries the flow of all pipes over their summed length.
+        reduction = reduce_network(assets, head_loss_option=HeadLossOption.LINEAR)
+        self.assertFalse(any(isinstance(s, LumpedBranch) for s in reduction.steps))
+        reduction = reduce_network(assets, head_loss_option=HeadLossOption.NO_HEADLOSS)
+        self.assertEqual([type(s) for s in reduction.steps][0], LumpedBranch)
+
+        # Nothing is reduced when disabled
+        reduction = reduce_network(assets, merge_pipe_series=False, lump_dead_ends=False)
+        self.assertEqual(reduction.assets, assets)
+        self.assertEqual(reduction.steps, ())
+
+    def test_lump_dead_ends_velocity_limit(self):
+        import models.unit_cases.case_1a.src.run_1a as run_1a
+
+        base_folder = Path(run_1a.__file__).resolve().parent.parent
+        assets = _esdl_to_assets(base_folder / "model" / "1a.esdl")
+        by_name = {a.name: a for a in assets.values()}
+
+        (branch,) = [s for s in reduce_network(assets).steps if isinstance(s, LumpedBranch)]
+
+        # The velocity at which a single pipe of the branch carries the
+        # summed power of its demands.
+        converter = AssetToHeatComponent()
+        pipe = by_name[branch.pipes[0]]
+        diameter = converter._pipe_get_diameter_and_insulation(pipe)[0]
+        supply_temperature, return_temperature = converter._get_supply_return_temperatures(pipe)
+        power = sum(by_name[d].attributes["power"] for d in branch.demands)
+        velocity = power / (
+            converter.rho
+            * converter.cp
+            * (supply_temperature - return_temperature)
+            * math.pi
+            * diameter**2
+            / 4.0
+        )
+
+        # Every pipe of the branch carries its own demand well below that
+        # velocity, but the equivalent pipe would exceed the velocity limit
+        # when it is just below it.
+        self.assertTrue(all(by_name[d].attributes["power"] < power for d in branch.demands))
+
+        reduction = reduce_network(assets, maximum_velocity=0.99 * velocity)
+        self.assertFalse(any(isinstance(s, LumpedBranch) for s in reduction.steps))
+        self.assertTrue(
+            all(d in {a.name for a in reduction.assets.values()} for d in branch.demands)
+        )
+
+        reduction = reduce_network(assets, maximum_velocity=1.01 * velocity)
+        self.assertEqual(
+            [s.demands for s in reduction.steps if isinstance(s, LumpedBranch)], [branch.demands]
+        )
+
+    def test_lumped_demand_targets(self):
+        import models.unit_cases.case_1a.src.run_1a as run_1a
+        from models.unit_cases.case_1a.src.run_1a import HeatProblem
+
+        base_folder = Path(run_1a.__file__).resolve().parent.parent
+
+        class ReducedHeatProblem(_NoHeadLoss, NetworkReductionMixin, HeatProblem):
+            pass
+
+        problem = run_optimization_problem(ReducedHeatProblem, base_folder=base_folder)
+        (branch,) = [s for s in problem.network_reduction.steps if isinstance(s, LumpedBranch)]
+
+        self.assertEqual(problem.heat_network_components["demand"], [branch.demand])
+
+        original = HeatProblem(
+            **{f"{k}_folder": str(base_folder / k) for k in ["model", "input", "output"]}
+        )
+        original.read()
+        targets = [
+            original.get_timeseries(f"{d}.target_heat_demand").values for d in branch.demands
+        ]
+        np.testing.assert_allclose(
+            problem.get_timeseries(f"{branch.demand}.target_heat_demand").values,
+            np.sum(targets, axis=0),
+        )
+
+        # The heat of the lumped demand is divided over the original demands
+        results = problem.extract_expanded_results()
+        lumped = problem.extract_results()[f"{branch.demand}.Heat_demand"]
+        np.testing.assert_allclose(sum(results[f"{d}.Heat_demand"] for d in branch.demands), lumped)
+        for p in branch.pipes:
+            np.testing.assert_array_less(results[f"{p}.HeatOut.Heat"], results[f"{p}.HeatIn.Heat"])
+
+    def test_merge_pipe_series(self):
+        import models.multiple_carriers.src.run_multiple_carriers as run_multiple_carriers
+        from models.multiple_carriers.src.run_multiple_carriers import HeatProblem
+
+        base_folder = Path(run_multiple_carriers.__file__).resolve().parent.parent
+
+        class FixedHeatProblem(_FixedDemands, HeatProblem):
+            pass
+
+        class ReducedHeatProblem(NetworkReductionMixin, FixedHeatProblem):
+            pass
+
+        original = run_optimization_problem(FixedHeatProblem, base_folder=base_folder)
+        reduced = run_optimization_problem(ReducedHeatProblem, base_folder=base_folder)
+
+        # Both carriers have a source and a demand, connected by two pipes
+        # and a joint on the supply and return side.
+        self.assertEqual(len(reduced.esdl_assets), len(original.esdl_assets) - 8)
+
+        # Heat and head losses are proportional to length, so the results
+        # of the merged pipes match those of the original ones. The absolute
+        # heads are only determined up to a constant, so we skip those.
+        original_results = original.extract_results()
+        results = reduced.extract_expanded_results()
+
+        for k, v in original_results.items():
+            if k.endswith(("H", "H_in", "H_out")) or k.startswith("Joint"):
+                continue
+            np.testing.assert_allclose(results[k], v, rtol=1e-6, atol=1e-6, err_msg=k)
+
+    def test_head_loss(self):
+        import models.unit_cases.case_1a.src.run_1a as run_1a
+        from models.unit_cases.case_1a.src.run_1a import HeatProblem
+
+        base_folder = Path(run_1a.__file__).resolve().parent.parent
+
+        class FixedHeatProblem(_FixedDemands, HeatProblem):
+            pass
+
+        class ReducedHeatProblem(NetworkReductionMixin, FixedHeatProblem):
+            pass
+
+        original = run_optimization_problem(FixedHeatProblem, base_folder=base_folder)
+        reduced = run_optimization_problem(ReducedHeatProblem, base_folder=base_folder)
+
+        # With head loss, the dead-end branch of case 1a is not lumped, so
+        # the head loss of its pipes matches that of the unreduced network.
+        self.assertNotEqual(
+            original.heat_network_options()["head_loss_option"], HeadLossOption.NO_HEADLOSS
+        )
+        self.assertFalse(any(isinstance(s, LumpedBranch) for s in reduced.network_reduction.steps))
+
+        original_results = original.extract_results()
+        results = reduced.extract_expanded_results()
+
+        for k, v in original_results.items():
+            if k.endswith(("H", "H_in", "H_out")) or k.startswith("Joint"):
+                continue
+            np.testing.assert_allclose(results[k], v, rtol=1e-6, atol=1e-6, err_msg=k)
+        self.assertTrue(any(k.endswith(".dH") and np.any(v != 0.0) for k, v in results.items()))
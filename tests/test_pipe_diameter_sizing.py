@@ -2,8 +2,16 @@ import sys
 from pathlib import Path
 from unittest import TestCase
 
+import numpy as np
+
 from rtctools.util import run_optimization_problem
 
+from rtctools_heat_network._pipe_class_screening import (
+    dominated_pipe_classes,
+    pipe_heat_requirements,
+)
+from rtctools_heat_network.pipe_class import PipeClass
+
 
 class TestPipeDiameterSizingExample(TestCase):
     def test_half_network_gone(self):
@@ -31,3 +39,72 @@ class TestPipeDiameterSizingExample(TestCase):
         # is equally possible for the left or right side of the network to be
         # removed.
         self.assertEqual(len([d for d in diameters.values() if d == 0.0]), 4)
+
+
+class TestPipeClassScreening(TestCase):
+    def test_pipe_heat_requirements(self):
+        # A loop of vertices 0, 1 and 2 with a source at 0, and a branch of
+        # vertices 3 and 4 with demands hanging off vertex 2.
+        edges = [(0, 1), (1, 2), (2, 0), (2, 3), (3, 4)]
+        demand = np.zeros((5, 2))
+        demand[3] = [1.0, 2.0]
+        demand[4] = [3.0, 1.0]
+        supply = np.array([10.0, 0.0, 0.0, 0.0, 0.0])
+        unbounded = np.zeros(5, dtype=bool)
+
+        requirements = pipe_heat_requirements(5, edges, demand, supply, unbounded)
+        np.testing.assert_allclose(requirements, [0.0, 0.0, 0.0, 4.0, 3.0])
+
+        # A buffer at the end of the branch can supply the demands
+        unbounded[4] = True
+        requirements = pipe_heat_requirements(5, edges, demand, supply, unbounded)
+        np.testing.assert_allclose(requirements, [0.0, 0.0, 0.0, 0.0, 0.0])
+
+    def test_dominated_pipe_classes(self):
+        pipe_classes = [
+            PipeClass("A", 0.1, 1.0, (1.0, 1.0), 10.0),
+            PipeClass("B", 0.1, 2.0, (1.0, 1.0), 10.0),
+            PipeClass("C", 0.1, 2.0, (1.0, 1.0), 10.0),
+            PipeClass("D", 0.2, 1.0, (1.0, 1.0), 5.0),
+        ]
+
+        self.assertEqual(dominated_pipe_classes(pipe_classes), {0, 2})
+
+    def test_screening_example(self):
+        root_folder = str(Path(__file__).resolve().parent.parent)
+        sys.path.insert(1, root_folder)
+
+        import examples.pipe_diameter_sizing.src.example  # noqa: E402, I100
+        from examples.pipe_diameter_sizing.src.example import (
+            PipeDiameterSizingProblem,
+        )  # noqa: E402, I100
+
+        base_folder = (
+            Path(examples.pipe_diameter_sizing.src.example.__file__).resolve().parent.parent
+        )
+
+        del root_folder
+        sys.path.pop(1)
+
+        class NoScreening(PipeDiameterSizingProblem):
+            def heat_network_options(self):
+                options = super().heat_network_options()
+                options["screen_pipe_classes"] = False
+                return options
+
+        screened = run_optimization_problem(PipeDiameterSizingProblem, base_folder=base_folder)
+        unscreened = run_optimization_problem(NoScreening, base_folder=base_folder)
+
+        # The pipes leading to the demands cannot be smaller than what is
+        # needed to supply them.
+        n_classes = {p: len(screened.get_screened_pipe_classes(p)) for p in screened.hot_pipes}
+        self.assertTrue(any(n < len(screened.pipe_classes(p)) for p, n in n_classes.items()))
+        for p in unscreened.hot_pipes:
+            self.assertEqual(unscreened.get_screened_pipe_classes(p), unscreened.pipe_classes(p))
+
+        # Screening does not change the optimal layout, although the
+        # objective values can differ within the optimality gap of the solver.
+        for problem in [screened, unscreened]:
+            parameters = problem.parameters(0)
+            diameters = [parameters[f"{p}.diameter"] for p in problem.hot_pipes]
+            self.assertEqual(len([d for d in diameters if d == 0.0]), 4)
@@ -1,8 +1,13 @@
 from unittest import TestCase
 
+import casadi as ca
+
 import numpy as np
 
-from rtctools_heat_network.pycml import Model, Variable
+from pymoca.backends.casadi.model import Model as PymocaModel
+
+from rtctools_heat_network.pycml import ControlInput, Model, SymbolicParameter, Variable
+from rtctools_heat_network.pycml._simplify import simplify
 
 
 class TestPyCML(TestCase):
@@ -94,3 +99,272 @@ class TestPyCML(TestCase):
             _var_min_max_nominal(b_flat.variables["storage.V"]),
             dict(min=10.0, nominal=0, max=np.inf),
         )
+
+    def test_add_variables(self):
+        class Pipe(Model):
+            def __init__(self, name, **modifiers):
+                super().__init__(name, **modifiers)
+
+                self.add_variable(Variable, "Q", nominal=1.0)
+                self.add_variable(Variable, "H_in")
+                self.add_variable(Variable, "H_out")
+
+                self.add_equation(self.H_in - self.H_out - self.Q)
+
+        class Network(Model):
+            def __init__(self, batch, **modifiers):
+                super().__init__(None, **modifiers)
+
+                pipes = [(Pipe, f"pipe_{i}", dict(Q=dict(nominal=i + 1.0))) for i in range(20)]
+                if batch:
+                    self.add_variables(pipes)
+                else:
+                    for type_, name, kwargs in pipes:
+                        self.add_variable(type_, name, **kwargs)
+
+        single = Network(False, pipe_3=dict(Q=dict(min=0.0))).flatten()
+        batch = Network(True, pipe_3=dict(Q=dict(min=0.0))).flatten()
+
+        self.assertEqual(list(single.variables.keys()), list(batch.variables.keys()))
+        self.assertEqual([str(e) for e in single.equations], [str(e) for e in batch.equations])
+        self.assertEqual(batch.variables["pipe_7.Q"].nominal, 8.0)
+        self.assertEqual(batch.variables["pipe_3.Q"].min, 0.0)
+
+        with self.assertRaisesRegex(Exception, "already exists"):
+            Network(True).add_variables([(Pipe, "pipe_0", {})])
+
+    def test_component_templates(self):
+        class Storage(Model):
+            def __init__(self, name, **modifiers):
+                super().__init__(name, **modifiers)
+
+                self.volume = 2.0
+
+                self.add_variable(SymbolicParameter, "theta")
+                self.add_variable(Variable, "Q_in")
+                self.add_variable(Variable, "Q_out")
+                self.add_variable(Variable, "V", min=0.0, max=self.volume * self.theta)
+
+                self.add_equation(self.der(self.V) - (self.Q_in - self.Q_out))
+                self.add_equation(self.Q_in * self.volume - self.theta)
+
+        class Network(Model):
+            def __init__(self, use_templates):
+                super().__init__(None)
+
+                self.add_variable(SymbolicParameter, "theta")
+
+                self.add_variables(
+                    [
+                        (Storage, f"storage_{i}", dict(theta=self.theta, volume=1.0 + i % 2))
+                        for i in range(4)
+                    ],
+                    use_templates=use_templates,
+                )
+
+        normal = Network(False)
+        templated = Network(True)
+
+        # The volumes differ, but the structure of the modifiers is the same
+        self.assertEqual(len(templated._templates), 1)
+
+        normal_flat = normal.flatten()
+        templated_flat = templated.flatten()
+
+        self.assertEqual(list(normal_flat.variables), list(templated_flat.variables))
+        self.assertEqual(
+            [str(e) for e in normal_flat.equations], [str(e) for e in templated_flat.equations]
+        )
+        self.assertEqual(normal_flat.numeric_parameters, templated_flat.numeric_parameters)
+
+        for k, v in templated_flat.variables.items():
+            self.assertEqual(v.symbol.name(), k)
+            self.assertEqual(str(v.max), str(normal_flat.variables[k].max))
+            if k.endswith(".V"):
+                self.assertEqual(v.der().symbol.name(), f"der({k})")
+
+        # Every component has its own symbols, but they all refer to the same global parameter
+        symbols = ca.symvar(ca.veccat(*templated_flat.equations))
+        self.assertEqual(len({s.name() for s in symbols}), len(symbols))
+
+        theta = templated_flat.variables["theta"].symbol
+        for i in range(4):
+            value = templated_flat.variables[f"storage_{i}.theta"].value
+            self.assertTrue(ca.is_equal(value, theta))
+            self.assertEqual(templated_flat.numeric_parameters[f"storage_{i}.volume"], 1.0 + i % 2)
+
+    def test_component_templates_branching(self):
+        class Valve(Model):
+            def __init__(self, name, **modifiers):
+                super().__init__(name, **modifiers)
+
+                self.opening = 1.0
+
+                self.add_variable(Variable, "Q")
+                if self.opening > 0.5:
+                    self.add_equation(self.Q - self.opening)
+
+        class Network(Model):
+            def __init__(self, use_templates):
+                super().__init__(None)
+
+                self.add_variables(
+                    [(Valve, f"valve_{i}", dict(opening=i / 2.0)) for i in range(4)],
+                    use_templates=use_templates,
+                )
+
+        normal_flat = Network(False).flatten()
+        templated = Network(True)
+        templated_flat = templated.flatten()
+
+        # Branching on a parameter value falls back to a template per value
+        self.assertEqual(sum(t is not None for t in templated._templates.values()), 4)
+
+        self.assertEqual(
+            [str(e) for e in normal_flat.equations], [str(e) for e in templated_flat.equations]
+        )
+        self.assertEqual(normal_flat.numeric_parameters, templated_flat.numeric_parameters)
+
+    def test_flatten(self):
+        class Port(Model):
+            def __init__(self, name, **modifiers):
+                super().__init__(name, **modifiers)
+
+                self.add_variable(Variable, "Q")
+                self.add_variable(Variable, "H")
+
+        class Node(Model):
+            def __init__(self, name, **modifiers):
+                super().__init__(name, **modifiers)
+
+                self.n = 3
+                self.add_variable(Port, "Conn", self.n)
+                self.add_variable(Variable, "H")
+
+                for i in range(1, self.n + 1):
+                    self.add_equation(self.Conn[i].H - self.H)
+
+        class Network(Model):
+            def __init__(self):
+                super().__init__(None)
+
+                self.add_variable(Node, "node_a")
+                self.add_variable(Variable, "x")
+                self.add_variable(Node, "node_b")
+
+                self.connect(self.node_a.Conn[1], self.node_b.Conn[1])
+
+        network = Network()
+        size = network.flattened_size()
+        flat = network.flatten()
+
+        self.assertEqual(
+            list(flat.variables),
+            [
+                *(f"node_a.Conn[{i}].{v}" for i in range(1, 4) for v in ("Q", "H")),
+                "node_a.H",
+                "x",
+                *(f"node_b.Conn[{i}].{v}" for i in range(1, 4) for v in ("Q", "H")),
+                "node_b.H",
+            ],
+        )
+        self.assertEqual(list(flat.numeric_parameters), ["node_a.n", "node_b.n"])
+        self.assertEqual(
+            [str(e) for e in flat.equations],
+            [
+                *(f"(node_a.Conn[{i}].H-node_a.H)" for i in range(1, 4)),
+                *(f"(node_b.Conn[{i}].H-node_b.H)" for i in range(1, 4)),
+                "(node_a.Conn[1].Q-node_b.Conn[1].Q)",
+                "(node_a.Conn[1].H-node_b.Conn[1].H)",
+            ],
+        )
+
+        self.assertEqual(size.variables, len(flat.variables))
+        self.assertEqual(size.numeric_parameters, len(flat.numeric_parameters))
+        self.assertEqual(size.equations, len(flat.equations))
+        self.assertEqual(size.inequalities, 0)
+
+    def test_direct_simplification(self):
+        class Port(Model):
+            def __init__(self, name, **modifiers):
+                super().__init__(name, **modifiers)
+
+                self.add_variable(Variable, "Q")
+                self.add_variable(Variable, "H")
+
+        class Pipe(Model):
+            def __init__(self, name, **modifiers):
+                super().__init__(name, **modifiers)
+
+                self.add_variable(SymbolicParameter, "theta")
+                self.add_variable(Port, "In")
+                self.add_variable(Port, "Out")
+                self.add_variable(Variable, "Q", min=-1.0, max=2.0, nominal=3.0)
+                self.add_variable(Variable, "Q_reversed", min=-1.5, max=1.0)
+
+                self.add_equation(self.In.Q - self.Out.Q)
+                self.add_equation(self.Q - self.In.Q)
+                self.add_equation(self.Q + self.Q_reversed)
+                self.add_equation((self.In.H - self.Out.H) / 10.0)
+                self.add_equation(self.In.H - self.Out.H - self.theta * self.Q**2)
+
+        class Network(Model):
+            def __init__(self):
+                super().__init__(None)
+
+                self.add_variable(SymbolicParameter, "theta")
+                self.add_variable(Pipe, "a", theta=self.theta)
+                self.add_variable(Pipe, "b", theta=self.theta)
+                self.add_variable(ControlInput, "Q_source", nominal=5.0)
+
+                self.connect(self.a.Out, self.b.In)
+                self.add_equation(self.a.In.Q - self.Q_source)
+
+        def _pymoca_model():
+            flat = Network().flatten()
+
+            model = PymocaModel()
+            for v in flat.variables.values():
+                if isinstance(v, SymbolicParameter):
+                    model.parameters.append(v)
+                elif isinstance(v, ControlInput):
+                    model.inputs.append(v)
+                else:
+                    model.alg_states.append(v)
+            model.equations = flat.equations
+
+            return model, flat.connections
+
+        options = {
+            "detect_aliases": True,
+            "replace_parameter_expressions": True,
+            "resolve_parameter_values": True,
+            "allow_derivative_aliases": False,
+        }
+
+        generic, _ = _pymoca_model()
+        generic.simplify(options)
+
+        direct, connections = _pymoca_model()
+        self.assertEqual(len(connections), 2)
+        self.assertTrue(simplify(direct, options, connections))
+
+        def _aliases(model):
+            return {k: sorted(v) for k, v in model.alias_relation}
+
+        self.assertEqual(_aliases(direct), _aliases(generic))
+        self.assertIn("-a.Q_reversed", _aliases(direct)["Q_source"])
+
+        for attr in ("alg_states", "inputs", "parameters"):
+            self.assertEqual(
+                [(v.symbol.name(), v.min, v.max, v.nominal) for v in getattr(direct, attr)],
+                [(v.symbol.name(), v.min, v.max, v.nominal) for v in getattr(generic, attr)],
+            )
+        self.assertEqual([str(e) for e in direct.equations], [str(e) for e in generic.equations])
+
+        # Options that are not supported directly are left to pymoca
+        unsupported, connections = _pymoca_model()
+        self.assertFalse(
+            simplify(unsupported, {**options, "factor_and_simplify_equations": True}, connections)
+        )
+        self.assertEqual(len(unsupported.alias_relation.canonical_variables), 0)
@@ -303,3 +303,90 @@ class TestSourcesEqualTemperature(TestCase):
         source2_temp = results_eq_temp["GeothermalSource_27cb.QTHOut.T"]
 
         np.testing.assert_allclose(source1_temp, source2_temp, atol=eps)
+
+
+class TestHomotopyContinuation(TestCase):
+    def test_adaptive_theta_and_warm_start(self):
+        import models.double_pipe_qth.src.double_pipe_qth as double_pipe_qth
+        from models.double_pipe_qth.src.double_pipe_qth import (
+            DoublePipeUnequalContinuationQTH,
+            DoublePipeUnequalQTH,
+        )
+
+        base_folder = Path(double_pipe_qth.__file__).resolve().parent.parent
+
+        class ContinuationQTH(DoublePipeUnequalContinuationQTH):
+            warm_start = True
+
+            def homotopy_options(self):
+                options = super().homotopy_options()
+                options["delta_theta_0"] = 0.25
+                options["delta_theta_min"] = 0.01
+                options["delta_theta_max"] = 0.25
+                options["warm_start"] = self.warm_start
+                return options
+
+        class ColdContinuationQTH(ContinuationQTH):
+            warm_start = False
+
+        kwargs = dict(base_folder=base_folder, model_name="DoublePipeUnequalQTH")
+
+        reference = run_optimization_problem(DoublePipeUnequalQTH, base_folder=base_folder)
+        warm = run_optimization_problem(ContinuationQTH, **kwargs)
+        cold = run_optimization_problem(ColdContinuationQTH, **kwargs)
+
+        for case in [warm, cold]:
+            steps = case.homotopy_steps
+            self.assertTrue(all(s.success for s in steps))
+            self.assertEqual(steps[-1].theta, 1.0)
+            self.assertGreater(len(steps), 2)
+            self.assertTrue(all(s.delta_theta <= 0.25 for s in steps))
+            self.assertAlmostEqual(case.objective_value, reference.objective_value, 5)
+
+        # Warm starts between theta steps should save solver iterations
+        self.assertLess(
+            sum(s.iterations for s in warm.homotopy_steps),
+            sum(s.iterations for s in cold.homotopy_steps),
+        )
+
+    def test_theta_after_failure(self):
+        import models.double_pipe_qth.src.double_pipe_qth as double_pipe_qth
+        from models.double_pipe_qth.src.double_pipe_qth import DoublePipeUnequalContinuationQTH
+
+        base_folder = Path(double_pipe_qth.__file__).resolve().parent.parent
+
+        class FailingQTH(DoublePipeUnequalContinuationQTH):
+            def homotopy_options(self):
+                options = super().homotopy_options()
+                options["delta_theta_0"] = 0.5
+                options["delta_theta_min"] = 0.2
+                return options
+
+            def solver_options(self):
+                options = super().solver_options()
+                if self.parameters(0)["theta"] > 0.5:
+                    options.setdefault("ipopt", {})["max_iter"] = 0
+                return options
+
+            def post(self):
+                self.theta_in_post = self.parameters(0)["theta"]
+                super().post()
+
+        case = run_optimization_problem(
+            FailingQTH, base_folder=base_folder, model_name="DoublePipeUnequalQTH"
+        )
+
+        # Post-processing sees the theta of the last successful step
+        self.assertFalse(case.homotopy_steps[-1].success)
+        self.assertEqual(case.theta_in_post, 0.5)
+
+    def test_homotopy_mixin_combination(self):
+        from models.double_pipe_qth.src.double_pipe_qth import DoublePipeUnequalQTH
+
+        from rtctools_heat_network.homotopy_continuation_mixin import HomotopyContinuationMixin
+
+        class CombinedQTH(HomotopyContinuationMixin, DoublePipeUnequalQTH):
+            pass
+
+        with self.assertRaisesRegex(Exception, "replaces HomotopyMixin"):
+            CombinedQTH()
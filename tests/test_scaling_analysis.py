@@ -0,0 +1,53 @@
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from rtctools.util import run_optimization_problem
+
+from rtctools_heat_network.scaling_analysis_mixin import ScalingAnalysisMixin
+
+
+class TestScalingAnalysis(TestCase):
+    def test_scaling_report_and_tuning(self):
+        import models.double_pipe_qth.src.double_pipe_qth as double_pipe_qth
+        from models.double_pipe_qth.src.double_pipe_qth import DoublePipeUnequalQTH
+
+        base_folder = Path(double_pipe_qth.__file__).resolve().parent.parent
+
+        class AnalyzedQTH(ScalingAnalysisMixin, DoublePipeUnequalQTH):
+            def scaling_options(self):
+                options = super().scaling_options()
+                options["analyze"] = True
+                return options
+
+        class TunedQTH(AnalyzedQTH):
+            def scaling_options(self):
+                options = super().scaling_options()
+                options["tune_nominals"] = True
+                options["scale_constraints"] = True
+                return options
+
+        kwargs = dict(base_folder=base_folder, model_name="DoublePipeUnequalQTH")
+
+        analyzed = run_optimization_problem(AnalyzedQTH, **kwargs)
+        tuned = run_optimization_problem(TunedQTH, **kwargs)
+
+        report = analyzed.scaling_report
+        self.assertIsNotNone(report)
+        self.assertEqual(len(report.rows), analyzed.scaling_options()["report_size"])
+        self.assertEqual(len(report.columns), analyzed.scaling_options()["report_size"])
+        self.assertIn("source", report.components)
+
+        # The worst rows and columns come first
+        badness = [e.badness for e in report.rows]
+        self.assertEqual(badness, sorted(badness, reverse=True))
+
+        # Tuning the nominals and scaling the constraints should not change the solution
+        changed = [
+            v
+            for v in tuned.extract_results().keys()
+            if tuned.variable_nominal(v) != analyzed.variable_nominal(v)
+        ]
+        self.assertGreater(len(changed), 0)
+        np.testing.assert_allclose(tuned.objective_value, analyzed.objective_value, rtol=1e-6)
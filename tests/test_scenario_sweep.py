@@ -0,0 +1,84 @@
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from rtctools_heat_network.head_loss_mixin import HeadLossOption
+from rtctools_heat_network.scenario_sweep import run_scenarios, scenario_grid
+
+
+def _source_heat(problem):
+    results = problem.extract_results()
+    return {"source_heat": float(np.sum(results["source.Heat_source"]))}
+
+
+class TestScenarioSweep(TestCase):
+    def test_scenario_grid(self):
+        scenarios = scenario_grid(
+            options={"heat_network_options": {"minimum_velocity": [0.0, 0.005]}},
+            parameters={"pipe_hot.length": [500.0, 1000.0, 2000.0]},
+        )
+
+        self.assertEqual(len(scenarios), 6)
+        self.assertEqual(len({s.name for s in scenarios}), 6)
+        self.assertEqual(
+            {
+                (
+                    s.options["heat_network_options"]["minimum_velocity"],
+                    s.parameters["pipe_hot.length"],
+                )
+                for s in scenarios
+            },
+            {(v, length) for v in [0.0, 0.005] for length in [500.0, 1000.0, 2000.0]},
+        )
+        self.assertEqual(
+            scenarios[0].columns(),
+            {"heat_network_options.minimum_velocity": 0.0, "pipe_hot.length": 500.0},
+        )
+
+    def test_parallel_sweep(self):
+        import models.double_pipe_heat.src.double_pipe_heat as double_pipe_heat
+        from models.double_pipe_heat.src.double_pipe_heat import DoublePipeEqualHeat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        scenarios = scenario_grid(
+            options={"heat_network_options": {"neglect_pipe_heat_losses": [True, False]}},
+            parameters={"pipe_hot.length": [1000.0, 2000.0]},
+        )
+
+        kwargs = dict(base_folder=base_folder, kpis=_source_heat)
+        table = run_scenarios(DoublePipeEqualHeat, scenarios, max_workers=2, **kwargs)
+        serial = run_scenarios(DoublePipeEqualHeat, scenarios, max_workers=1, **kwargs)
+
+        self.assertEqual(list(table.index), [s.name for s in scenarios])
+        self.assertTrue(table["error"].isna().all())
+        np.testing.assert_allclose(table["source_heat"], serial["source_heat"])
+
+        heat = table.set_index(
+            ["heat_network_options.neglect_pipe_heat_losses", "pipe_hot.length"]
+        )["source_heat"]
+
+        # Without heat losses the length of the pipe does not matter, with
+        # heat losses a longer pipe needs more heat from the source.
+        self.assertAlmostEqual(heat[True, 1000.0], heat[True, 2000.0], delta=1.0)
+        self.assertGreater(heat[False, 1000.0], heat[True, 1000.0])
+        self.assertGreater(heat[False, 2000.0], heat[False, 1000.0])
+
+    def test_failed_scenario(self):
+        import models.double_pipe_heat.src.double_pipe_heat as double_pipe_heat
+        from models.double_pipe_heat.src.double_pipe_heat import DoublePipeEqualHeat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        scenarios = scenario_grid(
+            options={"heat_network_options": {"head_loss_option": [HeadLossOption.LINEAR, "none"]}}
+        )
+
+        table = run_scenarios(
+            DoublePipeEqualHeat, scenarios, max_workers=2, base_folder=base_folder
+        )
+
+        self.assertTrue(table["error"].isna().iloc[0])
+        self.assertTrue(table["success"].iloc[0])
+        self.assertIn("Head loss option 'none' does not exist", table["error"].iloc[1])
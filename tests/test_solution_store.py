@@ -0,0 +1,155 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from rtctools.util import run_optimization_problem
+
+from rtctools_heat_network.solution_store_mixin import SolutionStoreMixin, _StoredSolution
+
+
+class TestSolutionStore(TestCase):
+    def test_warm_start_qth(self):
+        import models.double_pipe_qth.src.double_pipe_qth as double_pipe_qth
+        from models.double_pipe_qth.src.double_pipe_qth import DoublePipeUnequalQTH
+
+        base_folder = Path(double_pipe_qth.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            class StoredQTH(SolutionStoreMixin, DoublePipeUnequalQTH):
+                def solution_store_options(self):
+                    options = super().solution_store_options()
+                    options["directory"] = directory
+                    return options
+
+            kwargs = dict(base_folder=base_folder, model_name="DoublePipeUnequalQTH")
+
+            first = run_optimization_problem(StoredQTH, **kwargs)
+            self.assertFalse(first.seeded_from_store)
+
+            folder = first.solution_store_path
+            self.assertEqual(folder.parent, Path(directory))
+
+            stored = _StoredSolution(folder)
+            self.assertIsNotNone(stored.lam_x)
+            self.assertIsNotNone(stored.lam_g)
+
+            # The stored values are those of the final solution
+            results = first.extract_results()
+            for v in ["source.Q", "demand.QTHIn.T", "pipe_1_hot.QTHOut.T"]:
+                canonical, sign = first.alias_relation.canonical_signed(v)
+                np.testing.assert_allclose(
+                    sign * stored.values[0, stored.variables[canonical]], results[v]
+                )
+
+            # The same run again is seeded, and ends up at the same solution
+            second = run_optimization_problem(StoredQTH, **kwargs)
+            self.assertTrue(second.seeded_from_store)
+            self.assertAlmostEqual(second.objective_value, first.objective_value, places=5)
+
+    def test_hot_start_heat(self):
+        import models.double_pipe_heat.src.double_pipe_heat as double_pipe_heat
+        from models.double_pipe_heat.src.double_pipe_heat import DoublePipeEqualHeat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            class StoredHeat(SolutionStoreMixin, DoublePipeEqualHeat):
+                def solution_store_options(self):
+                    options = super().solution_store_options()
+                    options["directory"] = directory
+                    return options
+
+            kwargs = dict(base_folder=base_folder, model_name="DoublePipeEqualHeat")
+
+            first = run_optimization_problem(StoredHeat, **kwargs)
+            second = run_optimization_problem(StoredHeat, **kwargs)
+
+            self.assertFalse(first.seeded_from_store)
+            self.assertTrue(second.seeded_from_store)
+            self.assertAlmostEqual(second.objective_value, first.objective_value, places=5)
+
+            # Multipliers are only stored for IPOPT
+            stored = _StoredSolution(second.solution_store_path)
+            self.assertIsNone(stored.lam_x)
+
+            # A later run is seeded with the stored solution shifted in time,
+            # with the final values held constant.
+            canonical = second.alias_relation.canonical_signed("source.Heat_source")[0]
+            values = stored.values[0, stored.variables[canonical]]
+            dt = stored.times[1] - stored.times[0]
+            np.testing.assert_allclose(
+                stored.values_at(canonical, 0, stored.times + dt),
+                np.append(values[1:], values[-1]),
+            )
+
+    def test_disabled(self):
+        import models.double_pipe_heat.src.double_pipe_heat as double_pipe_heat
+        from models.double_pipe_heat.src.double_pipe_heat import DoublePipeEqualHeat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            class UnstoredHeat(SolutionStoreMixin, DoublePipeEqualHeat):
+                def solution_store_options(self):
+                    options = super().solution_store_options()
+                    options["directory"] = directory
+                    options["enabled"] = False
+                    return options
+
+            kwargs = dict(base_folder=base_folder, model_name="DoublePipeEqualHeat")
+
+            run_optimization_problem(UnstoredHeat, **kwargs)
+            case = run_optimization_problem(UnstoredHeat, **kwargs)
+
+            self.assertFalse(case.seeded_from_store)
+            self.assertEqual(list(Path(directory).iterdir()), [])
+
+    def test_store_failures(self):
+        import models.double_pipe_heat.src.double_pipe_heat as double_pipe_heat
+        from models.double_pipe_heat.src.double_pipe_heat import DoublePipeEqualHeat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp) / "solutions"
+
+            class StoredHeat(SolutionStoreMixin, DoublePipeEqualHeat):
+                def solution_store_options(self):
+                    options = super().solution_store_options()
+                    options["directory"] = str(directory)
+                    return options
+
+            kwargs = dict(base_folder=base_folder, model_name="DoublePipeEqualHeat")
+
+            # A solution that cannot be written does not fail the run
+            directory.write_text("")
+
+            with self.assertLogs("rtctools_heat_network", level="WARNING") as cm:
+                case = run_optimization_problem(StoredHeat, **kwargs)
+            self.assertTrue(case.solver_stats["success"])
+            self.assertTrue(any("Could not store solution" in m for m in cm.output))
+
+            # Solutions are not stored in a folder that is writable by others
+            directory.unlink()
+            directory.mkdir(mode=0o777)
+            directory.chmod(0o777)
+
+            with self.assertLogs("rtctools_heat_network", level="WARNING") as cm:
+                run_optimization_problem(StoredHeat, **kwargs)
+            self.assertTrue(any("Not storing the solution" in m for m in cm.output))
+            self.assertEqual(list(directory.iterdir()), [])
+
+            # Nor loaded from it
+            directory.chmod(0o700)
+            run_optimization_problem(StoredHeat, **kwargs)
+            directory.chmod(0o777)
+
+            with self.assertLogs("rtctools_heat_network", level="WARNING") as cm:
+                case = run_optimization_problem(StoredHeat, **kwargs)
+            self.assertFalse(case.seeded_from_store)
+            self.assertTrue(any("Not loading stored solution" in m for m in cm.output))
@@ -0,0 +1,182 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from rtctools.util import run_optimization_problem
+
+import rtctools_heat_network.solver_cache_mixin as solver_cache_mixin
+from rtctools_heat_network.solver_cache_mixin import (
+    SolverCacheMixin,
+    _options_key,
+    _prune_libraries,
+)
+
+
+class TestSolverCache(TestCase):
+    def setUp(self):
+        solver_cache_mixin._SOLVER_CACHE.clear()
+
+    def test_cached_solver(self):
+        import models.double_pipe_qth.src.double_pipe_qth as double_pipe_qth
+        from models.double_pipe_qth.src.double_pipe_qth import DoublePipeUnequalQTH
+
+        base_folder = Path(double_pipe_qth.__file__).resolve().parent.parent
+
+        class LowDemandQTH(DoublePipeUnequalQTH):
+            def read(self):
+                super().read()
+                demand = self.get_timeseries("Heat_demand")
+                self.set_timeseries("Heat_demand", 0.5 * demand.values)
+
+        class CachedQTH(SolverCacheMixin, DoublePipeUnequalQTH):
+            pass
+
+        class CachedLowDemandQTH(SolverCacheMixin, LowDemandQTH):
+            pass
+
+        kwargs = dict(base_folder=base_folder, model_name="DoublePipeUnequalQTH")
+
+        reference = run_optimization_problem(LowDemandQTH, **kwargs)
+
+        run_optimization_problem(CachedQTH, **kwargs)
+        solvers = list(solver_cache_mixin._SOLVER_CACHE.values())
+        self.assertGreater(len(solvers), 0)
+
+        # A different demand only changes the values of the NLP parameters,
+        # so the solvers of the first run are reused.
+        with self.assertLogs("rtctools_heat_network", level="DEBUG") as cm:
+            cached = run_optimization_problem(CachedLowDemandQTH, **kwargs)
+        self.assertTrue(any("Reusing cached solver" in m for m in cm.output))
+        self.assertEqual(
+            set(map(id, solver_cache_mixin._SOLVER_CACHE.values())), set(map(id, solvers))
+        )
+
+        self.assertAlmostEqual(cached.objective_value, reference.objective_value, 6)
+
+    def test_compiled_solver(self):
+        import models.double_pipe_qth.src.double_pipe_qth as double_pipe_qth
+        from models.double_pipe_qth.src.double_pipe_qth import DoublePipeUnequalQTH
+
+        base_folder = Path(double_pipe_qth.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            class CompiledOptions:
+                def solver_cache_options(self):
+                    options = super().solver_cache_options()
+                    options["compile"] = True
+                    options["directory"] = directory
+                    options["flags"] = ["-O0"]
+                    return options
+
+            class CompiledQTH(CompiledOptions, SolverCacheMixin, DoublePipeUnequalQTH):
+                pass
+
+            class LowDemandQTH(DoublePipeUnequalQTH):
+                def read(self):
+                    super().read()
+                    demand = self.get_timeseries("Heat_demand")
+                    self.set_timeseries("Heat_demand", 0.5 * demand.values)
+
+            class CompiledLowDemandQTH(CompiledOptions, SolverCacheMixin, LowDemandQTH):
+                pass
+
+            kwargs = dict(base_folder=base_folder, model_name="DoublePipeUnequalQTH")
+
+            reference = run_optimization_problem(DoublePipeUnequalQTH, base_folder=base_folder)
+
+            compiled = run_optimization_problem(CompiledQTH, **kwargs)
+            libraries = sorted(os.listdir(directory))
+            self.assertGreater(len(libraries), 0)
+            self.assertTrue(all(f.endswith(".so") for f in libraries))
+
+            # Solving the same problem again loads the libraries instead of compiling again
+            solver_cache_mixin._SOLVER_CACHE.clear()
+            loaded = run_optimization_problem(CompiledQTH, **kwargs)
+            self.assertEqual(sorted(os.listdir(directory)), libraries)
+
+            for case in [compiled, loaded]:
+                self.assertAlmostEqual(case.objective_value, reference.objective_value, 6)
+
+            # A different demand only changes the values of the NLP
+            # parameters, so the libraries are reused as well.
+            solver_cache_mixin._SOLVER_CACHE.clear()
+            low_demand_reference = run_optimization_problem(LowDemandQTH, **kwargs)
+            low_demand = run_optimization_problem(CompiledLowDemandQTH, **kwargs)
+            self.assertEqual(sorted(os.listdir(directory)), libraries)
+            self.assertAlmostEqual(
+                low_demand.objective_value, low_demand_reference.objective_value, 6
+            )
+
+    def test_untrusted_library(self):
+        import models.double_pipe_qth.src.double_pipe_qth as double_pipe_qth
+        from models.double_pipe_qth.src.double_pipe_qth import DoublePipeUnequalQTH
+
+        base_folder = Path(double_pipe_qth.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            class CompiledQTH(SolverCacheMixin, DoublePipeUnequalQTH):
+                def solver_cache_options(self):
+                    options = super().solver_cache_options()
+                    options["compile"] = True
+                    options["directory"] = directory
+                    options["flags"] = ["-O0"]
+                    return options
+
+            kwargs = dict(base_folder=base_folder, model_name="DoublePipeUnequalQTH")
+
+            run_optimization_problem(CompiledQTH, **kwargs)
+            libraries = sorted(Path(directory).iterdir())
+            self.assertGreater(len(libraries), 0)
+
+            # Libraries that can be replaced by other users are never loaded
+            for library in libraries:
+                library.chmod(0o666)
+            solver_cache_mixin._SOLVER_CACHE.clear()
+
+            with self.assertLogs("rtctools_heat_network", level="WARNING") as cm:
+                run_optimization_problem(CompiledQTH, **kwargs)
+            self.assertTrue(any("Not loading compiled NLP functions" in m for m in cm.output))
+
+            # Nor is anything compiled into a folder that is writable by others
+            for library in libraries:
+                library.unlink()
+            os.chmod(directory, 0o777)
+            solver_cache_mixin._SOLVER_CACHE.clear()
+
+            with self.assertLogs("rtctools_heat_network", level="WARNING") as cm:
+                run_optimization_problem(CompiledQTH, **kwargs)
+            self.assertTrue(any("Not using compiled NLP functions" in m for m in cm.output))
+            self.assertEqual(list(Path(directory).iterdir()), [])
+
+    def test_prune_libraries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            libraries = [Path(directory) / f"nlp_{i}.so" for i in range(4)]
+            for i, library in enumerate(libraries):
+                library.touch()
+                os.utime(library, (i, i))
+            other = Path(directory) / "other.so"
+            other.touch()
+
+            # The least recently used libraries are removed, other files are kept
+            _prune_libraries(Path(directory), 2)
+            self.assertEqual(sorted(Path(directory).iterdir()), sorted([*libraries[2:], other]))
+
+    def test_options_key(self):
+        self.assertEqual(
+            _options_key({"ipopt": {"tol": 1e-8, "max_iter": 100}, "expand": True}),
+            _options_key({"expand": True, "ipopt": {"max_iter": 100, "tol": 1e-8}}),
+        )
+
+        # E.g. the discrete variables of a mixed integer problem
+        self.assertEqual(
+            _options_key({"discrete": np.array([True, False])}),
+            _options_key({"discrete": [True, False]}),
+        )
+
+        with self.assertRaisesRegex(TypeError, "Cannot hash option value"):
+            _options_key({"iteration_callback": object()})
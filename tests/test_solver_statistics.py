@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from rtctools.util import run_optimization_problem
+
+from rtctools_heat_network.solver_statistics_mixin import SolverStatisticsMixin
+
+
+class TestSolverStatistics(TestCase):
+    def test_statistics_per_priority(self):
+        import models.double_pipe_qth.src.double_pipe_qth as double_pipe_qth
+        from models.double_pipe_qth.src.double_pipe_qth import DoublePipeUnequalQTH
+
+        base_folder = Path(double_pipe_qth.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as directory:
+            json_log = os.path.join(directory, "stats.json")
+
+            class StatisticsQTH(SolverStatisticsMixin, DoublePipeUnequalQTH):
+                def solver_statistics_options(self):
+                    options = super().solver_statistics_options()
+                    options["json_log"] = json_log
+                    return options
+
+            case = run_optimization_problem(
+                StatisticsQTH, base_folder=base_folder, model_name="DoublePipeUnequalQTH"
+            )
+
+            with open(json_log) as f:
+                lines = [json.loads(line) for line in f]
+
+        statistics = case.solver_statistics
+
+        # Every priority is solved at theta = 0 and theta = 1
+        self.assertEqual(len(statistics), len(lines))
+        self.assertEqual({s.theta for s in statistics}, {0.0, 1.0})
+        self.assertTrue(all(s.success for s in statistics))
+        self.assertTrue(all(s.iterations > 0 for s in statistics))
+        self.assertTrue(all(s.function_time > 0.0 for s in statistics))
+
+        for s, line in zip(statistics, lines):
+            self.assertEqual(s.priority, line["priority"])
+            self.assertEqual(s.iterations, line["iterations"])
+            self.assertEqual(s.n_constraints, line["n_constraints"])
+
+        summaries = case.solver_statistics_per_priority()
+        self.assertEqual([p.priority for p in summaries], sorted({s.priority for s in statistics}))
+        self.assertEqual(sum(p.solves for p in summaries), len(statistics))
+        self.assertEqual(
+            sum(p.iterations for p in summaries), sum(s.iterations for s in statistics)
+        )
+
+    def test_milp_statistics(self):
+        import models.double_pipe_heat.src.double_pipe_heat as double_pipe_heat
+        from models.double_pipe_heat.src.double_pipe_heat import DoublePipeEqualHeat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        class StatisticsHeat(SolverStatisticsMixin, DoublePipeEqualHeat):
+            pass
+
+        case = run_optimization_problem(
+            StatisticsHeat, base_folder=base_folder, model_name="DoublePipeEqualHeat"
+        )
+
+        statistics = case.solver_statistics
+        self.assertGreater(len(statistics), 0)
+        self.assertTrue(all(s.n_discrete > 0 for s in statistics))
+        self.assertTrue(all("node_count" in s.stats for s in statistics))